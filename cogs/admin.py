@@ -1424,6 +1424,20 @@ class Admin(commands.Cog):
                         """
 
             await self.bot.cxn.execute(query, ctx.guild.id, user.id)
+            if option == "messages":  # Drop the aggregates built from them.
+                for table, column in (
+                    ("word_counts", "author_id"),
+                    ("message_rollups", "author_id"),
+                    ("last_spoke", "user_id"),
+                    ("emoji_usage", "author_id"),
+                    ("message_search", "author_id"),
+                ):
+                    query = f"""
+                            DELETE FROM {table}
+                            WHERE server_id = $1
+                            AND {column} = $2;
+                            """
+                    await self.bot.cxn.execute(query, ctx.guild.id, user.id)
             await ctx.success(f"Reset all {option[:-1]} data for `{user}`")
 
     @_reset.command(
@@ -1466,4 +1480,17 @@ class Admin(commands.Cog):
                         """
 
             await self.bot.cxn.execute(query, ctx.guild.id)
+            if option == "messages":  # Drop the aggregates built from them.
+                for table in (
+                    "word_counts",
+                    "message_rollups",
+                    "last_spoke",
+                    "emoji_usage",
+                    "message_search",
+                ):
+                    query = f"""
+                            DELETE FROM {table}
+                            WHERE server_id = $1;
+                            """
+                    await self.bot.cxn.execute(query, ctx.guild.id)
             await ctx.success(f"Reset all {option[:-1]} data for this server.")
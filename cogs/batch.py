@@ -2,19 +2,90 @@ import re
 import json
 import time
 import asyncio
+import asyncpg
 import logging
+import itertools
+import contextlib
 
+from datetime import datetime
 from collections import Counter, defaultdict
 from discord.ext import commands, tasks
 
+from settings import words
+from settings import search
+from settings import rollups
+from settings import emojis
+from settings import statuses
+from settings import lastspoke
 from utilities import utils
+from utilities import spool
+from utilities import recent
+from utilities import lastseen
+from utilities import ingest
+from utilities import scheduler
 from utilities import decorators
 
+log = logging.getLogger("INFO_LOGGER")
 command_logger = logging.getLogger("Snowbot")
 
-EMOJI_REGEX = re.compile(r"<a?:.+?:([0-9]{15,21})>")
 EMOJI_NAME_REGEX = re.compile(r"[0-9a-zA-Z\_]{2,32}")
 
+# Factories for every buffer. Flushers swap these in before writing.
+BUFFERS = {
+    "command_batch": list,
+    "edited_batch": list,
+    "emoji_batch": lambda: defaultdict(Counter),
+    "invite_batch": list,
+    "message_batch": list,
+    "nicknames_batch": list,
+    "roles_batch": lambda: defaultdict(dict),
+    "snipe_batch": list,
+    "status_batch": dict,
+    "usernames_batch": list,
+}
+
+# Which buffer every spooled record kind lands in.
+KINDS = {
+    "command": "command_batch",
+    "edited": "edited_batch",
+    "emoji": "emoji_batch",
+    "invite": "invite_batch",
+    "message": "message_batch",
+    "nickname": "nicknames_batch",
+    "roles": "roles_batch",
+    "snipe": "snipe_batch",
+    "status": "status_batch",
+    "tracker": "tracker_batch",
+    "username": "usernames_batch",
+}
+
+# Default flush policies. Override per buffer with the "flush" config key.
+POLICIES = {
+    "command_batch": dict(rows=500, age=2000),
+    "edited_batch": dict(rows=1000, age=200),
+    "emoji_batch": dict(rows=1000, age=2000),
+    "invite_batch": dict(rows=100, age=2000),
+    "message_batch": dict(rows=2000, age=200),
+    "nicknames_batch": dict(rows=1000, age=2000),
+    "roles_batch": dict(rows=1000, age=2000),
+    "snipe_batch": dict(rows=1000, age=200),
+    "status_batch": dict(rows=5000, age=500),
+    "tracker_batch": dict(rows=5000, age=2000),
+    "usernames_batch": dict(rows=1000, age=2000),
+}
+
+# Statuses with a column in userstatus, and a code in status_log.
+STATUSES = statuses.STATUSES
+
+# Postgres is unreachable. Rows stay buffered and the buffer backs off.
+# Anything else is dead lettered so it can't stall the rows behind it.
+RETRY_ON = (
+    OSError,
+    asyncio.TimeoutError,
+    asyncpg.PostgresConnectionError,
+    asyncpg.InterfaceError,
+)
+
 
 def setup(bot):
     bot.add_cog(Batch(bot))
@@ -27,32 +98,320 @@ class Batch(commands.Cog):
 
     def __init__(self, bot):
         self.bot = bot
-        # Data holders
-        self.command_batch = []
-        self.edited_batch = []
-        self.emoji_batch = defaultdict(Counter)
-        self.invite_batch = []
-        self.message_batch = []
-        self.nicknames_batch = []
-        self.roles_batch = defaultdict(dict)
-        self.snipe_batch = []
-        self.status_batch = defaultdict(dict)
-        self.tracker_batch = {}
-        self.usernames_batch = []
-
-        self.batch_lock = asyncio.Lock(loop=bot.loop)
+        # Data holders. Listeners append without locking,
+        # each flush detaches the buffer it writes. See detached()
+        for name, factory in BUFFERS.items():
+            setattr(self, name, factory())
+        # The tracker buffer is never swapped, see ./utilities/lastseen.py
+        self.last_seen = lastseen.LastSeenStore()
+        # Newest messages per channel for snipes, see ./utilities/recent.py
+        self.recent = recent.RecentMessages(**bot.constants.snipes)
+
+        # Only guards the invite diffing in on_member_join.
+        self.invite_lock = asyncio.Lock(loop=bot.loop)
         self.queue = asyncio.Queue(loop=bot.loop)
 
-        self.bulk_inserter.start()
+        # Tuple rows are written through a pluggable backend. See ./utilities/ingest.py
+        self.ingest = ingest.get_backend(bot.constants.ingest, bot.cxn)
+
+        # Buffers are flushed on size or age. See ./utilities/scheduler.py
+        self.flushers = {
+            "command_batch": self.flush_commands,
+            "edited_batch": self.flush_edited,
+            "emoji_batch": self.flush_emojis,
+            "invite_batch": self.flush_invites,
+            "message_batch": self.flush_messages,
+            "nicknames_batch": self.flush_nicknames,
+            "roles_batch": self.flush_roles,
+            "snipe_batch": self.flush_snipes,
+            "status_batch": self.flush_statuses,
+            "tracker_batch": self.flush_tracker,
+            "usernames_batch": self.flush_usernames,
+        }
+        self.scheduler = scheduler.FlushScheduler(
+            bot.loop,
+            {
+                name: scheduler.FlushPolicy(
+                    **{**policy, **bot.constants.flush.get(name, {})}
+                )
+                for name, policy in POLICIES.items()
+            },
+            self.flush,
+            retry_on=RETRY_ON,
+            on_error=self.flush_error,
+        )
+
+        self.accepting = True  # False once drained, records are only spooled.
+        self.successor = None  # The instance that took over after a reload.
+
+        parked = bot.parked_batch
+        if parked:  # Hot reload, take over the old instance's state.
+            bot.parked_batch = None
+            self.absorb(parked)
+        else:
+            # Every record hits the on disk spool before the buffers.
+            # Anything not acked by a previous run is buffered again here.
+            self.spool = spool.Spool(**bot.constants.spool)
+            self.unflushed = {}  # Buffer name -> spool segment of its oldest record.
+            for kind, args in self.spool.replay():
+                self.unflushed.setdefault(self.apply(kind, *args), 0)
+            self.acknowledge()  # Feeds back records a previous run spilled.
+
         self.invite_tracker.start()
-        self.message_inserter.start()
-        self.status_inserter.start()
+        self.metrics_dumper.start()
+        self.spool_syncer.change_interval(seconds=self.spool.interval)
+        self.spool_syncer.start()
+        self.scheduler.start()
 
     def cog_unload(self):
-        self.bulk_inserter.stop()
-        self.message_inserter.stop()
-        self.status_inserter.stop()
+        # Nothing is flushed here. The buffers, spool, and last seen
+        # store are parked on the bot for the next instance. See absorb()
+        self.scheduler.stop()
         self.invite_tracker.stop()
+        self.metrics_dumper.stop()
+        self.spool_syncer.stop()
+        self.bot.parked_batch = self
+
+    def absorb(self, old):
+        """Take over the state of an unloaded instance without copying it."""
+        for name in BUFFERS:
+            setattr(self, name, getattr(old, name))
+        self.last_seen = old.last_seen
+        self.recent = old.recent
+        self.spool = old.spool
+        self.unflushed = old.unflushed
+        for name in self.scheduler.policies:
+            self.scheduler.pending[name] += old.scheduler.pending.get(name, 0)
+            if name in old.scheduler.oldest:
+                self.scheduler.oldest[name] = old.scheduler.oldest[name]
+            if name in old.scheduler.stats:
+                self.scheduler.stats[name] = old.scheduler.stats[name]
+        # A flush still running on the old instance restores into this one.
+        old.successor = self
+
+    async def drain(self, timeout=10.0):
+        """
+        Stop accepting and flush every buffer within the timeout.
+        Anything recorded afterwards, or left when the timeout
+        hits, stays in the spool and is replayed on the next start.
+        Everything that was flushed is acked, so it isn't.
+        """
+        self.accepting = False
+        # Records from here on land in a fresh segment, pinned so it is never acked.
+        self.spool.rotate()
+        self.unflushed["draining"] = self.spool.mark()
+        self.scheduler.stop()
+        try:
+            await asyncio.wait_for(self.flush_remaining(), timeout)
+        except asyncio.TimeoutError:
+            log.warning("Batch drain timed out. Unflushed rows are kept in the spool.")
+        self.acknowledge()
+        self.spool.close()
+
+    async def flush_remaining(self):
+        await self.scheduler.join()
+        await self.scheduler.flush_all()
+
+    def record(self, kind, *args):
+        """
+        Write a record ahead to the spool, then buffer it.
+        Never awaits, so it is atomic with respect to the flushers.
+        """
+        if not self.accepting:
+            self.spool.append((kind, args))
+            return
+        if self.spool.append((kind, args)):
+            return  # Spilled to disk, applied once the backlog drains.
+        self.unflushed.setdefault(self.apply(kind, *args), self.spool.mark())
+
+    def apply(self, kind, *args):
+        """Place a spooled record into its buffer. Returns the buffer name."""
+        if kind == "message":
+            self.message_batch.append(args)
+            _, timestamp, content, message_id, author_id, channel_id, _ = args
+            self.recent.add(message_id, author_id, channel_id, content, timestamp)
+        elif kind == "command":
+            if len(args) == 8:  # Spooled before commands had a message_id.
+                args = (*args[:-1], None, args[-1])
+            self.command_batch.append(args)
+        elif kind == "username":
+            self.usernames_batch.append(args)
+        elif kind == "nickname":
+            self.nicknames_batch.append(args)
+        elif kind == "invite":
+            self.invite_batch.append(args)
+        elif kind == "snipe":
+            self.snipe_batch.append(*args)
+            self.recent.mark_deleted(*args)
+        elif kind == "edited":
+            self.edited_batch.append(*args)
+            self.recent.mark_edited(*args)
+        elif kind == "status":
+            status, user_id, timestamp = args
+            entry = self.status_batch.get(user_id)
+            if entry is None:
+                self.status_batch[user_id] = [
+                    status, timestamp, timestamp, 0.0, 0.0, 0.0, []
+                ]
+            else:
+                if len(entry) == 6:  # Buffered before intervals were kept.
+                    entry.append([])
+                self.add_interval(entry, status, timestamp)
+        elif kind == "tracker":
+            self.last_seen.update(*args)
+        elif kind == "emoji":  # Only replayed, usage is counted from messages now.
+            if len(args) == 2:  # Spooled before usage was per user and day.
+                args = (args[0], 0, datetime.utcnow().date(), args[1])
+            server_id, author_id, day, emoji_ids = args
+            self.emoji_batch[server_id].update(
+                (author_id, emoji_id, day) for emoji_id in emoji_ids
+            )
+        elif kind == "roles":
+            server_id, user_id, roles = args
+            self.roles_batch[server_id][user_id] = roles
+
+        name = KINDS[kind]
+        self.scheduler.notify(name)
+        return name
+
+    @contextlib.contextmanager
+    def detached(self, name):
+        """
+        Swap a buffer for an empty one and yield the old one.
+        The swap happens between awaits, so no lock is needed
+        and listeners never wait on a database round trip.
+        If postgres can't be reached the rows are merged back,
+        if it refused them they are dead lettered instead.
+        """
+        if name == "tracker_batch":
+            batch = self.last_seen.detach()
+        else:
+            batch = getattr(self, name)
+            setattr(self, name, BUFFERS[name]())
+        segment = self.unflushed.pop(name, None)
+        try:
+            yield batch
+        except BaseException as exc:
+            if isinstance(exc, Exception) and not isinstance(exc, RETRY_ON):
+                self.dead_letter(name, batch, exc)
+                raise
+            self.restore(name, batch)
+            if segment is not None:
+                self.unflushed[name] = min(segment, self.unflushed.get(name, segment))
+            raise
+
+    def restore(self, name, batch):
+        """
+        Merge a buffer that failed to flush under the live one.
+        Only the rows still in it, not already written, count as pending.
+        """
+        if self.successor:
+            return self.successor.restore(name, batch)
+        if name in ("emoji_batch", "roles_batch"):
+            self.scheduler.notify(name, sum(map(len, batch.values())))
+        elif batch:
+            self.scheduler.notify(name, len(batch))
+        if name == "tracker_batch":
+            return self.last_seen.restore(batch)
+        current = getattr(self, name)
+        if isinstance(batch, list):
+            batch.extend(current)  # Keep insertion order.
+        elif name == "status_batch":
+            for user_id, entry in current.items():
+                if user_id not in batch:
+                    batch[user_id] = entry
+                    continue
+                old = batch[user_id]
+                self.add_interval(old, entry[0], entry[1])
+                old[2] = entry[2]
+                for idx in range(3, 6):
+                    old[idx] += entry[idx]
+                old[6].extend(entry[6])
+        else:  # Counters add up, nested dicts keep the newest value.
+            for key, value in current.items():
+                batch[key].update(value)
+        setattr(self, name, batch)
+
+    def dead_letter(self, name, batch, exc):
+        """
+        Set aside the unwritten rows of a buffer that failed on something
+        other than the connection. Retrying them would fail the same way
+        and hold up every row behind them. See ./data/spool/dead
+        """
+        if name == "tracker_batch":
+            batch = self.last_seen.rows(batch)
+        self.spool.dead_letter((name, batch, repr(exc), time.time()))
+        log.error(f"Dead lettered the unwritten {name} rows: {exc!r}")
+
+    @staticmethod
+    def add_interval(entry, status, timestamp):
+        """
+        Status entries are coalesced per user as [first status, first change,
+        last change, online, idle, dnd, [(code, start, end), ...]].
+        The user was in status from the last change until timestamp.
+        """
+        if timestamp < entry[2]:  # The clock went back, like a stale last seen.
+            return
+        if status in STATUSES:
+            code = STATUSES.index(status) + 1
+            entry[2 + code] += timestamp - entry[2]
+            entry[6].append((code, entry[2], timestamp))
+        entry[2] = timestamp
+
+    def acknowledge(self):
+        """
+        Delete the spool segments every buffer has been flushed past.
+        Once everything is flushed, spilled records are fed back in.
+        """
+        if self.successor:
+            return self.successor.acknowledge()
+        if not self.unflushed:
+            self.spool.rotate()  # Everything is written, the active segment too.
+        self.spool.ack(min(self.unflushed.values(), default=self.spool.mark()))
+        if self.unflushed or not self.accepting:
+            return
+        mark = self.spool.mark()  # The records are appended to the wal from here.
+        for kind, args in self.spool.drain_overflow():
+            self.unflushed.setdefault(self.apply(kind, *args), mark)
+
+    async def flush(self, name):
+        """Called by the scheduler once a buffer is due."""
+        if name in ("snipe_batch", "edited_batch") and self.message_batch:
+            # The flags can only land on messages already inserted.
+            await self.scheduler.flush_one("message_batch")
+        serialized = 0
+        with self.detached(name) as batch:
+            if batch:
+                chunk = self.scheduler.policies[name].chunk
+                serialized = await self.flushers[name](batch, chunk)
+        self.bot.batch_inserts += 1
+        self.acknowledge()
+        return serialized
+
+    def flush_error(self, name, exc):
+        self.bot.dispatch("error", "loop_error", tb=utils.traceback_maker(exc))
+
+    async def write_chunks(self, table, batch, chunk):
+        """
+        Insert a list buffer at most chunk rows per statement.
+        Written rows are removed so a failure only restores the rest.
+        Returns the number of bytes serialized.
+        """
+        serialized = 0
+        while batch:
+            serialized += await self.ingest.insert(table, batch[:chunk])
+            del batch[:chunk]
+        return serialized
+
+    async def flag_chunks(self, query, batch, chunk):
+        """Flag a list of message ids with one UNNEST update per chunk."""
+        serialized = 0
+        while batch:
+            message_ids = batch[:chunk]
+            await self.bot.cxn.execute(query, message_ids)
+            serialized += 8 * len(message_ids)
+            del batch[:chunk]
+        return serialized
 
     @tasks.loop(minutes=1.0)
     async def invite_tracker(self):
@@ -62,264 +421,249 @@ class Batch(commands.Cog):
             if guild.me.guild_permissions.manage_guild
         }
 
-    @tasks.loop(seconds=0.5)
-    async def status_inserter(self):
-        if self.status_batch:  # Insert all status changes
-            async with self.batch_lock:
-                if self.status_batch["online"]:
-                    query = """
-                            INSERT INTO userstatus (user_id)
-                            SELECT x.user_id
-                            FROM JSONB_TO_RECORDSET($1::JSONB)
-                            AS x(user_id BIGINT, last_changed DOUBLE PRECISION)
-                            ON CONFLICT (user_id)
-                            DO UPDATE SET last_changed = EXCLUDED.last_changed,
-                            online = userstatus.online + (EXCLUDED.last_changed - userstatus.last_changed);
-                            """
-                    data = json.dumps(
-                        [
-                            {"user_id": user_id, "last_changed": timestamp}
-                            for user_id, timestamp in self.status_batch[
-                                "online"
-                            ].items()
-                        ]
-                    )
-                    await self.bot.cxn.execute(query, data)
-                    self.status_batch["online"].clear()
-                if self.status_batch["idle"]:
-                    query = """
-                            INSERT INTO userstatus (user_id)
-                            SELECT x.user_id
-                            FROM JSONB_TO_RECORDSET($1::JSONB)
-                            AS x(user_id BIGINT, last_changed DOUBLE PRECISION)
-                            ON CONFLICT (user_id)
-                            DO UPDATE SET last_changed = EXCLUDED.last_changed,
-                            idle = userstatus.idle + (EXCLUDED.last_changed - userstatus.last_changed);
-                            """
-                    data = json.dumps(
-                        [
-                            {"user_id": user_id, "last_changed": timestamp}
-                            for user_id, timestamp in self.status_batch["idle"].items()
-                        ]
-                    )
-                    await self.bot.cxn.execute(query, data)
-                    self.status_batch["idle"].clear()
-                if self.status_batch["dnd"]:
-                    query = """
-                            INSERT INTO userstatus (user_id)
-                            SELECT x.user_id
-                            FROM JSONB_TO_RECORDSET($1::JSONB)
-                            AS x(user_id BIGINT, last_changed DOUBLE PRECISION)
-                            ON CONFLICT (user_id)
-                            DO UPDATE SET last_changed = EXCLUDED.last_changed,
-                            dnd = userstatus.dnd + (EXCLUDED.last_changed - userstatus.last_changed)
-                            """
-                    data = json.dumps(
-                        [
-                            {"user_id": user_id, "last_changed": timestamp}
-                            for user_id, timestamp in self.status_batch["dnd"].items()
-                        ]
-                    )
-                    await self.bot.cxn.execute(query, data)
-                    self.status_batch["dnd"].clear()
-                if self.status_batch["offline"]:
-                    query = """
-                            INSERT INTO userstatus (user_id)
-                            SELECT x.user_id
-                            FROM JSONB_TO_RECORDSET($1::JSONB)
-                            AS x(user_id BIGINT, last_changed DOUBLE PRECISION)
-                            ON CONFLICT (user_id)
-                            DO UPDATE SET last_changed = EXCLUDED.last_changed;
-                            """
-                    data = json.dumps(
-                        [
-                            {"user_id": user_id, "last_changed": timestamp}
-                            for user_id, timestamp in self.status_batch[
-                                "offline"
-                            ].items()
-                        ]
-                    )
-                    await self.bot.cxn.execute(query, data)
-                    self.status_batch["offline"].clear()
+    def metrics(self):
+        """Ingest pipeline metrics. Also dumped to ./data/json/ingest.json"""
+        return {
+            "buffers": self.scheduler.metrics(),
+            "spool": {
+                "pending_bytes": self.spool.pending_bytes,
+                "overflow_bytes": self.spool.overflow.total_bytes,
+                "dead_bytes": self.spool.dead.total_bytes,
+                "spilling": self.spool.spilling,
+            },
+            "last_seen": len(self.last_seen),
+        }
 
-    @status_inserter.error
+    @tasks.loop(minutes=1.0)
+    async def metrics_dumper(self):
+        utils.write_json("./data/json/ingest.json", self.metrics())
+
+    @tasks.loop(seconds=1.0)
+    async def spool_syncer(self):
+        # Sealing the active segment lets acknowledge() delete it once every
+        # buffer has flushed past it, so under steady traffic a crash only
+        # replays about an interval of written rows. Records are already in
+        # the kernel, the fsync that comes with it bounds what power loss costs.
+        self.spool.rotate()
+
+    @spool_syncer.error
+    @metrics_dumper.error
     async def loop_error(self, exc):
         self.bot.dispatch("error", "loop_error", tb=utils.traceback_maker(exc))
 
-    @tasks.loop(seconds=0.2)
-    async def message_inserter(self):
+    async def flush_messages(self, batch, chunk):
         """
-        Main bulk message inserter
+        Main bulk message inserter.
+        Word counts, rollups, emoji usage, last_spoke and the search
+        index commit in the same transaction as their messages.
+        Messages already stored, replayed from a spool segment that
+        was flushed but not acked, are skipped so nothing counts twice.
         """
-
-        if self.message_batch:  # Insert every message into the db
-            query = """
-                    INSERT INTO messages (unix, timestamp, content,
-                    message_id, author_id, channel_id, server_id)
-                    SELECT x.unix, x.timestamp, x.content,
-                    x.message_id, x.author_id, x.channel_id, x.server_id
-                    FROM JSONB_TO_RECORDSET($1::JSONB)
-                    AS x(unix REAL, timestamp TIMESTAMP, content TEXT,
-                    message_id BIGINT, author_id BIGINT,
-                    channel_id BIGINT, server_id BIGINT)
-                    """
-            async with self.batch_lock:
-                data = json.dumps(self.message_batch)
-                await self.bot.cxn.execute(query, data)
-                self.message_batch.clear()
-
-        if self.snipe_batch:  # Snipe command setup
-            query = """
-                    UPDATE messages
-                    SET deleted = True
-                    WHERE message_id = $1;
-                    """  # Updates already stored messages.
-            async with self.batch_lock:
-                await self.bot.cxn.executemany(query, ((x,) for x in self.snipe_batch))
-                self.snipe_batch.clear()
-
-        if self.edited_batch:  # Edit snipe command setup
-            query = """
-                    UPDATE messages
-                    SET edited = True
-                    WHERE message_id = $1;
-                    """  # Updates already stored messages.
-            async with self.batch_lock:
-                await self.bot.cxn.executemany(query, ((x,) for x in self.edited_batch))
-                self.edited_batch.clear()
-
-    @message_inserter.error
-    async def loop_error(self, exc):
-        self.bot.dispatch("error", "loop_error", tb=utils.traceback_maker(exc))
-
-    @tasks.loop(seconds=2.0)
-    async def bulk_inserter(self):
-        self.bot.batch_inserts += 1
-        if self.command_batch:  # Insert all the commands executed.
-            query = """
-                    INSERT INTO commands (server_id, channel_id,
-                    author_id, timestamp, prefix, command, failed)
-                    SELECT x.server, x.channel, x.author,
-                    x.timestamp, x.prefix, x.command, x.failed
-                    FROM JSONB_TO_RECORDSET($1::JSONB)
-                    AS x(server BIGINT, channel BIGINT,
-                    author BIGINT, timestamp TIMESTAMP,
-                    prefix TEXT, command TEXT, failed BOOLEAN);
-                    """
-            async with self.batch_lock:
-                data = json.dumps(self.command_batch)
-                await self.bot.cxn.execute(query, data)
-
-                # Command logger to ./data/logs/commands.log
-                destination = None
-                for x in self.command_batch:
-                    if x["server"] is None:
-                        destination = "Private Message"
-                    else:
-                        destination = f"#{self.bot.get_channel(x['channel'])} [{x['channel']}] ({self.bot.get_guild(x['server'])}) [{x['server']}]"
-                    command_logger.info(
-                        f"{self.bot.get_user(x['author'])} in {destination}: {x['content']}"
+        stored = """
+                 SELECT message_id
+                 FROM messages
+                 WHERE message_id = ANY($1::BIGINT[])
+                 AND timestamp >= $2;
+                 """  # Rows keep their spooled timestamp, so partitions are pruned.
+        serialized = 0
+        while batch:
+            rows = batch[:chunk]
+            async with self.bot.cxn.acquire() as con:
+                async with con.transaction():
+                    seen = {
+                        record["message_id"]
+                        for record in await con.fetch(
+                            stored,
+                            [row[3] for row in rows],
+                            min(row[1] for row in rows),
+                        )
+                    }
+                    fresh = []
+                    for row in rows:
+                        if row[3] not in seen:
+                            seen.add(row[3])
+                            fresh.append(row)
+                    serialized += await self.ingest.insert(
+                        "messages", fresh, connection=con
                     )
-                self.command_batch.clear()
-
-        # Emoji usage tracking
-        if self.emoji_batch:
-            query = """
-                    INSERT INTO emojistats (server_id, emoji_id, total)
-                    SELECT x.server_id, x.emoji_id, x.added
-                    FROM JSONB_TO_RECORDSET($1::JSONB)
-                    AS x(server_id BIGINT, emoji_id BIGINT, added INT)
-                    ON CONFLICT (server_id, emoji_id) DO UPDATE
-                    SET total = emojistats.total + EXCLUDED.total;
-                    """
-            async with self.batch_lock:
-                data = json.dumps(
-                    [
-                        {"server_id": server_id, "emoji_id": emoji_id, "added": count}
-                        for server_id, data in self.emoji_batch.items()
-                        for emoji_id, count in data.items()
-                    ]
-                )
-                await self.bot.cxn.execute(query, data)
-                self.emoji_batch.clear()
-
-        if self.tracker_batch:  # Track user last seen times
-            query = """
-                    INSERT INTO tracker (user_id, unix, action)
-                    VALUES ($1, $2, $3)
-                    ON CONFLICT (user_id)
-                    DO UPDATE SET unix = $2, action = $3
-                    WHERE tracker.user_id = $1;
-                    """
-            async with self.batch_lock:
-                await self.bot.cxn.executemany(
-                    query,
-                    (
-                        (entry[0], entry[1][0], entry[1][1])
-                        for entry in self.tracker_batch.items()
-                    ),
+                    await words.add_counts(words.count_words(fresh), connection=con)
+                    await rollups.add_counts(
+                        rollups.count_messages(fresh), connection=con
+                    )
+                    await emojis.add_uses(emojis.count_messages(fresh), connection=con)
+                    await lastspoke.add_latest(lastspoke.latest(fresh), connection=con)
+                    await search.add_documents(search.documents(fresh), connection=con)
+            del batch[:chunk]
+        return serialized
+
+    async def flush_snipes(self, batch, chunk):  # Snipe command setup
+        query = """
+                UPDATE messages
+                SET deleted = True
+                FROM UNNEST($1::BIGINT[]) AS x(message_id)
+                WHERE messages.message_id = x.message_id;
+                """  # Updates already stored messages.
+        return await self.flag_chunks(query, batch, chunk)
+
+    async def flush_edited(self, batch, chunk):  # Edit snipe command setup
+        query = """
+                UPDATE messages
+                SET edited = True
+                FROM UNNEST($1::BIGINT[]) AS x(message_id)
+                WHERE messages.message_id = x.message_id;
+                """  # Updates already stored messages.
+        return await self.flag_chunks(query, batch, chunk)
+
+    async def flush_commands(self, batch, chunk):  # Insert all the commands executed.
+        serialized = 0
+        while batch:
+            rows = batch[:chunk]
+            # The trailing message content is only for the command logger.
+            serialized += await self.ingest.insert(
+                "commands", [row[:-1] for row in rows]
+            )
+            del batch[:chunk]
+
+            # Command logger to ./data/logs/commands.log
+            destination = None
+            for server, channel, author, *_, content in rows:
+                if server is None:
+                    destination = "Private Message"
+                else:
+                    destination = f"#{self.bot.get_channel(channel)} [{channel}] ({self.bot.get_guild(server)}) [{server}]"
+                command_logger.info(
+                    f"{self.bot.get_user(author)} in {destination}: {content}"
                 )
-                self.tracker_batch.clear()
-
-        if self.usernames_batch:  # Save usernames
-            query = """
-                    INSERT INTO usernames (user_id, username)
-                    SELECT x.user_id, x.name
-                    FROM JSONB_TO_RECORDSET($1::JSONB)
-                    AS x(user_id BIGINT, name TEXT)
-                    """
-            async with self.batch_lock:
-                data = json.dumps(self.usernames_batch)
-                await self.bot.cxn.execute(query, data)
-                self.usernames_batch.clear()
-
-        if self.nicknames_batch:  # Save user nicknames
-            query = """
-                    INSERT INTO usernicks (user_id, server_id, nickname)
-                    SELECT x.user_id, x.server_id, x.nickname
-                    FROM JSONB_TO_RECORDSET($1::JSONB)
-                    AS x(user_id BIGINT, server_id BIGINT, nickname TEXT)
-                    """
-            async with self.batch_lock:
-                data = json.dumps(self.nicknames_batch)
-                await self.bot.cxn.execute(query, data)
-                self.nicknames_batch.clear()
-
-        if self.roles_batch:  # Insert roles to reassign later.
-            query = """
-                    INSERT INTO userroles (user_id, server_id, roles)
-                    SELECT x.user_id, x.server_id, x.roles
-                    FROM JSONB_TO_RECORDSET($1::JSONB)
-                    AS x(user_id BIGINT, server_id BIGINT, roles TEXT)
-                    ON CONFLICT (user_id, server_id)
-                    DO UPDATE SET roles = EXCLUDED.roles
-                    """
-            async with self.batch_lock:
-                data = json.dumps(
-                    [
-                        {"server_id": server_id, "user_id": user_id, "roles": roles}
-                        for server_id, data in self.roles_batch.items()
-                        for user_id, roles in data.items()
-                    ]
+        return serialized
+
+    async def flush_usernames(self, batch, chunk):  # Save usernames
+        return await self.write_chunks("usernames", batch, chunk)
+
+    async def flush_nicknames(self, batch, chunk):  # Save user nicknames
+        return await self.write_chunks("usernicks", batch, chunk)
+
+    async def flush_invites(self, batch, chunk):  # Insert invite data for basic tracking
+        return await self.write_chunks("invites", batch, chunk)
+
+    async def flush_tracker(self, slots, chunk):  # Track user last seen times
+        query = """
+                INSERT INTO tracker (user_id, unix, action)
+                SELECT x.user_id, x.unix, x.action
+                FROM UNNEST($1::BIGINT[], $2::FLOAT8[], $3::TEXT[])
+                AS x(user_id, unix, action)
+                ON CONFLICT (user_id)
+                DO UPDATE SET unix = EXCLUDED.unix, action = EXCLUDED.action
+                WHERE tracker.unix < EXCLUDED.unix;
+                """
+        serialized = 0
+        while slots:
+            users, unix, actions = self.last_seen.rows(slots[:chunk])
+            await self.bot.cxn.execute(query, users, unix, actions)
+            serialized += 16 * len(users) + sum(map(len, actions))
+            del slots[:chunk]
+        return serialized
+
+    async def flush_statuses(self, batch, chunk):  # Insert all status changes
+        """
+        Lifetime totals are summed from the intervals in the batch,
+        the first of each user closed against the stored last_changed.
+        Intervals before it were written by an earlier flush of a
+        replayed spool segment and are skipped, so time never counts
+        twice. Every interval is also appended to status_log and its rollups.
+        """
+        query = """
+                INSERT INTO userstatus (user_id, online, idle, dnd, last_changed)
+                SELECT * FROM UNNEST(
+                    $1::BIGINT[], $2::FLOAT8[], $3::FLOAT8[], $4::FLOAT8[], $5::FLOAT8[]
                 )
-                await self.bot.cxn.execute(query, data)
-                self.roles_batch.clear()
-
-        if self.invite_batch:  # Insert invite data for basic tracking
-            query = """
-                    INSERT INTO invites (invitee, inviter, server_id)
-                    SELECT x.invitee, x.inviter, x.server_id
-                    FROM JSONB_TO_RECORDSET($1::JSONB)
-                    AS x(invitee BIGINT, inviter BIGINT, server_id BIGINT)
-                    """
-            async with self.batch_lock:
-                data = json.dumps(self.invite_batch)
-                await self.bot.cxn.execute(query, data)
-                self.invite_batch.clear()
-
-    @bulk_inserter.error
-    async def loop_error(self, exc):
-        self.bot.dispatch("error", "loop_error", tb=utils.traceback_maker(exc))
+                ON CONFLICT (user_id)
+                DO UPDATE SET online = COALESCE(userstatus.online, 0) + EXCLUDED.online,
+                idle = COALESCE(userstatus.idle, 0) + EXCLUDED.idle,
+                dnd = COALESCE(userstatus.dnd, 0) + EXCLUDED.dnd,
+                last_changed = GREATEST(userstatus.last_changed, EXCLUDED.last_changed);
+                """
+        previous = """
+                   SELECT user_id, last_changed
+                   FROM userstatus
+                   WHERE user_id = ANY($1::BIGINT[]);
+                   """
+        serialized = 0
+        while batch:
+            # Written users are removed so a failure only restores the rest.
+            users = list(itertools.islice(batch, chunk))
+            part = {user_id: batch[user_id] for user_id in users}
+            async with self.bot.cxn.acquire() as con:
+                async with con.transaction():
+                    last = dict(await con.fetch(previous, users))
+                    rows = list(statuses.intervals(part, last))
+                    totals = statuses.totals(rows)
+                    await statuses.add_intervals(rows, connection=con)
+                    await con.execute(
+                        query,
+                        users,
+                        *map(list, zip(*(totals[user_id] for user_id in users))),
+                        [part[user_id][2] for user_id in users],
+                    )
+            # Five 8 byte numbers per user, and 24 bytes per interval.
+            serialized += 40 * len(users) + 24 * len(rows)
+            for user_id in users:
+                del batch[user_id]
+        return serialized
+
+    async def flush_emojis(self, batch, chunk):  # Emoji usage tracking
+        serialized = 0
+        for keys in self.nested_chunks(batch, chunk):
+            part = defaultdict(Counter)
+            for server_id, key in keys:
+                part[server_id][key] = batch[server_id][key]
+            rows = emojis.count_uses(part)
+            async with self.bot.cxn.acquire() as con:
+                async with con.transaction():
+                    await emojis.add_uses(rows, connection=con)
+            serialized += 40 * len(rows)  # Five 8 byte columns per row.
+            self.remove_nested(batch, keys)
+        return serialized
+
+    async def flush_roles(self, batch, chunk):  # Insert roles to reassign later.
+        query = """
+                INSERT INTO userroles (user_id, server_id, roles)
+                SELECT x.user_id, x.server_id, x.roles
+                FROM JSONB_TO_RECORDSET($1::JSONB)
+                AS x(user_id BIGINT, server_id BIGINT, roles TEXT)
+                ON CONFLICT (user_id, server_id)
+                DO UPDATE SET roles = EXCLUDED.roles
+                """
+        serialized = 0
+        for keys in self.nested_chunks(batch, chunk):
+            data = json.dumps(
+                [
+                    {
+                        "server_id": server_id,
+                        "user_id": user_id,
+                        "roles": batch[server_id][user_id],
+                    }
+                    for server_id, user_id in keys
+                ]
+            )
+            await self.bot.cxn.execute(query, data)
+            serialized += len(data)
+            self.remove_nested(batch, keys)
+        return serialized
+
+    @staticmethod
+    def nested_chunks(batch, chunk):
+        """(outer, inner) key pairs of a nested dict buffer, chunk at a time."""
+        keys = [(outer, inner) for outer, value in batch.items() for inner in value]
+        for i in range(0, len(keys), chunk):
+            yield keys[i : i + chunk]
+
+    @staticmethod
+    def remove_nested(batch, keys):
+        """Drop written keys so a failure only restores the rest."""
+        for outer, inner in keys:
+            del batch[outer][inner]
+            if not batch[outer]:
+                del batch[outer]
 
     @commands.Cog.listener()
     @decorators.wait_until_ready()
@@ -330,25 +674,23 @@ class Batch(commands.Cog):
             server_id = ctx.guild.id
         else:
             server_id = None
-        async with self.batch_lock:
-            self.command_batch.append(
-                {
-                    "server": server_id,
-                    "channel": ctx.channel.id,
-                    "author": ctx.author.id,
-                    "timestamp": str(ctx.message.created_at.utcnow()),
-                    "prefix": ctx.prefix,
-                    "command": ctx.command.qualified_name,
-                    "failed": ctx.command_failed,
-                    "content": ctx.message.clean_content.replace("\u0000", ""),
-                }
-            )
+        self.record(
+            "command",
+            server_id,
+            ctx.channel.id,
+            ctx.author.id,
+            ctx.message.created_at.utcnow(),
+            ctx.prefix,
+            ctx.command.qualified_name,
+            ctx.command_failed,
+            ctx.message.id,
+            ctx.message.clean_content.replace("\u0000", ""),
+        )
 
     @commands.Cog.listener()
     @decorators.wait_until_ready()
     async def on_raw_message_delete(self, payload):
-        async with self.batch_lock:
-            self.snipe_batch.append(payload.message_id)
+        self.record("snipe", payload.message_id)
 
     # Helper functions to detect changes
     @staticmethod
@@ -389,23 +731,20 @@ class Batch(commands.Cog):
     @decorators.event_check(lambda s, b, a: not a.bot)
     async def on_member_update(self, before, after):
         if await self.nickname_changed(before, after):
-            async with self.batch_lock:
-                self.nicknames_batch.append(
-                    {
-                        "user_id": after.id,
-                        "server_id": after.guild.id,
-                        "nickname": before.display_name.replace("\u0000", ""),
-                    }
-                )
+            self.record(
+                "nickname",
+                after.id,
+                after.guild.id,
+                before.display_name.replace("\u0000", ""),
+            )
 
     @commands.Cog.listener()
     @decorators.wait_until_ready()
     @decorators.event_check(lambda s, b, a: not a.bot)
     async def on_presence_update(self, before, after):
         if await self.status_changed(before, after):
-            async with self.batch_lock:
-                self.status_batch[str(before.status)][after.id] = time.time()
-                self.tracker_batch[before.id] = (time.time(), "updating their status")
+            self.record("status", str(before.status), after.id, time.time())
+            self.record("tracker", before.id, time.time(), "updating their status")
 
     @commands.Cog.listener()
     @decorators.wait_until_ready()
@@ -416,54 +755,39 @@ class Batch(commands.Cog):
         username, and discriminator changes.
         """
         if await self.avatar_changed(before, after):
-            async with self.batch_lock:
-                self.tracker_batch[before.id] = (time.time(), "updating their avatar")
-                self.bot.avatar_saver.save(after)
+            self.record("tracker", before.id, time.time(), "updating their avatar")
+            self.bot.avatar_saver.save(after)
 
         if await self.username_changed(before, after):
-            async with self.batch_lock:
-                self.usernames_batch.append(
-                    {
-                        "user_id": before.id,
-                        "name": str(before).replace("\u0000", ""),
-                    }
-                )
-                self.tracker_batch[before.id] = (time.time(), "updating their username")
+            self.record("username", before.id, str(before).replace("\u0000", ""))
+            self.record("tracker", before.id, time.time(), "updating their username")
 
     @commands.Cog.listener()
     @decorators.wait_until_ready()
     @decorators.event_check(lambda s, m: m.guild and not m.author.bot)
     async def on_message(self, message):
-        async with self.batch_lock:
-            self.message_batch.append(
-                {
-                    "unix": message.created_at.timestamp(),
-                    "timestamp": str(message.created_at.utcnow()),
-                    "content": message.clean_content.replace("\u0000", ""),
-                    "message_id": message.id,
-                    "author_id": message.author.id,
-                    "channel_id": message.channel.id,
-                    "server_id": message.guild.id,
-                }
-            )
-            self.tracker_batch[message.author.id] = (time.time(), "sending a message")
-
-        matches = EMOJI_REGEX.findall(message.content)
-        if matches:
-            async with self.batch_lock:
-                self.emoji_batch[message.guild.id].update(map(int, matches))
+        self.record(
+            "message",
+            message.created_at.timestamp(),
+            message.created_at.utcnow(),
+            message.clean_content.replace("\u0000", ""),
+            message.id,
+            message.author.id,
+            message.channel.id,
+            message.guild.id,
+        )
+        self.record("tracker", message.author.id, time.time(), "sending a message")
 
     @commands.Cog.listener()
     @decorators.wait_until_ready()
     @decorators.event_check(lambda s, c, u, w: not u.bot)
     async def on_typing(self, channel, user, when):
-        async with self.batch_lock:
-            self.tracker_batch[user.id] = (time.time(), "typing")
+        self.record("tracker", user.id, time.time(), "typing")
 
     @commands.Cog.listener()
     @decorators.wait_until_ready()
     async def on_raw_message_edit(self, payload):
-        self.edited_batch.append(payload.message_id)
+        self.record("edited", payload.message_id)
         channel_obj = self.bot.get_channel(payload.channel_id)
         try:
             message = await channel_obj.fetch_message(payload.message_id)
@@ -473,8 +797,7 @@ class Batch(commands.Cog):
             return
         if message.author.bot:
             return
-        async with self.batch_lock:
-            self.tracker_batch[message.author.id] = (time.time(), "editing a message")
+        self.record("tracker", message.author.id, time.time(), "editing a message")
 
     @commands.Cog.listener()
     @decorators.wait_until_ready()
@@ -485,22 +808,19 @@ class Batch(commands.Cog):
             return
         if user.bot:
             return
-        async with self.batch_lock:
-            self.tracker_batch[payload.user_id] = (time.time(), "reacting to a message")
+        self.record("tracker", payload.user_id, time.time(), "reacting to a message")
 
     @commands.Cog.listener()
     @decorators.wait_until_ready()
     @decorators.event_check(lambda s, m, b, a: not m.bot)
     async def on_voice_state_update(self, member, before, after):
-        async with self.batch_lock:
-            self.tracker_batch[member.id] = (time.time(), "changing their voice state")
+        self.record("tracker", member.id, time.time(), "changing their voice state")
 
     @commands.Cog.listener()
     @decorators.wait_until_ready()
     @decorators.event_check(lambda s, i: i.inviter and not i.inviter.bot)
     async def on_invite_create(self, invite):
-        async with self.batch_lock:
-            self.tracker_batch[invite.inviter.id] = (time.time(), "creating an invite")
+        self.record("tracker", invite.inviter.id, time.time(), "creating an invite")
         if not invite.guild.me.guild_permissions.manage_guild:
             return
         self.bot.invites[invite.guild.id] = await invite.guild.invites()
@@ -516,8 +836,7 @@ class Batch(commands.Cog):
     @decorators.wait_until_ready()
     @decorators.event_check(lambda s, m: not m.bot)
     async def on_member_join(self, member):
-        async with self.batch_lock:
-            self.tracker_batch[member.id] = (time.time(), "joining a server")
+        self.record("tracker", member.id, time.time(), "joining a server")
 
         await asyncio.sleep(2)  # API rest.
 
@@ -526,7 +845,7 @@ class Batch(commands.Cog):
                 return
         except AttributeError:  # Sometimes if we're getting kicked as they join...
             return
-        async with self.batch_lock:
+        async with self.invite_lock:
             old_invites = self.bot.invites[member.guild.id]
             new_invites = await member.guild.invites()
             for invite in old_invites:
@@ -539,13 +858,7 @@ class Batch(commands.Cog):
                     )
                     continue
                 if invite.uses < self.get_invite(new_invites, invite.code).uses:
-                    self.invite_batch.append(
-                        {
-                            "invitee": member.id,
-                            "inviter": invite.inviter.id,
-                            "server_id": member.guild.id,
-                        }
-                    )
+                    self.record("invite", member.id, invite.inviter.id, member.guild.id)
             self.bot.invites[member.guild.id] = new_invites
 
     def get_invite(self, invite_list, code):
@@ -557,10 +870,9 @@ class Batch(commands.Cog):
     @decorators.wait_until_ready()
     @decorators.event_check(lambda s, m: not m.bot)
     async def on_member_remove(self, member):
-        async with self.batch_lock:
-            self.tracker_batch[member.id] = (time.time(), "leaving a server")
-            roles = ",".join([str(x.id) for x in member.roles if x.name != "@everyone"])
-            self.roles_batch[member.guild.id].update({member.id: roles})
+        self.record("tracker", member.id, time.time(), "leaving a server")
+        roles = ",".join([str(x.id) for x in member.roles if x.name != "@everyone"])
+        self.record("roles", member.guild.id, member.id, roles)
 
         if not member.guild.me.guild_permissions.manage_guild:
             return
@@ -577,21 +889,41 @@ class Batch(commands.Cog):
         self.bot.dispatch("picklist_reaction", reaction, user)
 
     async def last_observed(self, member):
-        """Lookup last_observed data."""
+        """Lookup last_observed data in a single round trip."""
+        guild = getattr(member, "guild", None)
         query = """
-                SELECT DISTINCT ON (unix) unix, action
-                FROM tracker
-                WHERE user_id = $1
-                ORDER BY unix DESC;
+                SELECT tracker.unix, tracker.action,
+                (
+                    SELECT MAX(unix)
+                    FROM last_spoke
+                    WHERE user_id = $1
+                ) AS last_spoke,
+                (
+                    SELECT unix
+                    FROM last_spoke
+                    WHERE user_id = $1
+                    AND server_id = $2
+                ) AS server_last_spoke
+                FROM (SELECT $1::BIGINT AS user_id) AS target
+                LEFT JOIN tracker ON tracker.user_id = target.user_id;
                 """
-        last_seen_data = await self.bot.cxn.fetchrow(query, member.id) or None
-
-        last_spoke = await self.get_last_spoke(member)
-        server_last_spoke = await self.get_server_last_spoke(member)
+        record = await self.bot.cxn.fetchrow(query, member.id, guild and guild.id)
+        # Memory is always at least as fresh as the tracker table.
+        last_seen_data = self.last_seen.get(member.id)
+        if not last_seen_data and record["unix"] is not None:
+            last_seen_data = (record["unix"], record["action"])
+        now = int(time.time())
+        last_spoke = server_last_spoke = None
+        if record["last_spoke"]:
+            last_spoke = utils.time_between(int(record["last_spoke"]), now)
+        if record["server_last_spoke"]:
+            server_last_spoke = utils.time_between(
+                int(record["server_last_spoke"]), now
+            )
 
         if last_seen_data:
             unix, action = last_seen_data
-            last_seen = utils.time_between(int(unix), int(time.time()))
+            last_seen = utils.time_between(int(unix), now)
         else:
             action = None
             last_seen = None
@@ -646,8 +978,8 @@ class Batch(commands.Cog):
     async def get_last_spoke(self, user):
         query = """
                 SELECT MAX(unix)
-                FROM messages
-                WHERE author_id = $1;
+                FROM last_spoke
+                WHERE user_id = $1;
                 """
         last_spoke = await self.bot.cxn.fetchval(query, user.id)
         if last_spoke:
@@ -657,9 +989,9 @@ class Batch(commands.Cog):
         if not hasattr(user, "guild"):
             return
         query = """
-                SELECT MAX(unix)
-                FROM messages
-                WHERE author_id = $1
+                SELECT unix
+                FROM last_spoke
+                WHERE user_id = $1
                 AND server_id = $2;
                 """
         server_spoke = await self.bot.cxn.fetchval(query, user.id, user.guild.id)
@@ -12,6 +12,7 @@ import discord
 from collections import defaultdict
 from discord.ext import commands, menus
 
+from utilities import utils
 from utilities import checks
 from utilities import helpers
 from utilities import converters
@@ -1136,14 +1137,15 @@ class Botadmin(commands.Cog):
                               SUM(CASE WHEN failed THEN 1 ELSE 0 END) AS "failed"
                        FROM commands
                        WHERE command=$1
-                       AND timestamp > (CURRENT_TIMESTAMP - $2::interval)
+                       AND message_id >= $2
                        GROUP BY server_id
                    ) AS t
                    ORDER BY "total" DESC
                    LIMIT 30;
                 """
 
-        await self.tabulate_query(ctx, query, command, datetime.timedelta(days=days))
+        since = datetime.datetime.utcnow() - datetime.timedelta(days=days)
+        await self.tabulate_query(ctx, query, command, utils.time_snowflake(since))
 
     @command_history.command(name="guild", aliases=["server"])
     @commands.is_owner()
@@ -1191,14 +1193,15 @@ class Botadmin(commands.Cog):
 
         query = """SELECT command, COUNT(*)
                    FROM commands
-                   WHERE timestamp > (CURRENT_TIMESTAMP - $1::interval)
+                   WHERE message_id >= $1
                    GROUP BY command
                    ORDER BY 2 DESC
                 """
 
         all_commands = {c.qualified_name: 0 for c in self.bot.walk_commands()}
 
-        records = await self.bot.cxn.fetch(query, datetime.timedelta(days=days))
+        since = datetime.datetime.utcnow() - datetime.timedelta(days=days)
+        records = await self.bot.cxn.fetch(query, utils.time_snowflake(since))
         for name, uses in records:
             if name in all_commands:
                 all_commands[name] = uses
@@ -1237,7 +1240,8 @@ class Botadmin(commands.Cog):
     ):
         """Command history for a cog or grouped by a cog."""
 
-        interval = datetime.timedelta(days=days)
+        since = datetime.datetime.utcnow() - datetime.timedelta(days=days)
+        since = utils.time_snowflake(since)
         if cog is not None:
             cog = self.bot.get_cog(cog)
             if cog is None:
@@ -1250,14 +1254,14 @@ class Botadmin(commands.Cog):
                                   SUM(CASE WHEN failed THEN 1 ELSE 0 END) AS "failed"
                            FROM commands
                            WHERE command = any($1::text[])
-                           AND timestamp > (CURRENT_TIMESTAMP - $2::interval)
+                           AND message_id >= $2
                            GROUP BY command
                        ) AS t
                        ORDER BY "total" DESC
                        LIMIT 30;
                     """
             return await self.tabulate_query(
-                ctx, query, [c.qualified_name for c in cog.walk_commands()], interval
+                ctx, query, [c.qualified_name for c in cog.walk_commands()], since
             )
 
         # A more manual query with a manual grouper.
@@ -1267,7 +1271,7 @@ class Botadmin(commands.Cog):
                               SUM(CASE WHEN failed THEN 0 ELSE 1 END) AS "success",
                               SUM(CASE WHEN failed THEN 1 ELSE 0 END) AS "failed"
                        FROM commands
-                       WHERE timestamp > (CURRENT_TIMESTAMP - $1::interval)
+                       WHERE message_id >= $1
                        GROUP BY command
                    ) AS t;
                 """
@@ -1286,7 +1290,7 @@ class Botadmin(commands.Cog):
                 self.total += record["total"]
 
         data = defaultdict(Count)
-        records = await self.bot.cxn.fetch(query, interval)
+        records = await self.bot.cxn.fetch(query, since)
         for record in records:
             command = self.bot.get_command(record["command"])
             if command is None or command.cog is None:
@@ -1305,3 +1309,53 @@ class Botadmin(commands.Cog):
         table.add_rows(data)
         render = table.render()
         await ctx.safe_send(f"```\n{render}\n```")
+
+    @decorators.command(
+        aliases=["ingeststats"],
+        brief="Show ingest pipeline metrics.",
+        implemented="2026-10-18 00:00:00.000000",
+        updated="2026-10-18 00:00:00.000000",
+    )
+    async def ingest(self, ctx):
+        """
+        Usage: {0}ingest
+        Alias: {0}ingeststats
+        Output:
+            Shows the depth, oldest row age, totals,
+            and flush latency percentiles of every
+            batch buffer along with the spool size.
+        Notes:
+            Latency percentiles cover the last
+            1024 flushes of each buffer. A snapshot
+            is saved to ./data/json/ingest.json every minute.
+        """
+        batch = self.bot.get_cog("Batch")
+        if not batch:
+            return await ctx.fail("The batch cog is not loaded.")
+
+        metrics = batch.metrics()
+        table = formatting.TabularData()
+        table.set_columns(
+            ["BUFFER", "DEPTH", "AGE MS", "ROWS", "BYTES", "P50", "P95", "P99"]
+        )
+        for name, data in metrics["buffers"].items():
+            table.add_row(
+                [
+                    name.replace("_batch", ""),
+                    data["depth"],
+                    f"{data['age_ms']:.0f}",
+                    data["rows"],
+                    data["bytes"],
+                    f"{data['p50_ms']:.2f}",
+                    f"{data['p95_ms']:.2f}",
+                    f"{data['p99_ms']:.2f}",
+                ]
+            )
+        spool = metrics["spool"]
+        footer = (
+            f"Spool: {spool['pending_bytes']:,} bytes pending, "
+            f"{spool['overflow_bytes']:,} bytes spilled"
+            f"{' (spilling)' if spool['spilling'] else ''}. "
+            f"Last seen store: {metrics['last_seen']:,} users."
+        )
+        await ctx.send_or_reply(f"```sml\n{table.render()}```{footer}")
@@ -1,10 +1,9 @@
-import io
 import discord
-import PIL as pillow
 
 from discord.ext import commands
 
 from utilities import checks
+from utilities import images
 from utilities import converters
 from utilities import decorators
 
@@ -46,9 +45,8 @@ class Home(commands.Cog):
 
     async def welcome(self, member):
         byteav = await member.avatar.with_size(128).read()
-        buffer = await self.bot.loop.run_in_executor(
-            None, self.create_welcome_image, byteav, member
-        )
+        text = "{}\nWelcome to {}".format(str(member), member.guild.name)
+        buffer = await self.bot.renderer.render(images.get_welcome, byteav, text)
         dfile = discord.File(fp=buffer, filename="welcome.png")
 
         embed = discord.Embed(
@@ -65,32 +63,6 @@ class Home(commands.Cog):
         embed.set_footer(text=f"Server Population: {member.guild.member_count} ")
         await self.welcomer.send(f"{member.mention}", file=dfile, embed=embed)
 
-    def create_welcome_image(self, bytes_avatar, member):
-        banner = pillow.Image.open("./data/assets/banner.png")
-        blue = pillow.Image.open("./data/assets/blue.png")
-        mask = pillow.Image.open("./data/assets/avatar_mask.png")
-
-        avatar = pillow.Image.open(io.BytesIO(bytes_avatar))
-
-        try:
-            composite = pillow.Image.composite(avatar, mask, mask)
-        except ValueError:  # Sometimes the avatar isn't resized properly
-            avatar = avatar.resize((128, 128))
-            composite = pillow.Image.composite(avatar, mask, mask)
-        blue.paste(im=composite, box=(0, 0), mask=composite)
-        banner.paste(im=blue, box=(30, 30), mask=blue.split()[3])
-
-        text = "{}\nWelcome to {}".format(str(member), member.guild.name)
-        draw = pillow.ImageDraw.Draw(banner)
-        font = pillow.ImageFont.truetype(
-            "./data/assets/FreeSansBold.ttf", 30, encoding="utf-8"
-        )
-        draw.text((170, 56), text, (211, 211, 211), font=font)
-        buffer = io.BytesIO()
-        banner.save(buffer, "png")  # 'save' function for PIL
-        buffer.seek(0)
-        return buffer
-
     @decorators.command(hidden=True, brief="Test the welcome", name="welcome")
     @decorators.is_home(HOME)
     @checks.has_perms(manage_guild=True)
@@ -1,17 +1,21 @@
 import io
 import re
 import json
+import shlex
 import codecs
+import asyncpg
 import discord
 
 from collections import defaultdict, Counter
 from discord.ext import commands, menus, tasks
 
+from settings import search
 from utilities import utils
 from utilities import checks
 from utilities import converters
 from utilities import decorators
 from utilities import exceptions
+from utilities import humantime
 from utilities import pagination
 
 
@@ -1135,6 +1139,13 @@ class Logging(commands.Cog):
     ## Other Commands ##
     ####################
 
+    def recent_snipe(self, ctx, member, *, edited):
+        batch = self.bot.get_cog("Batch")
+        if not batch:
+            return None
+        author_id = member.id if member else None
+        return batch.recent.snipe(ctx.channel.id, author_id=author_id, edited=edited)
+
     @decorators.command(brief="Snipe a deleted message.", aliases=["retrieve"])
     @checks.guild_only()
     @checks.bot_has_perms(embed_links=True)
@@ -1147,33 +1158,40 @@ class Logging(commands.Cog):
         Notes:
             Will fetch a messages sent by a specific user if specified
         """
-        if member is None:
-            query = """
-                    SELECT author_id, message_id, content, timestamp
-                    FROM messages
-                    WHERE channel_id = $1
-                    AND deleted = True
-                    ORDER BY unix DESC;
-                    """
-            result = await self.bot.cxn.fetchrow(query, ctx.channel.id)
+        result = self.recent_snipe(ctx, member, edited=False)
+        if result:  # Still cached, no need to hit the database.
+            author = result.author_id
+            message_id = result.message_id
+            content = result.content
+            timestamp = result.timestamp
         else:
-            query = """
-                    SELECT author_id, message_id, content, timestamp
-                    FROM messages
-                    WHERE channel_id = $1
-                    AND author_id = $2
-                    AND deleted = True
-                    ORDER BY unix DESC;
-                    """
-            result = await self.bot.cxn.fetchrow(query, ctx.channel.id, member.id)
-
-        if not result:
-            return await ctx.fail(f"There is nothing to snipe.")
-
-        author = result["author_id"]
-        message_id = result["message_id"]
-        content = result["content"]
-        timestamp = result["timestamp"]
+            if member is None:
+                query = """
+                        SELECT author_id, message_id, content, timestamp
+                        FROM messages
+                        WHERE channel_id = $1
+                        AND deleted = True
+                        ORDER BY message_id DESC;
+                        """
+                result = await self.bot.cxn.fetchrow(query, ctx.channel.id)
+            else:
+                query = """
+                        SELECT author_id, message_id, content, timestamp
+                        FROM messages
+                        WHERE channel_id = $1
+                        AND author_id = $2
+                        AND deleted = True
+                        ORDER BY message_id DESC;
+                        """
+                result = await self.bot.cxn.fetchrow(query, ctx.channel.id, member.id)
+
+            if not result:
+                return await ctx.fail(f"There is nothing to snipe.")
+
+            author = result["author_id"]
+            message_id = result["message_id"]
+            content = result["content"]
+            timestamp = result["timestamp"]
 
         author = self.bot.get_user(author)
         if not author:
@@ -1215,33 +1233,40 @@ class Logging(commands.Cog):
         Notes:
             Will fetch a messages sent by a specific user if specified
         """
-        if member is None:
-            query = """
-                    SELECT author_id, message_id, content, timestamp
-                    FROM messages
-                    WHERE channel_id = $1
-                    AND edited = True
-                    ORDER BY unix DESC;
-                    """
-            result = await self.bot.cxn.fetchrow(query, ctx.channel.id)
+        result = self.recent_snipe(ctx, member, edited=True)
+        if result:  # Still cached, no need to hit the database.
+            author = result.author_id
+            message_id = result.message_id
+            content = result.content
+            timestamp = result.timestamp
         else:
-            query = """
-                    SELECT author_id, message_id, content, timestamp
-                    FROM messages
-                    WHERE channel_id = $1
-                    AND author_id = $2
-                    AND edited = True
-                    ORDER BY unix DESC;
-                    """
-            result = await self.bot.cxn.fetchrow(query, ctx.channel.id, member.id)
-
-        if not result:
-            return await ctx.fail("There are no edits to snipe.")
-
-        author = result["author_id"]
-        message_id = result["message_id"]
-        content = result["content"]
-        timestamp = result["timestamp"]
+            if member is None:
+                query = """
+                        SELECT author_id, message_id, content, timestamp
+                        FROM messages
+                        WHERE channel_id = $1
+                        AND edited = True
+                        ORDER BY message_id DESC;
+                        """
+                result = await self.bot.cxn.fetchrow(query, ctx.channel.id)
+            else:
+                query = """
+                        SELECT author_id, message_id, content, timestamp
+                        FROM messages
+                        WHERE channel_id = $1
+                        AND author_id = $2
+                        AND edited = True
+                        ORDER BY message_id DESC;
+                        """
+                result = await self.bot.cxn.fetchrow(query, ctx.channel.id, member.id)
+
+            if not result:
+                return await ctx.fail("There are no edits to snipe.")
+
+            author = result["author_id"]
+            message_id = result["message_id"]
+            content = result["content"]
+            timestamp = result["timestamp"]
 
         author = self.bot.get_user(author)
         if not author:
@@ -1293,6 +1318,7 @@ class Logging(commands.Cog):
             duplicates
             hardmention
             hash       (Ex: 3523)
+            messages   (Ex: hello world --channel #general)
             nickname   (Ex: Hecate)
             playing    (Ex: Visual Studio Code)
             snowflake  (Ex: 708584008065351681)
@@ -1522,6 +1548,109 @@ class Logging(commands.Cog):
         except menus.MenuError as e:
             await ctx.send_or_reply(e)
 
+    @find.command(
+        name="messages",
+        aliases=["message", "msgs", "content"],
+        brief="Search the content of stored messages.",
+    )
+    async def find_messages(self, ctx, *, args: str):
+        """
+        Usage: {0}find messages <search> [flags]
+        Aliases:
+            {0}find message
+            {0}find msgs
+            {0}find content
+        Output:
+            A pagination session with the newest
+            messages in the server matching your
+            search, one page fetched at a time.
+        Flags:
+            --channel|-c: Only messages in this channel
+            --author|-a: Only messages by this user
+            --after: Only messages after a time or message ID
+            --before: Only messages before a time or message ID
+        Notes:
+            Use "quotes" for phrases, "or" for
+            alternatives, and -word to exclude.
+            Searches that take too long are cancelled.
+        """
+        parser = converters.Arguments(add_help=False, allow_abbrev=False)
+        parser.add_argument("search", nargs="*")
+        parser.add_argument("--channel", "-c")
+        parser.add_argument("--author", "-a")
+        parser.add_argument("--after")
+        parser.add_argument("--before")
+        try:
+            args = parser.parse_args(shlex.split(args))
+        except Exception as e:
+            return await ctx.fail(str(e).capitalize())
+        query = " ".join(args.search)
+        if not query:
+            return await ctx.usage("<search> [flags]")
+
+        channel_id = author_id = None
+        if args.channel:
+            channel = await commands.TextChannelConverter().convert(ctx, args.channel)
+            channel_id = channel.id
+        if args.author:
+            user = await converters.DiscordUser().convert(ctx, args.author)
+            author_id = user.id
+
+        def snowflake(argument, high):
+            if argument is None:
+                return None
+            if argument.isdigit():
+                return int(argument)
+            return utils.time_snowflake(humantime.PastTime(argument).dt, high)
+
+        try:
+            after = snowflake(args.after, True)
+            before = snowflake(args.before, False)
+        except commands.BadArgument as e:
+            return await ctx.fail(str(e))
+
+        async def fetch(last, limit):
+            try:
+                return await search.search(
+                    ctx.guild.id,
+                    query,
+                    channel_id=channel_id,
+                    author_id=author_id,
+                    after=after,
+                    before=last or before,
+                    limit=limit,
+                )
+            except asyncpg.QueryCanceledError:
+                if last is None:
+                    raise
+                return []  # Later pages just end early.
+
+        def format_entry(record):
+            sent = utils.snowflake_time(record["message_id"])
+            content = discord.utils.escape_markdown(record["content"][:150])
+            deleted = " (deleted)" if record["deleted"] else ""
+            return (
+                f"`{sent:%Y-%m-%d %H:%M}` <#{record['channel_id']}> "
+                f"<@{record['author_id']}>{deleted}: {content}"
+            )
+
+        await ctx.trigger_typing()
+        p = pagination.KeysetPages(
+            fetch,
+            key=lambda record: record["message_id"],
+            format_entry=format_entry,
+        )
+        try:
+            await p.source.prepare()
+        except asyncpg.QueryCanceledError:
+            return await ctx.fail("That search took too long. Try narrowing it down.")
+        if not p.source.pages:
+            return await ctx.fail(f"**No results.**")
+        try:
+            await p.start(ctx)
+        except menus.MenuError as e:
+            await ctx.send_or_reply(e)
+
     def _is_hard_to_mention(self, name):
         """Determine if a name is hard to mention."""
         codecs.register_error("newreplace", lambda x: (b" " * (x.end - x.start), x.end))
@@ -0,0 +1,556 @@
+import logging
+
+from datetime import datetime, timedelta
+from discord.ext import commands, tasks
+
+from settings import words
+from settings import archive
+from settings import emojis
+from settings import search
+from settings import rollups
+from settings import lastspoke
+from settings import retention
+from settings import backfills
+from settings import migrations
+from settings import partitions
+from utilities import utils
+from utilities import checks
+from utilities import decorators
+from utilities import formatting
+
+log = logging.getLogger("INFO_LOGGER")
+
+
+def setup(bot):
+    bot.add_cog(Maintenance(bot))
+
+
+class Maintenance(commands.Cog):
+    """
+    Module for database maintenance tasks.
+    """
+
+    def __init__(self, bot):
+        self.bot = bot
+        self.migrated = None  # Legacy rows moved so far, None if not migrating.
+        self.backfilling = {}  # Backfill name -> (cursor, target) while running.
+        self.retaining = None  # Retention job while running.
+        self.retained = None  # Last finished retention job.
+        self.retention_config = bot.constants.retention
+        self.partition_manager.start()
+        self.emoji_compactor.start()
+        self.retention_runner.change_interval(
+            hours=self.retention_config.get("interval", 6.0)
+        )
+        self.retention_runner.start()
+
+    def cog_unload(self):
+        self.partition_manager.stop()
+        self.emoji_compactor.stop()
+        self.retention_runner.cancel()
+
+    # Owner only cog.
+    async def cog_check(self, ctx):
+        return checks.is_owner(ctx)
+
+    @tasks.loop(hours=12.0)
+    async def partition_manager(self):
+        # Monthly partitions are always created well before they're needed.
+        if await partitions.is_partitioned():
+            await partitions.ensure_partitions()
+
+    @partition_manager.before_loop
+    async def before_partition_manager(self):
+        await self.bot.wait_until_ready()
+
+    @tasks.loop(hours=24.0)
+    async def emoji_compactor(self):
+        folded = await emojis.compact()
+        if folded:
+            log.info(f"Folded {folded} daily emoji rows into months")
+
+    @emoji_compactor.before_loop
+    async def before_emoji_compactor(self):
+        await self.bot.wait_until_ready()
+
+    @tasks.loop(hours=6.0)
+    async def retention_runner(self):
+        job = await self.run_retention()
+        if job and sum(job.deleted.values()):
+            log.info(
+                f"Retention deleted {sum(job.deleted.values())} rows "
+                f"in {job.elapsed:.0f}s ({job.throttled:.0f}s throttled)"
+            )
+
+    @retention_runner.before_loop
+    async def before_retention_runner(self):
+        await self.bot.wait_until_ready()
+
+    @partition_manager.error
+    @emoji_compactor.error
+    @retention_runner.error
+    async def loop_error(self, exc):
+        self.bot.dispatch("error", "loop_error", tb=utils.traceback_maker(exc))
+
+    @decorators.group(
+        aliases=["partitions"],
+        invoke_without_command=True,
+        brief="Manage message partitions.",
+        implemented="2026-10-18 00:00:00.000000",
+        updated="2026-10-18 00:00:00.000000",
+    )
+    async def partition(self, ctx):
+        """
+        Usage: {0}partition [option]
+        Alias: {0}partitions
+        Output:
+            Shows every partition of the
+            messages table and its row estimate.
+        Options:
+            create: Create partitions ahead of time
+            migrate: Move a plain messages table into partitions
+        """
+        if ctx.invoked_subcommand:
+            return
+        if not await partitions.is_partitioned():
+            return await ctx.fail(
+                f"The messages table is not partitioned. Run `{ctx.prefix}partition migrate`"
+            )
+        table = formatting.TabularData()
+        table.set_columns(["PARTITION", "BOUNDS", "ROWS"])
+        table.add_rows(
+            [
+                (row["name"], row["bounds"], f"{row['rows']:,}")
+                for row in await partitions.get_partitions()
+            ]
+        )
+        footer = ""
+        if self.migrated is not None:
+            footer = f"Migration running, {self.migrated:,} legacy rows moved."
+        await ctx.send_or_reply(f"```sml\n{table.render()}```{footer}")
+
+    @partition.command(brief="Create partitions ahead of time.")
+    async def create(self, ctx, months: int = partitions.AHEAD):
+        """
+        Usage: {0}partition create [months]
+        Output:
+            Creates the monthly partitions up
+            to [months] past the current one.
+        """
+        if not await partitions.is_partitioned():
+            return await ctx.fail("The messages table is not partitioned.")
+        created = await partitions.ensure_partitions(ahead=months)
+        if not created:
+            return await ctx.success("All partitions already exist.")
+        await ctx.success(f"Created partitions: {', '.join(created)}")
+
+    @partition.command(brief="Partition an existing messages table.")
+    async def migrate(self, ctx, chunk: int = 10000):
+        """
+        Usage: {0}partition migrate [chunk]
+        Output:
+            Swaps the plain messages table for a
+            partitioned one and moves the old rows
+            over in chunks of [chunk], newest first.
+        Notes:
+            Ingest keeps running throughout. Stats
+            only cover moved rows until it finishes.
+        """
+        if self.migrated is not None:
+            return await ctx.fail("A migration is already running.")
+        c = await ctx.confirm("This action will migrate the messages table.")
+        if not c:
+            return
+        self.migrated = 0
+
+        def progress(total):
+            self.migrated = total
+
+        await ctx.success("Migration started.")
+        try:
+            total = await partitions.migrate(chunk=chunk, progress=progress)
+        finally:
+            self.migrated = None
+        await ctx.success(f"Migration complete. Moved {total:,} rows.")
+
+    @decorators.group(
+        aliases=["backfills"],
+        invoke_without_command=True,
+        brief="Manage resumable backfills.",
+        implemented="2026-10-18 00:00:00.000000",
+        updated="2026-10-18 00:00:00.000000",
+    )
+    async def backfill(self, ctx):
+        """
+        Usage: {0}backfill [option]
+        Alias: {0}backfills
+        Output:
+            Shows the progress of every backfill
+            over the existing message history.
+        Options:
+            words: Build the word_counts index
+            rollups: Build the hourly message rollups
+            spoke: Build the last_spoke table
+            emojis: Build the daily emoji usage table
+            search: Build the message search index
+        """
+        if ctx.invoked_subcommand:
+            return
+        query = """
+                SELECT name, cursor, target
+                FROM backfills
+                ORDER BY name;
+                """
+        records = await self.bot.cxn.fetch(query)
+        if not records:
+            return await ctx.fail("No backfills have been registered.")
+        table = formatting.TabularData()
+        table.set_columns(["BACKFILL", "CURSOR", "TARGET", "DONE", "STATE"])
+        for row in records:
+            cursor, target = self.backfilling.get(
+                row["name"], (row["cursor"], row["target"])
+            )
+            done = 100 if not target else min(100, cursor / target * 100)
+            state = "running" if row["name"] in self.backfilling else "idle"
+            table.add_row(
+                [row["name"], f"{cursor:,}", f"{target:,}", f"{done:.1f}%", state]
+            )
+        await ctx.send_or_reply(f"```sml\n{table.render()}```")
+
+    async def run_backfill(self, ctx, name, runner, chunk):
+        """Run a registered backfill, tracking its progress for the status table."""
+        if name in self.backfilling:
+            return await ctx.fail(f"The {name} backfill is already running.")
+        if await partitions.is_migrating():
+            return await ctx.fail("Finish the partition migration first.")
+        self.backfilling[name] = tuple(await backfills.get_backfill(name))
+
+        def progress(cursor, target):
+            self.backfilling[name] = (cursor, target)
+
+        await ctx.success(f"Backfill {name} started.")
+        try:
+            await runner(chunk=chunk, progress=progress)
+        finally:
+            self.backfilling.pop(name, None)
+        await ctx.success(f"Backfill {name} complete.")
+
+    @backfill.command(name="words", brief="Build the word count index.")
+    async def backfill_words(self, ctx, chunk: int = 10000):
+        """
+        Usage: {0}backfill words [chunk]
+        Output:
+            Counts the words of every message stored
+            before the word_counts index went live,
+            [chunk] message indexes at a time.
+        Notes:
+            Resumes where it left off if interrupted.
+        """
+        await self.run_backfill(ctx, "word_counts", words.backfill, chunk)
+
+    @backfill.command(name="rollups", brief="Build the hourly message rollups.")
+    async def backfill_rollups(self, ctx, chunk: int = 10000):
+        """
+        Usage: {0}backfill rollups [chunk]
+        Output:
+            Rolls up every message stored before
+            the message_rollups table went live,
+            [chunk] message indexes at a time.
+        Notes:
+            Resumes where it left off if interrupted.
+        """
+        await self.run_backfill(ctx, "message_rollups", rollups.backfill, chunk)
+
+    @backfill.command(name="spoke", brief="Build the last spoke table.")
+    async def backfill_spoke(self, ctx, chunk: int = 10000):
+        """
+        Usage: {0}backfill spoke [chunk]
+        Output:
+            Records the newest message of every user
+            in every server from messages stored before
+            the last_spoke table went live, [chunk]
+            message indexes at a time.
+        Notes:
+            Resumes where it left off if interrupted.
+        """
+        await self.run_backfill(ctx, "last_spoke", lastspoke.backfill, chunk)
+
+    @backfill.command(name="emojis", brief="Build the daily emoji usage table.")
+    async def backfill_emojis(self, ctx, chunk: int = 10000):
+        """
+        Usage: {0}backfill emojis [chunk]
+        Output:
+            Counts the emojis of every message stored
+            before the emoji_usage table went live,
+            [chunk] message indexes at a time.
+        Notes:
+            Resumes where it left off if interrupted.
+        """
+        await self.run_backfill(ctx, "emoji_usage", emojis.backfill, chunk)
+
+    @backfill.command(name="search", brief="Build the message search index.")
+    async def backfill_search(self, ctx, chunk: int = 10000):
+        """
+        Usage: {0}backfill search [chunk]
+        Output:
+            Indexes the content of every message stored
+            before the message_search table went live,
+            [chunk] message indexes at a time.
+        Notes:
+            Resumes where it left off if interrupted.
+        """
+        await self.run_backfill(ctx, "message_search", search.backfill, chunk)
+
+    @decorators.command(
+        aliases=["checkrollups"],
+        brief="Check the message rollups against raw messages.",
+        implemented="2026-10-18 00:00:00.000000",
+        updated="2026-10-18 00:00:00.000000",
+    )
+    async def rollupcheck(self, ctx, hours: int = 24):
+        """
+        Usage: {0}rollupcheck [hours]
+        Alias: {0}checkrollups
+        Output:
+            Recounts the last [hours] hours of
+            messages in this server and shows
+            every hour the rollups disagree with.
+        Notes:
+            Hours older than the rollup watermark
+            only match once the backfill finished.
+        """
+        if not ctx.guild:
+            return await ctx.fail("This command can only be used in a server.")
+        since = datetime.utcnow() - timedelta(hours=hours)
+        await ctx.trigger_typing()
+        records = await rollups.check(ctx.guild.id, since)
+        if not records:
+            return await ctx.success(
+                f"The rollups match the last {hours} hour{'' if hours == 1 else 's'} of messages."
+            )
+        table = formatting.TabularData()
+        table.set_columns(["AUTHOR", "HOUR", "MESSAGES", "ROLLED", "CHARS", "ROLLED"])
+        table.add_rows(
+            [
+                (
+                    row["author_id"],
+                    f"{row['hour']:%Y-%m-%d %H:00}",
+                    row["raw_messages"],
+                    row["rolled_messages"],
+                    row["raw_characters"],
+                    row["rolled_characters"],
+                )
+                for row in records[:20]
+            ]
+        )
+        await ctx.send_or_reply(
+            f"```sml\n{table.render()}```{len(records):,} mismatched hours found."
+        )
+
+    @decorators.command(
+        aliases=["migrations"],
+        brief="Show the schema migrations.",
+        implemented="2026-10-18 00:00:00.000000",
+        updated="2026-10-18 00:00:00.000000",
+    )
+    async def schema(self, ctx):
+        """
+        Usage: {0}schema
+        Alias: {0}migrations
+        Output:
+            Shows every migration in data/migrations,
+            when it was applied, and whether the file
+            changed since it was applied. Migrations
+            whose indexes are still being built in the
+            background show as indexing.
+        """
+        table = formatting.TabularData()
+        table.set_columns(["VERSION", "NAME", "APPLIED", "STATE"])
+        status = await migrations.get_status(self.bot.cxn)
+        for migration, applied, edited, queued in status:
+            if applied is None:
+                state = "pending"
+            elif edited:
+                state = "edited"
+            else:
+                state = "indexing" if queued else "ok"
+            table.add_row(
+                [
+                    f"{migration.version:04d}",
+                    migration.name,
+                    f"{applied:%Y-%m-%d %H:%M}" if applied else "-",
+                    state,
+                ]
+            )
+        await ctx.send_or_reply(f"```sml\n{table.render()}```")
+
+    async def run_retention(self):
+        """Run one retention pass unless one is already running."""
+        if self.retaining or await partitions.is_migrating():
+            return None
+        config = self.retention_config
+        self.retaining = retention.Job()
+        try:
+            job = await retention.run(
+                self.retaining,
+                defaults=config.get("policies"),
+                chunk=config.get("chunk", retention.CHUNK),
+                throttle=retention.Throttle(
+                    max_lag=config.get("max_lag", retention.MAX_LAG),
+                    duty=config.get("duty", retention.DUTY),
+                ),
+            )
+        finally:
+            self.retained, self.retaining = self.retaining, None
+        return job
+
+    @decorators.group(
+        invoke_without_command=True,
+        brief="Manage history retention.",
+        implemented="2026-10-18 00:00:00.000000",
+        updated="2026-10-18 00:00:00.000000",
+    )
+    async def retention(self, ctx):
+        """
+        Usage: {0}retention [option]
+        Output:
+            Shows every retention policy and
+            the progress of the current or
+            last retention pass.
+        Options:
+            set: Set a retention policy
+            remove: Remove a retention policy
+            run: Start a retention pass now
+            archives: Show the archived partitions
+        """
+        if ctx.invoked_subcommand:
+            return
+        policies = await retention.get_policies(self.retention_config.get("policies"))
+        table = formatting.TabularData()
+        table.set_columns(["SERVER", "TABLE", "DAYS", "ACTION"])
+        table.add_rows(
+            [
+                (p.server_id or "default", p.table, p.days, p.action)
+                for p in sorted(policies, key=lambda p: (p.table, p.server_id))
+            ]
+        )
+        content = f"```sml\n{table.render()}```" if policies else "No policies set.\n"
+        job = self.retaining or self.retained
+        if job:
+            state = "Running" if job is self.retaining else "Last pass"
+            deleted = ", ".join(f"{k}: {v:,}" for k, v in job.deleted.items())
+            content += (
+                f"{state}: {job.elapsed:.0f}s, {job.chunks:,} chunks, "
+                f"{job.throttled:.0f}s throttled, replica lag {job.lag:.1f}s. "
+                f"Deleted {deleted or 'nothing'}."
+            )
+            if job.archived:
+                content += f" Archived {', '.join(job.archived)}."
+            if job.current:
+                content += f" Pruning {job.current[0]} ({job.current[1] or 'default'})."
+        await ctx.send_or_reply(content)
+
+    @retention.command(name="set", brief="Set a retention policy.")
+    async def retention_set(
+        self, ctx, table, days: int, action="delete", server_id: int = None
+    ):
+        """
+        Usage: {0}retention set <table> <days> [action] [server id]
+        Output:
+            Rows of <table> older than <days> are
+            deleted, or compacted to the newest row
+            per user if [action] is compact.
+            Messages can be archived instead, which
+            moves whole months to data/archive.
+        Notes:
+            Applies to the current server unless
+            [server id] is given. Server id 0 sets
+            the default for every other server.
+        """
+        spec = retention.TABLES.get(table.lower())
+        if not spec:
+            return await ctx.fail(
+                f"Tables with retention: {', '.join(retention.TABLES)}"
+            )
+        if action.lower() not in spec.actions:
+            return await ctx.fail(
+                f"The {spec.name} table supports: {', '.join(spec.actions)}"
+            )
+        if days < 1:
+            return await ctx.fail("Retention must be at least one day.")
+        if server_id is None:
+            server_id = ctx.guild.id if ctx.guild else 0
+        if server_id and not spec.server:
+            return await ctx.fail(f"The {spec.name} table isn't stored per server.")
+        if server_id and action.lower() == "archive":
+            return await ctx.fail("Only the default policy can archive.")
+        await retention.set_policy(server_id, spec.name, days, action.lower())
+        await ctx.success(
+            f"Retention for {spec.name} ({server_id or 'default'}) "
+            f"set to {days} day{'' if days == 1 else 's'}."
+        )
+
+    @retention.command(name="remove", brief="Remove a retention policy.")
+    async def retention_remove(self, ctx, table, server_id: int = None):
+        """
+        Usage: {0}retention remove <table> [server id]
+        Output:
+            Removes the retention policy of <table>
+            for the current server, or [server id].
+            Server id 0 removes the default.
+        """
+        if server_id is None:
+            server_id = ctx.guild.id if ctx.guild else 0
+        if not await retention.remove_policy(server_id, table.lower()):
+            return await ctx.fail("No such retention policy.")
+        await ctx.success(f"Removed the {table.lower()} retention policy.")
+
+    @retention.command(name="run", brief="Start a retention pass now.")
+    async def retention_run(self, ctx):
+        """
+        Usage: {0}retention run
+        Output:
+            Applies every retention policy now
+            instead of waiting for the next pass.
+        Notes:
+            Expired message partitions are archived
+            to data/archive, then dropped.
+        """
+        if self.retaining:
+            return await ctx.fail("A retention pass is already running.")
+        c = await ctx.confirm("This action will delete expired history.")
+        if not c:
+            return
+        await ctx.success("Retention pass started.")
+        job = await self.run_retention()
+        if job is None:
+            return await ctx.fail("Finish the partition migration first.")
+        await ctx.success(
+            f"Retention pass complete. Deleted {sum(job.deleted.values()):,} rows."
+        )
+
+    @retention.command(name="archives", brief="Show the archived partitions.")
+    async def retention_archives(self, ctx):
+        """
+        Usage: {0}retention archives
+        Output:
+            Shows every message partition moved
+            to the columnar archive, its rows,
+            and its size on disk.
+        """
+        archives = archive.get_archives()
+        if not archives:
+            return await ctx.fail("No partitions have been archived.")
+        table = formatting.TabularData()
+        table.set_columns(["PARTITION", "ROWS", "SIZE"])
+        table.add_rows(
+            [
+                (
+                    meta["name"],
+                    f"{meta['rows']:,}",
+                    f"{meta['bytes'] / 1024 ** 2:.1f} MB",
+                )
+                for meta in archives
+            ]
+        )
+        await ctx.send_or_reply(f"```sml\n{table.render()}```")
@@ -3,6 +3,7 @@ import os
 import sys
 import copy
 import time
+import random
 import subprocess
 import typing
 import discord
@@ -13,6 +14,7 @@ import threading
 import traceback
 import contextlib
 
+from datetime import datetime
 from discord.ext import commands, menus
 
 from utilities import utils
@@ -216,6 +218,85 @@ class Manager(commands.Cog):
 
         await ctx.success("**Successfully reloaded all extensions.**")
 
+    @decorators.command(
+        aliases=["rt"],
+        brief="Check batch reloads lose no rows.",
+        implemented="2026-10-18 00:00:00.000000",
+        updated="2026-10-18 00:00:00.000000",
+        examples="""
+                {0}rt
+                {0}reloadtest 20000 10
+                """,
+    )
+    async def reloadtest(self, ctx, rows: int = 5000, reloads: int = 5):
+        """
+        Usage: {0}reloadtest [rows] [reloads]
+        Alias: {0}rt
+        Output:
+            Records synthetic messages through the batch
+            cog while reloading it [reloads] times, then
+            checks that every row reached the database once.
+        Notes:
+            Synthetic rows use server_id 0 and
+            are deleted once they are counted.
+        """
+        if not self.bot.get_cog("Batch"):
+            return await ctx.fail("The batch cog is not loaded.")
+        await ctx.trigger_typing()
+
+        message_ids = random.sample(range(1, 1 << 62), rows)
+
+        async def produce():
+            for idx, message_id in enumerate(message_ids):
+                self.bot.get_cog("Batch").record(
+                    "message",
+                    time.time(),
+                    datetime.utcnow(),
+                    "reloadtest",
+                    message_id,
+                    ctx.author.id,
+                    ctx.channel.id,
+                    0,
+                )
+                if idx % 100 == 0:  # Let flushes and reloads interleave.
+                    await asyncio.sleep(0)
+
+        producer = self.bot.loop.create_task(produce())
+        retired = []
+        for _ in range(reloads):
+            await asyncio.sleep(random.uniform(0.05, 0.5))
+            retired.append(self.bot.get_cog("Batch"))
+            self.bot.reload_extension("cogs.batch")
+        await producer
+
+        # Let flushes started by old instances finish, then flush the rest.
+        for batch in retired:
+            await batch.scheduler.join()
+        await self.bot.get_cog("Batch").scheduler.flush_all()
+
+        query = """
+                SELECT COUNT(*) AS total,
+                COUNT(DISTINCT message_id) AS stored
+                FROM messages
+                WHERE server_id = 0
+                AND message_id = ANY($1::BIGINT[]);
+                """
+        total, stored = await self.bot.cxn.fetchrow(query, message_ids)
+        query = """
+                DELETE FROM messages
+                WHERE server_id = 0
+                AND message_id = ANY($1::BIGINT[]);
+                """
+        await self.bot.cxn.execute(query, message_ids)
+
+        result = (
+            f"Recorded {rows:,} rows across {reloads} reloads. "
+            f"Stored {stored:,}, lost {rows - stored:,}, duplicated {total - stored:,}."
+        )
+        if stored != rows:
+            return await ctx.fail(result)
+        await ctx.success(result)
+
     @decorators.command(
         brief="Reload a utilities module.",
         aliases=["reloadutils", "reloadutility", "ru"],
@@ -410,9 +491,9 @@ class Manager(commands.Cog):
                 WHERE client_id = $1
                 """
         await self.bot.cxn.execute(query, client_id, invoker, message, channel)
+        await self.bot.close()  # Drains the batch buffers first.
         self.bot.loop.stop()
         self.bot.loop.close()
-        await self.bot.close()
         # Kill the process
         sys.exit(0)
 
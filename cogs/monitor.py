@@ -1,18 +1,33 @@
 import discord
 import os
 import io
+import time
+import random
 import asyncio
 import threading
 import psutil
 import sys
+import tempfile
 import functools
 import objgraph
 import traceback
 
 from discord.ext import commands, menus
+from PIL import Image
 
+from datetime import datetime, timedelta
+
+from utilities import utils
 from utilities import checks
+from utilities import ingest
+from utilities import images
+from utilities import spool
+from utilities import recent
+from utilities import render
+from utilities import lastseen
+from utilities import scheduler
 from utilities import decorators
+from utilities import formatting
 from utilities import pagination
 
 def setup(bot):
@@ -399,6 +414,63 @@ class Monitor(commands.Cog):
         except menus.MenuError as e:
             await ctx.send_or_reply(e)
 
+    @decorators.command(
+        aliases=["flushstats"],
+        brief="Show batch flush sizes.",
+        implemented="2026-10-18 00:00:00.000000",
+        updated="2026-10-18 00:00:00.000000",
+    )
+    async def batching(self, ctx):
+        """
+        Usage: {0}batching
+        Alias: {0}flushstats
+        Output:
+            Shows the flush policy of every batch buffer
+            and the batch sizes the scheduler has chosen.
+        Notes:
+            Policies are set with the "flush" key in
+            ./config.json. Rows and age are the triggers,
+            chunk caps the rows sent per statement.
+        """
+        batch = self.bot.get_cog("Batch")
+        if not batch:
+            return await ctx.fail("The batch cog is not loaded.")
+
+        table = formatting.TabularData()
+        table.set_columns(
+            [
+                "BUFFER",
+                "ROWS",
+                "AGE MS",
+                "CHUNK",
+                "PENDING",
+                "FLUSHES",
+                "LAST",
+                "MEAN",
+                "MAX",
+                "BY ROWS",
+                "BY AGE",
+            ]
+        )
+        for name, policy in batch.scheduler.policies.items():
+            stats = batch.scheduler.stats[name]
+            table.add_row(
+                [
+                    name.replace("_batch", ""),
+                    policy.rows,
+                    policy.age,
+                    policy.chunk,
+                    batch.scheduler.pending[name],
+                    stats.flushes,
+                    stats.last,
+                    f"{stats.mean:.1f}",
+                    stats.max,
+                    stats.by_rows,
+                    stats.by_age,
+                ]
+            )
+        await ctx.send_or_reply(f"```sml\n{table.render()}```")
+
     @decorators.command(brief="Show bot health.")
     async def bothealth(self, ctx):
         """
@@ -491,4 +563,382 @@ class Monitor(commands.Cog):
 
         embed.set_footer(text=f"{total_warnings} warning(s)")
         embed.description = "\n".join(description)
-        await ctx.send_or_reply(embed=embed)
\ No newline at end of file
+        await ctx.send_or_reply(embed=embed)
+
+    @decorators.group(
+        aliases=["bench"],
+        invoke_without_command=True,
+        brief="Run performance benchmarks.",
+        implemented="2026-10-18 00:00:00.000000",
+        updated="2026-10-18 00:00:00.000000",
+    )
+    async def benchmark(self, ctx):
+        """
+        Usage: {0}benchmark <option>
+        Alias: {0}bench
+        Output: Runs a benchmark and shows the results.
+        Options:
+            ingest: Compare the batch insert backends
+            listeners: Listener latency under a slow database
+            windows: Time window predicates on messages and commands
+            renders: Image render throughput by pool size
+            images: Time every image function
+        """
+        if not ctx.invoked_subcommand:
+            return await ctx.usage("<option>")
+
+    @benchmark.command(brief="Compare the batch insert backends.")
+    async def ingest(self, ctx, rows: int = 10000, chunk: int = 500):
+        """
+        Usage: {0}benchmark ingest [rows] [chunk]
+        Output:
+            Inserts synthetic messages through every
+            ingest backend into temporary tables and
+            shows rows/sec and event loop CPU time.
+        Notes:
+            Nothing is persisted. Rows are written in
+            chunks of [chunk] to mimic batch flushes.
+        """
+        await ctx.trigger_typing()
+        now = datetime.utcnow()
+        data = [
+            (
+                time.time(),
+                now,
+                "".join(random.choices("abcdefghijklmnopqrstuvwxyz ", k=64)),
+                random.getrandbits(62),
+                random.getrandbits(62),
+                random.getrandbits(62),
+                random.getrandbits(62),
+            )
+            for _ in range(rows)
+        ]
+        columns = ingest.TABLES["messages"]
+        results = []
+        async with self.bot.cxn.acquire() as con:
+            for name, backend in ingest.BACKENDS.items():
+                backend = backend(self.bot.cxn)
+                async with con.transaction():
+                    # Shadows the real table for this connection only.
+                    await con.execute(
+                        "CREATE TEMP TABLE messages ({0}) ON COMMIT DROP;".format(
+                            ", ".join(f"{c} {ingest.TYPES[c]}" for c in columns)
+                        )
+                    )
+                    wall = time.perf_counter()
+                    cpu = time.thread_time()
+                    for i in range(0, len(data), chunk):
+                        await backend.insert(
+                            "messages", data[i : i + chunk], connection=con
+                        )
+                    cpu = time.thread_time() - cpu
+                    wall = time.perf_counter() - wall
+                results.append(
+                    (name, f"{rows / wall:,.0f}", f"{wall * 1000:.2f}", f"{cpu * 1000:.2f}")
+                )
+
+        table = formatting.TabularData()
+        table.set_columns(["BACKEND", "ROWS/SEC", "WALL MS", "LOOP CPU MS"])
+        table.add_rows(results)
+        await ctx.send_or_reply(
+            f"**Inserted {rows:,} rows in chunks of {chunk:,}**```sml\n{table.render()}```"
+        )
+
+    @benchmark.command(brief="Listener latency under a slow database.")
+    async def listeners(self, ctx, events: int = 500, delay: int = 250):
+        """
+        Usage: {0}benchmark listeners [events] [delay]
+        Output:
+            Fires [events] synthetic gateway events while a
+            flusher writes with a [delay] ms round trip, and
+            shows how long each listener took to buffer its row.
+        Notes:
+            Compares the old global lock held across the write
+            against the batch cog's own record and detached path,
+            run on a scratch spool and buffers.
+        """
+        if not self.bot.get_cog("Batch"):
+            return await ctx.fail("The Batch cog is not loaded.")
+        await ctx.trigger_typing()
+        results = []
+        for mode in ("locked", "swap"):
+            latencies = await self._listener_latency(mode, events, delay / 1000)
+            latencies.sort()
+            results.append(
+                (
+                    mode,
+                    f"{latencies[len(latencies) // 2] * 1000:.3f}",
+                    f"{latencies[int(len(latencies) * 0.99)] * 1000:.3f}",
+                    f"{latencies[-1] * 1000:.3f}",
+                )
+            )
+
+        table = formatting.TabularData()
+        table.set_columns(["MODE", "P50 MS", "P99 MS", "MAX MS"])
+        table.add_rows(results)
+        await ctx.send_or_reply(
+            f"**{events:,} events against a {delay:,}ms writer**```sml\n{table.render()}```"
+        )
+
+    @benchmark.command(brief="Compare time window predicates.")
+    async def windows(self, ctx, days: int = 7, runs: int = 5):
+        """
+        Usage: {0}benchmark windows [days] [runs]
+        Output:
+            Counts this server's messages and commands
+            from the last [days] days with the old unix
+            and timestamp predicates and with snowflake
+            ranges, and shows the median of [runs] runs.
+        """
+        if not ctx.guild:
+            return await ctx.fail("This command can only be used in a server.")
+        await ctx.trigger_typing()
+        since = datetime.utcnow() - timedelta(days=days)
+        snowflake = utils.time_snowflake(since)
+        cases = [
+            ("messages", "unix", "unix > $2", time.time() - days * 86400),
+            ("messages", "timestamp", "timestamp > $2", since),
+            ("messages", "snowflake", "message_id >= $2", snowflake),
+            ("commands", "timestamp", "timestamp > $2", since),
+            ("commands", "snowflake", "message_id >= $2", snowflake),
+        ]
+        results = []
+        for table, name, predicate, arg in cases:
+            query = f"SELECT COUNT(*) FROM {table} WHERE server_id = $1 AND {predicate};"
+            timings = []
+            for _ in range(runs):
+                start = time.perf_counter()
+                rows = await self.bot.cxn.fetchval(query, ctx.guild.id, arg)
+                timings.append(time.perf_counter() - start)
+            timings.sort()
+            results.append(
+                (table, name, f"{rows:,}", f"{timings[len(timings) // 2] * 1000:.2f}")
+            )
+
+        table = formatting.TabularData()
+        table.set_columns(["TABLE", "PREDICATE", "ROWS", "MEDIAN MS"])
+        table.add_rows(results)
+        await ctx.send_or_reply(
+            f"**{days:,} day window over {runs:,} runs**```sml\n{table.render()}```"
+        )
+
+    @benchmark.command(brief="Image render throughput by pool size.")
+    async def renders(self, ctx, jobs: int = 32):
+        """
+        Usage: {0}benchmark renders [jobs]
+        Output:
+            Renders [jobs] status bar graphs at once in the
+            thread executor and in render pools of 1, 2, 4
+            and one worker per core, and shows renders/sec.
+        Notes:
+            Pools are started and warmed up before timing,
+            so font loading and forking aren't counted.
+        """
+        await ctx.trigger_typing()
+        statuses = {"online": 86400, "idle": 3600, "dnd": 7200, "offline": 43200}
+        cores = os.cpu_count() or 1
+        results = []
+
+        start = time.perf_counter()
+        await asyncio.gather(
+            *[
+                self.bot.loop.run_in_executor(
+                    None, images.get_barstatus, "", statuses
+                )
+                for _ in range(jobs)
+            ]
+        )
+        wall = time.perf_counter() - start
+        results.append(("threads", f"{jobs / wall:,.1f}", f"{wall * 1000:.2f}"))
+
+        for workers in sorted({1, 2, 4, cores}):
+            renderer = render.Renderer(workers=workers, queue=jobs)
+            try:
+                await asyncio.gather(
+                    *[
+                        renderer.render(images.get_barstatus, "", statuses)
+                        for _ in range(workers)
+                    ]
+                )
+                start = time.perf_counter()
+                await asyncio.gather(
+                    *[
+                        renderer.render(images.get_barstatus, "", statuses)
+                        for _ in range(jobs)
+                    ]
+                )
+                wall = time.perf_counter() - start
+            finally:
+                renderer.close()
+            results.append(
+                (f"{workers} workers", f"{jobs / wall:,.1f}", f"{wall * 1000:.2f}")
+            )
+
+        table = formatting.TabularData()
+        table.set_columns(["EXECUTOR", "RENDERS/SEC", "WALL MS"])
+        table.add_rows(results)
+        await ctx.send_or_reply(
+            f"**{jobs:,} renders on {cores} cores**```sml\n{table.render()}```"
+        )
+
+    @benchmark.command(name="images", brief="Time every image function.")
+    async def _images(self, ctx, runs: int = 20):
+        """
+        Usage: {0}benchmark images [runs]
+        Output:
+            Times each function in the image module on
+            synthetic input and shows the median and
+            fastest of [runs] runs.
+        Notes:
+            Runs in a thread, so the gateway is not
+            blocked, but the timings include contention.
+        """
+        await ctx.trigger_typing()
+        results = await self.bot.loop.run_in_executor(
+            None, self._image_timings, runs
+        )
+        table = formatting.TabularData()
+        table.set_columns(["FUNCTION", "MEDIAN MS", "MIN MS"])
+        table.add_rows(results)
+        await ctx.send_or_reply(
+            f"**Image functions over {runs:,} runs**```sml\n{table.render()}```"
+        )
+
+    def _image_timings(self, runs):
+        statuses = {"online": 86400, "idle": 3600, "dnd": 7200, "offline": 43200}
+        avatar = io.BytesIO()
+        Image.new("RGBA", (128, 128), images.PINK).save(avatar, "png")
+        large = io.BytesIO()
+        Image.effect_noise((1024, 1024), 64).save(large, "png")
+        cases = [
+            ("progress_bar", images.get_progress_bar, lambda: (random.random(),)),
+            ("barstatus", images.get_barstatus, lambda: ("", statuses)),
+            ("piestatus", images.get_piestatus, lambda: (statuses, "1 day ago")),
+            ("welcome", images.get_welcome, lambda: (avatar.getvalue(), "a\nb")),
+            ("quilt", images.quilt, lambda: ([avatar.getvalue()] * 16,)),
+            (
+                "resize_to_limit",
+                images.resize_to_limit,
+                lambda: (io.BytesIO(large.getvalue()), large.getbuffer().nbytes // 2),
+            ),
+            (
+                "first_frame",
+                images.extract_first_frame,
+                lambda: (io.BytesIO(avatar.getvalue()),),
+            ),
+        ]
+        images.preload()
+        results = []
+        for name, func, make_args in cases:
+            timings = []
+            for _ in range(runs):
+                args = make_args()
+                start = time.perf_counter()
+                func(*args)
+                timings.append(time.perf_counter() - start)
+            timings.sort()
+            results.append(
+                (
+                    name,
+                    f"{timings[len(timings) // 2] * 1000:.2f}",
+                    f"{timings[0] * 1000:.2f}",
+                )
+            )
+        return results
+
+    async def _listener_latency(self, mode, events, delay):
+        latencies = []
+        if mode == "locked":
+            lock = asyncio.Lock()
+            buffer = []
+
+            async def flusher():
+                while True:
+                    await asyncio.sleep(0.2)  # The old message_inserter interval.
+                    async with lock:
+                        await asyncio.sleep(delay)  # Slow database round trip.
+                        buffer.clear()
+
+            async def listener(row):
+                start = time.perf_counter()
+                async with lock:
+                    buffer.append(row)
+                latencies.append(time.perf_counter() - start)
+
+            task = self.bot.loop.create_task(flusher())
+            try:
+                await self._fire(listener, events)
+            finally:
+                task.cancel()
+            return latencies
+
+        with tempfile.TemporaryDirectory() as path:
+            bench = self._bench_batch(path, delay)
+
+            async def listener(row):
+                start = time.perf_counter()
+                bench.record("message", *row)
+                latencies.append(time.perf_counter() - start)
+
+            bench.scheduler.start()
+            try:
+                await self._fire(listener, events)
+            finally:
+                bench.scheduler.stop()
+                await bench.scheduler.join()
+                bench.spool.close()
+        return latencies
+
+    def _bench_batch(self, path, delay):
+        """
+        A Batch that was never loaded, with its own spool under path and
+        empty buffers, whose flushes sleep for delay instead of writing.
+        Listeners take the real record() and detached() path through it
+        without touching live rows.
+        """
+        cls = type(self.bot.get_cog("Batch"))
+        module = sys.modules[cls.__module__]
+        bench = cls.__new__(cls)
+        for name, factory in module.BUFFERS.items():
+            setattr(bench, name, factory())
+        bench.last_seen = lastseen.LastSeenStore()
+        bench.recent = recent.RecentMessages()
+        bench.spool = spool.Spool(path)
+        bench.unflushed = {}
+        bench.accepting = True
+        bench.successor = None
+
+        async def flush(name):
+            with bench.detached(name) as rows:
+                await asyncio.sleep(delay)  # Slow database round trip.
+                rows.clear()
+            bench.acknowledge()
+
+        bench.scheduler = scheduler.FlushScheduler(
+            self.bot.loop,
+            {
+                name: scheduler.FlushPolicy(**policy)
+                for name, policy in module.POLICIES.items()
+            },
+            flush,
+        )
+        return bench
+
+    async def _fire(self, listener, events):
+        """Pass listener a synthetic message every 2ms."""
+        await asyncio.gather(
+            *(
+                self._delayed(i * 0.002, listener(self._message(i)))
+                for i in range(events)
+            )
+        )
+
+    @staticmethod
+    def _message(i):
+        """A synthetic message batch row."""
+        return (time.time(), datetime.utcnow(), "benchmark", i + 1, 1, 1, 1)
+
+    @staticmethod
+    async def _delayed(delay, coro):
+        await asyncio.sleep(delay)
+        await coro
@@ -1,13 +1,15 @@
 import itertools
-import re
+import typing
 import discord
 import colorsys
 
-from collections import Counter
 from discord.ext import commands, menus
 
+from settings import emojis
+from settings import rollups
 from utilities import utils
 from utilities import checks
+from utilities import humantime
 from utilities import converters
 from utilities import decorators
 from utilities import pagination
@@ -185,26 +187,26 @@ class Stats(commands.Cog):
     @checks.bot_has_perms(add_reactions=True, embed_links=True, external_emojis=True)
     @checks.has_perms(view_audit_log=True)
     @checks.cooldown()
-    async def emojiusage(self, ctx, emoji: converters.GuildEmojiConverter):
+    async def emojiusage(
+        self,
+        ctx,
+        emoji: converters.GuildEmojiConverter,
+        *,
+        since: humantime.PastTime = None,
+    ):
         """
-        Usage: {0}emojiusage <custom emoji>
+        Usage: {0}emojiusage <custom emoji> [since]
         Aliases: 0}emojiusage, {0}emoteusage
         Output: Usage stats on the passed emoji
+        Notes:
+            Specify a time to only count
+            uses since then, like 7d.
         """
         await ctx.trigger_typing()
-        eregex = re.compile(r"<a?:.+?:{emoji.id}>")
-        query = f"""
-                SELECT author_id, string_agg(content, '') AS emojis
-                FROM messages
-                WHERE content ~ '<a?:.+?:{emoji.id}>'
-                GROUP BY author_id;
-                """
-
-        emoji_usage = await self.bot.cxn.fetch(query)
-        matches = {
-            record["author_id"]: len(eregex.findall(record["emojis"]))
-            for record in emoji_usage
-        }
+        records = await emojis.top_users(
+            ctx.guild.id, emoji.id, since.dt if since else None
+        )
+        matches = {record["author_id"]: record["uses"] for record in records}
 
         def pred(snowflake):
             mem = ctx.guild.get_member(snowflake)
@@ -249,9 +251,15 @@ class Stats(commands.Cog):
     @checks.guild_only()
     @checks.bot_has_perms(add_reactions=True, embed_links=True, external_emojis=True)
     @checks.has_perms(view_audit_log=True)
-    async def emojistats(self, ctx, user: converters.DiscordMember = None):
+    async def emojistats(
+        self,
+        ctx,
+        user: typing.Optional[converters.DiscordMember] = None,
+        *,
+        since: humantime.PastTime = None,
+    ):
         """
-        Usage: {0}emojistats [user]
+        Usage: {0}emojistats [user] [since]
         Alias: {0}estats
         Permission: View Audit Log
         Output:
@@ -259,29 +267,30 @@ class Stats(commands.Cog):
         Notes:
             Specify an optional user to narrow
             statistics to be exclusive to the user.
+            Specify a time to only count uses
+            since then, like 7d.
         """
+        since = since.dt if since else None
         async with ctx.channel.typing():
             msg = await ctx.load("Collecting Emoji Statistics...")
             if user is None:
-                query = """
-                        SELECT (emoji_id, total)
-                        FROM emojistats
-                        WHERE server_id = $1
-                        ORDER BY total DESC;
-                        """
+                if since is None:  # Lifetime totals are kept separately.
+                    query = """
+                            SELECT emoji_id, total AS uses
+                            FROM emojistats
+                            WHERE server_id = $1
+                            ORDER BY total DESC;
+                            """
+                    result = await self.bot.cxn.fetch(query, ctx.guild.id)
+                else:
+                    result = await emojis.top_emojis(ctx.guild.id, since)
 
                 emoji_list = []
-                result = await self.bot.cxn.fetch(query, ctx.guild.id)
                 for x in result:
-                    try:
-                        emoji = self.bot.get_emoji(int(x[0][0]))
-                        if emoji is None:
-                            continue
-                        emoji_list.append((emoji, x[0][1]))
-
-                    except Exception as e:
-                        print(e)
+                    emoji = self.bot.get_emoji(x["emoji_id"])
+                    if emoji is None:
                         continue
+                    emoji_list.append((emoji, x["uses"]))
 
                 p = pagination.SimplePages(
                     entries=["{}: Uses: {}".format(e[0], e[1]) for e in emoji_list],
@@ -296,33 +305,22 @@ class Stats(commands.Cog):
             else:
                 if user.bot:
                     return await ctx.fail("I do not track bots.")
-                query = """
-                        SELECT (content)
-                        FROM messages
-                        WHERE content ~ '<a?:.+?:([0-9]{15,21})>'
-                        AND author_id = $1
-                        AND server_id = $2
-                        """
-
-                emoji_list = []
-                result = await self.bot.cxn.fetch(query, user.id, ctx.guild.id)
+                result = await emojis.top_emojis(ctx.guild.id, since, author_id=user.id)
                 if not result:
                     return await ctx.fail(
                         f"`{user}` has no recorded emoji usage stats."
                     )
 
-                matches = re.compile(r"<a?:.+?:[0-9]{15,21}>").findall(str(result))
-                total_uses = len(matches)
-                for x in matches:
-                    emoji = self.bot.get_emoji(int(x.split(":")[2].strip(">")))
+                total_uses = sum(x["uses"] for x in result)
+                emoji_list = []
+                for x in result:
+                    emoji = self.bot.get_emoji(x["emoji_id"])
                     if not emoji:
                         continue
-                    emoji_list.append(emoji)
-
-                emojis = Counter(emoji_list).most_common()
+                    emoji_list.append((emoji, x["uses"]))
 
                 p = pagination.SimplePages(
-                    entries=["{}: Uses: {}".format(e[0], e[1]) for e in emojis],
+                    entries=["{}: Uses: {}".format(e[0], e[1]) for e in emoji_list],
                     per_page=15,
                 )
                 p.embed.title = (
@@ -1362,14 +1360,7 @@ class Stats(commands.Cog):
         Get the number of messages send by a member
         inside a specific server. (Not bot wide)
         """
-        query = """
-                SELECT COUNT(*)
-                FROM messages
-                WHERE author_id = $1
-                AND server_id = $2;
-                """
-        msg_count = await self.bot.cxn.fetchval(query, member.id, member.guild.id)
-        return msg_count or 0
+        return await rollups.get_user_messages(member.guild.id, member.id)
 
     def role_accumulate(self, check_roles, members):
         """
@@ -3,12 +3,13 @@ import time
 import typing
 import asyncio
 import discord
-import inspect
 
 from datetime import datetime, timedelta
 from discord.ext import commands, menus
-from PIL import Image, ImageDraw, ImageFont
 
+from settings import archive
+from settings import rollups
+from settings import statuses
 from utilities import utils
 from utilities import checks
 from utilities import images
@@ -203,15 +204,7 @@ class Tracking(commands.Cog):
 
             msg += f"Commands Run  : {command_count}\n"
 
-            query = """
-                    SELECT COUNT(*)
-                    FROM messages
-                    WHERE author_id = $1
-                    AND server_id = $2;
-                    """
-            message_count = await self.bot.cxn.fetchval(query, user.id, ctx.guild.id)
-            if not message_count:
-                message_count = 0
+            message_count = await rollups.get_user_messages(ctx.guild.id, user.id)
 
             msg += f"Messages Sent : {message_count}\n"
 
@@ -328,13 +321,7 @@ class Tracking(commands.Cog):
         user = user or ctx.author
         if user.bot:
             raise commands.BadArgument("I do not track bots.")
-        query = """
-                SELECT COUNT(*) as c
-                FROM messages
-                WHERE author_id = $1
-                AND server_id = $2
-                """
-        count = await self.bot.cxn.fetchval(query, user.id, ctx.guild.id)
+        count = await rollups.get_user_messages(ctx.guild.id, user.id)
         await ctx.send_or_reply(
             f"`{user}` has sent **{count}** message{'' if count == 1 else 's'}"
         )
@@ -365,17 +352,7 @@ class Tracking(commands.Cog):
         if not str(limit).isdigit():
             raise commands.BadArgument("The `limit` argument must be an integer.")
 
-        query = """
-                SELECT author_id,
-                count(author_id)
-                FROM messages
-                WHERE server_id = $1
-                GROUP BY author_id
-                ORDER BY COUNT(author_id)
-                DESC LIMIT $2
-                """
-
-        msg_data = await self.bot.cxn.fetch(query, ctx.guild.id, limit)
+        msg_data = await rollups.leaderboard(ctx.guild.id, limit=limit)
         total = sum([row[1] for row in msg_data])
         entries = [f"<@!{row[0]}>. **Messages:** {row[1]:,}" for row in msg_data]
 
@@ -536,7 +513,7 @@ class Tracking(commands.Cog):
         await ctx.trigger_typing()
 
         query = """
-                SELECT avatars.url
+                SELECT avys.avatar AS hash, avatars.url
                 FROM (SELECT avatar, first_seen
                 FROM (SELECT avatar, LAG(avatar)
                 OVER (order by first_seen desc) AS old_avatar, first_seen
@@ -546,17 +523,23 @@ class Tracking(commands.Cog):
                 ORDER BY avys.first_seen DESC LIMIT 100;
                 """
 
-        urls = await self.bot.cxn.fetch(query, user.id)
+        records = await self.bot.cxn.fetch(query, user.id)
+        # Avatars seen before are read from disk, the rest are cached for next time.
+        cached = await self.bot.blobs.load_many(record["hash"] for record in records)
 
-        async def url_to_bytes(url):
-            if not url:
+        async def url_to_bytes(record):
+            if record["hash"] in cached:
+                return cached[record["hash"]]
+            if not record["url"]:
                 return None
-            bytes_av = await self.bot.get(url, res_method="read")
+            bytes_av = await self.bot.downloads.fetch(record["url"])
+            if bytes_av:
+                await self.bot.blobs.store(record["hash"], bytes_av)
             return bytes_av
 
-        avys = await asyncio.gather(*[url_to_bytes(url["url"]) for url in urls])
+        avys = await asyncio.gather(*[url_to_bytes(record) for record in records])
         if avys:
-            file = await self.bot.loop.run_in_executor(None, images.quilt, avys)
+            file = await self.bot.renderer.render(images.quilt, avys)
             dfile = discord.File(file, "avatars.png")
             embed = discord.Embed(color=self.bot.constants.embed)
             embed.title = f"Recorded Avatars for {user}"
@@ -972,16 +955,11 @@ class Tracking(commands.Cog):
         message = await ctx.load("Collecting Word Statistics...")
 
         query = """
-                SELECT word, count(*)
-                FROM messages, unnest(
-                string_to_array(
-                translate(content, '\n', ' '),
-                ' ')) word
-                WHERE LENGTH(word) > 1
-                AND server_id = $1
+                SELECT word, count
+                FROM word_counts
+                WHERE server_id = $1
                 AND author_id = $2
-                GROUP BY 1
-                ORDER BY 2 DESC
+                ORDER BY count DESC
                 LIMIT $3;
                 """
         records = await self.bot.cxn.fetch(query, ctx.guild.id, user.id, limit)
@@ -1052,16 +1030,11 @@ class Tracking(commands.Cog):
         message = await ctx.load("Collecting Word Statistics...")
 
         query = """
-                SELECT word, count(*)
-                FROM messages, unnest(
-                string_to_array(
-                translate(content, '\n', ' '),
-                ' ')) word
+                SELECT word, count
+                FROM word_counts
                 WHERE word = $1
-                AND LENGTH(word) > 1
                 AND server_id = $2
-                AND author_id = $3
-                GROUP BY 1;
+                AND author_id = $3;
                 """
         data = await self.bot.cxn.fetchrow(query, word, ctx.guild.id, user.id)
         if not data:
@@ -1113,31 +1086,22 @@ class Tracking(commands.Cog):
         if unit not in time_dict:
             unit = "month"
         time_seconds = time_dict.get(unit, 2592000)
-        now = int(time.time())
-        diff = now - time_seconds
-        query = """
-                SELECT COUNT(*) as c, author_id
-                FROM messages
-                WHERE server_id = $1
-                AND unix > $2
-                GROUP BY author_id
-                ORDER BY c DESC LIMIT 25;
-                """
-        stuff = await self.bot.cxn.fetch(query, ctx.guild.id, diff)
+        since = datetime.utcnow() - timedelta(seconds=time_seconds)
+        stuff = await rollups.leaderboard(ctx.guild.id, since)
 
         e = discord.Embed(
             title=f"Message Leaderboard",
-            description=f"{sum(x[0] for x in stuff)} messages from {len(stuff)} user{'' if len(stuff) == 1 else 's'} in the last {unit}",
+            description=f"{sum(x['messages'] for x in stuff)} messages from {len(stuff)} user{'' if len(stuff) == 1 else 's'} in the last {unit}",
             color=self.bot.constants.embed,
         )
         for n, v in enumerate(stuff[:24]):
             try:
-                name = ctx.guild.get_member(int(v[1])).name
+                name = ctx.guild.get_member(v["author_id"]).name
             except AttributeError:
                 continue
             e.add_field(
                 name=f"{n+1}. {name}",
-                value=f"{v[0]} message{'' if int(v[0]) == 1 else 's'}",
+                value=f"{v['messages']} message{'' if v['messages'] == 1 else 's'}",
             )
 
         await ctx.send_or_reply(embed=e)
@@ -1179,19 +1143,7 @@ class Tracking(commands.Cog):
         else:
             since = since.dt
 
-        seconds_ago = (discord.utils.utcnow() - since).total_seconds()
-        diff = time.time() - seconds_ago
-
-        query = """
-                SELECT COUNT(*) as c, author_id as author
-                FROM messages
-                WHERE server_id = $1
-                AND unix > $2
-                GROUP BY author_id
-                ORDER BY c DESC
-                LIMIT 100;
-                """
-        records = await self.bot.cxn.fetch(query, ctx.guild.id, diff)
+        records = await rollups.leaderboard(ctx.guild.id, since, limit=100)
         if not records:
             return await ctx.fail(
                 f"No messate statistics available for that time period."
@@ -1203,9 +1155,9 @@ class Tracking(commands.Cog):
                 return str(mem)
 
         usage_dict = {
-            str(pred(record["author"])): record["c"]
+            str(pred(record["author_id"])): record["messages"]
             for record in records
-            if pred(record["author"])
+            if pred(record["author_id"])
         }
 
         width = len(max(usage_dict, key=len))
@@ -1268,27 +1220,19 @@ class Tracking(commands.Cog):
         if unit not in time_dict:
             unit = "day"
         time_seconds = time_dict.get(unit, 2592000)
-        now = int(time.time())
-        diff = now - time_seconds
-        query = """
-                SELECT SUM(LENGTH(content)) as c, author_id, COUNT(*)
-                FROM messages
-                WHERE server_id = $1
-                AND unix > $2
-                GROUP BY author_id
-                ORDER BY c DESC LIMIT 25"""
-        stuff = await self.bot.cxn.fetch(query, ctx.guild.id, diff)
+        since = datetime.utcnow() - timedelta(seconds=time_seconds)
+        stuff = await rollups.leaderboard(ctx.guild.id, since, order="characters")
         e = discord.Embed(
             title="Character Leaderboard",
-            description=f"{sum(x[0] for x in stuff)} characters from {len(stuff)} user{'' if len(stuff) == 1 else 's'} in the last {unit}",
+            description=f"{sum(x['characters'] for x in stuff)} characters from {len(stuff)} user{'' if len(stuff) == 1 else 's'} in the last {unit}",
             color=self.bot.constants.embed,
         )
         for n, v in enumerate(stuff):
             try:
-                name = ctx.guild.get_member(int(v[1])).name
+                name = ctx.guild.get_member(v["author_id"]).name
             except AttributeError:
                 continue
-            e.add_field(name=f"{n+1}. {name}", value=f"{v[0]:,} chars")
+            e.add_field(name=f"{n+1}. {name}", value=f"{v['characters']:,} chars")
 
         await ctx.send_or_reply(embed=e)
 
@@ -1336,23 +1280,23 @@ class Tracking(commands.Cog):
             actual_time = 604800  # 1 week
             the_datetime = datetime.utcfromtimestamp(time.time() - actual_time)
 
-        query = """
-                SELECT COUNT(DISTINCT(days)) FROM (
-                SELECT EXTRACT(
-                    DAY FROM (
-                        TO_TIMESTAMP(unix)
-                    )
-                ) AS days
+        since = time.time() - (actual_time - 86400)
+        window, args = utils.snowflake_window(
+            "message_id", since, start=3, partition="timestamp"
+        )
+        query = f"""
+                SELECT DISTINCT EXTRACT(DAY FROM timestamp)::SMALLINT AS days
                 FROM messages
                 WHERE server_id = $1
-                WHERE author_id = $2
-                AND unix > (SELECT EXTRACT(EPOCH FROM NOW()) - $3)
-                ) as data
-                WHERE days IS NOT NULL;
+                AND author_id = $2
+                AND {window}
+                AND timestamp IS NOT NULL;
                 """
-        days = await self.bot.cxn.fetchval(
-            query, ctx.guild.id, user.id, (actual_time - 86400)
+        rows = await self.bot.cxn.fetch(query, ctx.guild.id, user.id, *args)
+        archived = await archive.active_days(
+            ctx.guild.id, utils.time_snowflake(since), author_id=user.id
         )
+        days = len({row["days"] for row in rows} | {day for _, day in archived})
         emote = self.bot.emote_dict["graph"]
         pluralize = "" if days == 1 else "s"
         timefmt = humantime.human_timedelta(the_datetime, accuracy=1)
@@ -1390,22 +1334,32 @@ class Tracking(commands.Cog):
         else:
             actual_time = 604800  # 1 week
             the_datetime = datetime.utcfromtimestamp(time.time() - actual_time)
-        query = """
+        since = time.time() - (actual_time - 86400)
+        window, args = utils.snowflake_window(
+            "message_id", since, start=2, partition="timestamp"
+        )
+        query = f"""
                 SELECT DISTINCT author_id AS user,
-                (SELECT EXTRACT(DAY FROM (TO_TIMESTAMP(unix))))::SMALLINT AS days
+                EXTRACT(DAY FROM timestamp)::SMALLINT AS days
                 FROM messages
                 WHERE server_id = $1
-                AND unix > (SELECT EXTRACT(EPOCH FROM NOW()) - $2)
-                ORDER BY days DESC;
+                AND {window};
                 """
-        rows = await self.bot.cxn.fetch(query, ctx.guild.id, (actual_time - 86400))
+        rows = await self.bot.cxn.fetch(query, ctx.guild.id, *args)
+        # Months moved to cold storage are merged in from the archive.
+        archived = await archive.active_days(ctx.guild.id, utils.time_snowflake(since))
+        rows = sorted(
+            {(row["user"], row["days"]) for row in rows} | archived,
+            key=lambda x: x[1] or 0,
+            reverse=True,
+        )
 
         def pred(snowflake):
             mem = ctx.guild.get_member(snowflake)
             if mem:
                 return str(mem)
 
-        fmt = {pred(record["user"]): record["days"] for record in rows}
+        fmt = {pred(user): days for user, days in rows}
 
         table = formatting.TabularData()
         table.set_columns(["NAME", "DAYS"])
@@ -1451,41 +1405,27 @@ class Tracking(commands.Cog):
     @checks.guild_only()
     @checks.bot_has_perms(attach_files=True, embed_links=True)
     @checks.cooldown()
-    async def statusinfo(
-        self, ctx, *, user: converters.SelfMember(view_audit_log=True) = None
-    ):
+    async def statusinfo(self, ctx, *, user: str = None):
         """
-        Usage: {0}statusinfo [user]
+        Usage: {0}statusinfo [user] [since]
         Aliases: {0}piestatus, {0}ps,
         Output:
             Show a pie chart graph with details of the
             passed user's status statistics.
         Notes:
             Will default to yourself if no user is passed.
+            Specify a time like 7d to only show the
+            statistics since then, to the hour.
         """
-        user = user or ctx.author
+        user, since = await self.split_since(ctx, user)
         if user.bot:
             raise commands.BadArgument("I do not track bots.")
 
         await ctx.trigger_typing()
-        query = """
-                SELECT * FROM userstatus
-                WHERE user_id = $1;
-                """
-        data = await self.bot.cxn.fetch(query, user.id)
+        data = await self.get_status_times(user, since)
         if not data:
             return await self.do_generic(ctx, user)
-        for row in data:
-            starttime = row["starttime"]
-            online_time = row["online"]
-            idle_time = row["idle"]
-            dnd_time = row["dnd"]
-            last_change = row["last_changed"]
-
-        em = discord.Embed(color=self.bot.constants.embed)
-        img = Image.new("RGBA", (2400, 1024), (0, 0, 0, 0))
-        draw = ImageDraw.Draw(img)
-        font = ImageFont.truetype("./data/assets/Helvetica.ttf", 100)
+        starttime, online_time, idle_time, dnd_time, last_change = data
 
         unix_timestamp = time.time()
         total = unix_timestamp - starttime
@@ -1497,259 +1437,79 @@ class Tracking(commands.Cog):
         elif str(user.status) == "dnd":
             dnd_time += unix_timestamp - last_change
 
-        uptime = online_time + idle_time + dnd_time
-        offline_time = total - uptime
-        raw_percent = uptime / total
-
-        status_list = [online_time, idle_time, dnd_time, offline_time]
-        status_list.sort()
-        if raw_percent > 1:
-            raw_percent = 1
-        percent = f"{raw_percent:.2%}"
-        em = discord.Embed(color=self.bot.constants.embed)
-        img = Image.new("RGBA", (2500, 1024), (0, 0, 0, 0))
-        draw = ImageDraw.Draw(img)
-        font = ImageFont.truetype("./data/assets/Helvetica.ttf", 100)
-        w, h = 1050, 1000
-        shape = [(50, 0), (w, h)]
-        draw.arc(
-            shape,
-            start=0,
-            end=360 * (status_list[-1] / total),
-            fill=self.get_color(self.retrieve_name(status_list[-1])),
-            width=200,
-        )
-        start = 360 * (status_list[-1] / total)
-        draw.arc(
-            shape,
-            start=start,
-            end=start + 360 * (status_list[-2] / total),
-            fill=self.get_color(self.retrieve_name(status_list[-2])),
-            width=200,
-        )
-        start = start + 360 * (status_list[-2] / total)
-        draw.arc(
-            shape,
-            start=start,
-            end=start + 360 * (status_list[-3] / total),
-            fill=self.get_color(self.retrieve_name(status_list[-3])),
-            width=200,
-        )
-        start = start + 360 * (status_list[-3] / total)
-        draw.arc(
-            shape,
-            start=start,
-            end=start + 360 * (status_list[-4] / total),
-            fill=self.get_color(self.retrieve_name(status_list[-4])),
-            width=200,
-        )
-        self.center_text(img, 1100, 1000, font, percent, (255, 255, 255))
-        font = ImageFont.truetype("./data/assets/Helvetica-Bold.ttf", 85)
-        draw.text(
-            (1200, 0), "Status Tracking Startdate:", fill=(255, 255, 255), font=font
-        )
-        font = ImageFont.truetype("./data/assets/Helvetica.ttf", 68)
-        draw.text(
-            (1200, 100),
-            utils.timeago(
-                datetime.utcnow() - datetime.utcfromtimestamp(starttime)
-            ),  # .split(".")[0] + "]",
-            fill=(255, 255, 255),
-            font=font,
-        )
-        font = ImageFont.truetype("./data/assets/Helvetica-Bold.ttf", 85)
-        draw.text((1200, 300), "Total Online Time:", fill=(255, 255, 255), font=font)
-        font = ImageFont.truetype("./data/assets/Helvetica.ttf", 68)
-        draw.text(
-            (1200, 400),
-            f"{uptime/3600:.2f} {'Hour' if int(uptime/3600) == 1 else 'Hours'}",
-            fill=(255, 255, 255),
-            font=font,
-        )
-        font = ImageFont.truetype("./data/assets/Helvetica-Bold.ttf", 85)
-        draw.text((1200, 600), "Status Information:", fill=(255, 255, 255), font=font)
-        font = ImageFont.truetype("./data/assets/Helvetica.ttf", 68)
-        draw.rectangle((1200, 800, 1275, 875), fill=(46, 204, 113), outline=(0, 0, 0))
-        draw.text(
-            (1300, 810),
-            f"Online: {online_time/total:.2%}",
-            fill=(255, 255, 255),
-            font=font,
-        )
-        draw.rectangle((1850, 800, 1925, 875), fill=(255, 228, 0), outline=(0, 0, 0))
-        draw.text(
-            (1950, 810),
-            f"Idle: {idle_time/total:.2%}",
-            fill=(255, 255, 255),
-            font=font,
-        )
-        draw.rectangle((1200, 900, 1275, 975), fill=(237, 41, 57), outline=(0, 0, 0))
-        draw.text(
-            (1300, 910),
-            f"DND: {dnd_time/total:.2%}",
-            fill=(255, 255, 255),
-            font=font,
-        )
-        draw.rectangle((1850, 900, 1925, 975), fill=(97, 109, 126), outline=(0, 0, 0))
-        draw.text(
-            (1950, 910),
-            f"Offline: {offline_time/total:.2%}",
-            fill=(255, 255, 255),
-            font=font,
+        statuses = {
+            "online": online_time,
+            "idle": idle_time,
+            "dnd": dnd_time,
+            "offline": total - online_time - idle_time - dnd_time,
+        }
+        startdate = utils.timeago(
+            datetime.utcnow() - datetime.utcfromtimestamp(starttime)
         )
+        await self.send_piestatus(ctx, user, statuses, startdate)
 
-        buffer = io.BytesIO()
-        img.save(buffer, "png")  # 'save' function for PIL
-        buffer.seek(0)
+    async def send_piestatus(self, ctx, user, statuses, startdate):
+        buffer = await self.bot.renderer.render(
+            images.get_piestatus, statuses, startdate
+        )
         dfile = discord.File(fp=buffer, filename="uptime.png")
+        em = discord.Embed(color=self.bot.constants.embed)
         em.title = f"{user}'s Status Statistics"
         em.set_image(url="attachment://uptime.png")
         await ctx.send_or_reply(embed=em, file=dfile)
 
-    def center_text(
-        self, img, strip_width, strip_height, font, text, color=(255, 255, 255)
-    ):
-        draw = ImageDraw.Draw(img)
-        text_width, text_height = draw.textsize(text, font)
-        position = ((strip_width - text_width) / 2, (strip_height - text_height) / 2)
-        draw.text(position, text, color, font=font)
-        return img
-
-    def get_color(self, status_type):
-        if str(status_type).startswith("online"):
-            color = discord.Color.green().to_rgb()
-        elif str(status_type).startswith("idle"):
-            color = (255, 228, 0)  # discord.Color.gold().to_rgb()
-        elif str(status_type).startswith("dnd"):
-            color = (237, 41, 57)  # discord.Color.red().to_rgb()
-        else:
-            color = (97, 109, 126)
-        return color
-
-    def retrieve_name(self, var):
-        callers_local_vars = inspect.currentframe().f_back.f_locals.items()
-        return [var_name for var_name, var_val in callers_local_vars if var_val is var][
-            0
-        ]
+    async def split_since(self, ctx, argument):
+        """
+        Split a trailing time like 7d off a rest of line member argument,
+        so member names with spaces still don't need quotes.
+        Returns the member, defaulting to the author, and the time or None.
+        """
+        since = None
+        if argument:
+            head, _, tail = argument.rpartition(" ")
+            try:
+                since = humantime.PastShortTime(tail, now=ctx.message.created_at)
+            except commands.BadArgument:
+                pass
+            else:
+                argument = head
+        if not argument:
+            return ctx.author, since
+        user = await converters.SelfMember(view_audit_log=True).convert(ctx, argument)
+        return user, since
 
-    async def do_generic(self, ctx, user):
-        em = discord.Embed(color=self.bot.constants.embed)
-        img = Image.new("RGBA", (2400, 1024), (0, 0, 0, 0))
-        draw = ImageDraw.Draw(img)
-        font = ImageFont.truetype("./data/assets/Helvetica.ttf", 100)
-
-        online_time = 0
-        idle_time = 0
-        dnd_time = 0
-        offline_time = 0
-        if str(user.status) == "online":
-            online_time = 1
-        elif str(user.status) == "idle":
-            idle_time = 1
-        elif str(user.status) == "dnd":
-            dnd_time = 1
-        elif str(user.status) == "offline":
-            offline_time = 1
-
-        total = offline_time + online_time + idle_time + dnd_time
-        uptime = online_time + idle_time + dnd_time
-        raw_percent = uptime / total
-        status_list = [online_time, idle_time, dnd_time, offline_time]
-        status_list.sort()
-        if raw_percent > 1:
-            raw_percent = 1
-        percent = f"{raw_percent:.2%}"
-        em = discord.Embed(color=self.bot.constants.embed)
-        img = Image.new("RGBA", (2500, 1024), (0, 0, 0, 0))
-        draw = ImageDraw.Draw(img)
-        font = ImageFont.truetype("./data/assets/Helvetica.ttf", 100)
-        w, h = 1050, 1000
-        shape = [(50, 0), (w, h)]
-        draw.arc(
-            shape,
-            start=0,
-            end=360 * (status_list[-1] / total),
-            fill=self.get_color(self.retrieve_name(status_list[-1])),
-            width=200,
-        )
-        start = 360 * (status_list[-1] / total)
-        draw.arc(
-            shape,
-            start=start,
-            end=start + 360 * (status_list[-2] / total),
-            fill=self.get_color(self.retrieve_name(status_list[-2])),
-            width=200,
-        )
-        start = start + 360 * (status_list[-2] / total)
-        draw.arc(
-            shape,
-            start=start,
-            end=start + 360 * (status_list[-3] / total),
-            fill=self.get_color(self.retrieve_name(status_list[-3])),
-            width=200,
-        )
-        start = start + 360 * (status_list[-3] / total)
-        draw.arc(
-            shape,
-            start=start,
-            end=start + 360 * (status_list[-4] / total),
-            fill=self.get_color(self.retrieve_name(status_list[-4])),
-            width=200,
-        )
-        self.center_text(img, 1100, 1000, font, percent, (255, 255, 255))
-        font = ImageFont.truetype("./data/assets/Helvetica-Bold.ttf", 85)
-        draw.text(
-            (1200, 0), "Status Tracking Startdate:", fill=(255, 255, 255), font=font
-        )
-        font = ImageFont.truetype("./data/assets/Helvetica.ttf", 68)
-        draw.text(
-            (1200, 100),
-            utils.format_time(datetime.utcnow()).split(".")[0] + "]",
-            fill=(255, 255, 255),
-            font=font,
-        )
-        font = ImageFont.truetype("./data/assets/Helvetica-Bold.ttf", 85)
-        draw.text((1200, 300), "Total Online Time:", fill=(255, 255, 255), font=font)
-        font = ImageFont.truetype("./data/assets/Helvetica.ttf", 68)
-        draw.text(
-            (1200, 400),
-            f"{uptime/3600:.2f} {'Hour' if int(uptime/3600) == 1 else 'Hours'}",
-            fill=(255, 255, 255),
-            font=font,
-        )
-        font = ImageFont.truetype("./data/assets/Helvetica-Bold.ttf", 85)
-        draw.text((1200, 600), "Status Information:", fill=(255, 255, 255), font=font)
-        font = ImageFont.truetype("./data/assets/Helvetica.ttf", 68)
-        draw.rectangle((1200, 800, 1275, 875), fill=(46, 204, 113), outline=(0, 0, 0))
-        draw.text(
-            (1300, 810),
-            f"Online: {online_time/total:.2%}",
-            fill=(255, 255, 255),
-            font=font,
-        )
-        draw.rectangle((1800, 800, 1875, 875), fill=(255, 228, 0), outline=(0, 0, 0))
-        draw.text(
-            (1900, 810), f"Idle: {idle_time/total:.2%}", fill=(255, 255, 255), font=font
-        )
-        draw.rectangle((1200, 900, 1275, 975), fill=(237, 41, 57), outline=(0, 0, 0))
-        draw.text(
-            (1300, 910), f"DND: {dnd_time/total:.2%}", fill=(255, 255, 255), font=font
-        )
-        draw.rectangle((1800, 900, 1875, 975), fill=(97, 109, 126), outline=(0, 0, 0))
-        draw.text(
-            (1900, 910),
-            f"Offline: {offline_time/total:.2%}",
-            fill=(255, 255, 255),
-            font=font,
+    async def get_status_times(self, user, since=None):
+        """
+        (starttime, online, idle, dnd, last_changed) for a user, either
+        lifetime totals or from the hourly rollups since a PastTime.
+        The ongoing status since last_changed is left to the caller.
+        """
+        if since is None:
+            query = """
+                    SELECT starttime, online, idle, dnd, last_changed
+                    FROM userstatus
+                    WHERE user_id = $1;
+                    """
+            row = await self.bot.cxn.fetchrow(query, user.id)
+            return tuple(row) if row else None
+        data = await statuses.get_window(user.id, since.dt.timestamp())
+        if not data:
+            return None
+        return (
+            data["starttime"],
+            data["online"],
+            data["idle"],
+            data["dnd"],
+            max(data["last_changed"], data["starttime"]),
         )
 
-        buffer = io.BytesIO()
-        img.save(buffer, "png")  # 'save' function for PIL
-        buffer.seek(0)
-        dfile = discord.File(fp=buffer, filename="uptime.png")
-        em.title = f"{user}'s Status Statistics"
-        em.set_image(url="attachment://statusinfo.png")
-        await ctx.send_or_reply(embed=em, file=dfile)
+    async def do_generic(self, ctx, user):
+        # No history yet, show the current status as the whole pie.
+        statuses = {"online": 0, "idle": 0, "dnd": 0, "offline": 0}
+        status = str(user.status)
+        statuses[status if status in statuses else "offline"] = 1
+        startdate = utils.format_time(datetime.utcnow()).split(".")[0] + "]"
+        await self.send_piestatus(ctx, user, statuses, startdate)
 
     @decorators.command(
         aliases=["bstatus", "bs"],
@@ -1777,34 +1537,25 @@ class Tracking(commands.Cog):
     @checks.guild_only()
     @checks.bot_has_perms(attach_files=True, embed_links=True)
     @checks.cooldown()
-    async def barstatus(
-        self, ctx, *, user: converters.SelfMember(view_audit_log=True) = None
-    ):
+    async def barstatus(self, ctx, *, user: str = None):
         """
-        Usage: {0}barstatus [user]
+        Usage: {0}barstatus [user] [since]
         Aliases: {0}bs {0}bstatus
         Output:
             Generates a bar graph showing
             a given user's status info.
         Notes:
             Will default to you if no
-            user is explicitly specified
+            user is explicitly specified.
+            Specify a time like 7d to only
+            show usage since then, to the hour.
         """
-        user = user or ctx.author
+        user, since = await self.split_since(ctx, user)
         await ctx.trigger_typing()
-        query = """
-                SELECT * FROM userstatus
-                WHERE user_id = $1;
-                """
-        data = await self.bot.cxn.fetch(query, user.id)
+        data = await self.get_status_times(user, since)
         if not data:
             return await self.do_generic(ctx, user)
-        for row in data:
-            starttime = row["starttime"]
-            online_time = row["online"]
-            idle_time = row["idle"]
-            dnd_time = row["dnd"]
-            last_change = row["last_changed"]
+        starttime, online_time, idle_time, dnd_time, last_change = data
 
         unix = time.time()
         if str(user.status) == "online":
@@ -1821,8 +1572,8 @@ class Tracking(commands.Cog):
             "dnd": dnd_time,
             "offline": offline_time,
         }
-        barstatus_file = await self.bot.loop.run_in_executor(
-            None, images.get_barstatus, "", statuses
+        barstatus_file = await self.bot.renderer.render(
+            images.get_barstatus, "", statuses
         )
         embed = discord.Embed(color=self.bot.constants.embed)
         embed.title = f"{user}'s status usage since {datetime.utcfromtimestamp(starttime).__format__('%B %-d, %Y')}"
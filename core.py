@@ -16,7 +16,7 @@ from discord.ext import commands, tasks
 from logging.handlers import RotatingFileHandler
 
 from settings import cleanup, database, constants
-from utilities import utils, avatars, override
+from utilities import utils, blobs, render, avatars, override, downloads
 
 MAX_LOGGING_BYTES = 32 * 1024 * 1024  # 32 MiB
 
@@ -126,6 +126,7 @@ class Snowbot(commands.AutoShardedBot):
             intents=discord.Intents.all(),
         )
         self.batch_inserts = int()  # Counter for number of inserts.
+        self.parked_batch = None  # Batch state between a cog unload and load.
         self.command_stats = collections.Counter()
         self.constants = constants
         self.cxn = database.postgres
@@ -158,7 +159,15 @@ class Snowbot(commands.AutoShardedBot):
         self.session = aiohttp.ClientSession(loop=self.loop)
         self.socket_events = collections.Counter()
 
-        self.cog_exceptions = ["BOTCONFIG", "BOTADMIN", "MANAGER", "JISHAKU", "DATABASE", "MONITOR"]
+        self.cog_exceptions = [
+            "BOTCONFIG",
+            "BOTADMIN",
+            "MANAGER",
+            "JISHAKU",
+            "DATABASE",
+            "MONITOR",
+            "MAINTENANCE",
+        ]
         self.hidden_cogs = ["BATCH", "TASKS", "HOME"]
         self.do_not_load = ["CONVERSION"]
         self.home_cogs = ["MUSIC"]
@@ -227,6 +236,18 @@ class Snowbot(commands.AutoShardedBot):
             pass
 
         await super().close()
+
+        # Flush everything still buffered before the pool goes away.
+        batch = self.get_cog("Batch") or self.parked_batch
+        if batch:
+            await batch.drain()
+        if hasattr(self, "avatar_saver"):
+            await self.avatar_saver.drain()
+        if hasattr(self, "blobs"):
+            self.blobs.close()
+        if hasattr(self, "renderer"):
+            self.renderer.close()
+
         await self.session.close()
 
     ##############################
@@ -471,8 +492,19 @@ class Snowbot(commands.AutoShardedBot):
         # Delete all records of servers that kicked the bot
         await cleanup.basic_cleanup(self.guilds)
 
+        self.blobs = blobs.BlobStore(**constants.blobs)  # Local avatar cache.
+        self.downloads = downloads.DownloadManager(
+            self.session, **constants.downloads
+        )  # Shared limits for image downloads.
+        self.renderer = render.Renderer(**constants.render)  # Image process pool.
         self.avatar_saver = avatars.AvatarSaver(
-            self.avatar_webhook, self.cxn, self.session, self.loop
+            self.avatar_webhook,
+            self.cxn,
+            self.session,
+            self.loop,
+            blobs=self.blobs,
+            downloads=self.downloads,
+            renderer=self.renderer,
         )  # Start saving avatars.
 
         # load all initial extensions
@@ -700,6 +732,8 @@ class Snowbot(commands.AutoShardedBot):
         elif isinstance(error, commands.CommandInvokeError):
             if "or fewer" in str(error):  # Message was too long to send
                 return await ctx.fail(f"Result was greater than the character limit.")
+            if isinstance(error.original, render.RenderBusy):
+                return await ctx.fail(str(error.original))
             err = utils.traceback_maker(error.original, advance=True)
             self.dispatch("error", "command_error", vars(ctx), tb=err)
             # Then we don't really know what this error is. Log it.
@@ -0,0 +1,76 @@
+CREATE TABLE IF NOT EXISTS emojistats (
+    index BIGSERIAL PRIMARY KEY,
+    server_id BIGINT,
+    emoji_id BIGINT,
+    total BIGINT DEFAULT 0 NOT NULL
+);
+CREATE UNIQUE INDEX IF NOT EXISTS emojistats_idx ON emojistats(server_id, emoji_id);
+
+-- Partitioned by month. Partitions are created ahead
+-- of time by the maintenance cog. See settings/partitions.py
+CREATE TABLE IF NOT EXISTS messages (
+    index BIGSERIAL,
+    unix REAL,
+    timestamp TIMESTAMP NOT NULL,
+    content TEXT,
+    message_id BIGINT,
+    author_id BIGINT,
+    channel_id BIGINT,
+    server_id BIGINT,
+    deleted BOOLEAN DEFAULT False,
+    edited BOOLEAN DEFAULT False,
+    PRIMARY KEY (index, timestamp)
+) PARTITION BY RANGE (timestamp);
+
+-- Older installs keep a plain table until migrated.
+DO $$
+BEGIN
+    IF (SELECT relkind FROM pg_class WHERE oid = TO_REGCLASS('messages')) = 'p' THEN
+        CREATE TABLE IF NOT EXISTS messages_default PARTITION OF messages DEFAULT;
+        CREATE INDEX IF NOT EXISTS messages_server_timestamp_idx ON messages (server_id, timestamp);
+    END IF;
+END $$;
+
+-- Per user word frequencies, counted when messages are flushed.
+CREATE TABLE IF NOT EXISTS word_counts (
+    server_id BIGINT,
+    author_id BIGINT,
+    word TEXT,
+    count BIGINT DEFAULT 0 NOT NULL,
+    PRIMARY KEY (server_id, author_id, word)
+);
+CREATE INDEX IF NOT EXISTS word_counts_top_idx ON word_counts(server_id, author_id, count DESC);
+
+-- Hourly message counters per user, added to when messages are flushed.
+CREATE TABLE IF NOT EXISTS message_rollups (
+    server_id BIGINT,
+    author_id BIGINT,
+    hour TIMESTAMP,
+    messages BIGINT DEFAULT 0 NOT NULL,
+    characters BIGINT DEFAULT 0 NOT NULL,
+    PRIMARY KEY (server_id, author_id, hour)
+);
+CREATE INDEX IF NOT EXISTS message_rollups_server_hour_idx ON message_rollups(server_id, hour);
+
+-- Resumable backfills over existing messages. The target is the
+-- last message index stored before incremental counting started.
+CREATE TABLE IF NOT EXISTS backfills (
+    name TEXT PRIMARY KEY,
+    cursor BIGINT DEFAULT 0 NOT NULL,
+    target BIGINT NOT NULL
+);
+INSERT INTO backfills (name, target)
+SELECT name, (SELECT COALESCE(MAX(index), 0) FROM messages)
+FROM UNNEST(ARRAY['word_counts', 'message_rollups']) AS name
+ON CONFLICT (name) DO NOTHING;
+
+CREATE TABLE IF NOT EXISTS commands (
+    index BIGSERIAL PRIMARY KEY,
+    server_id BIGINT,
+    channel_id BIGINT,
+    author_id BIGINT,
+    timestamp TIMESTAMP,
+    prefix TEXT,
+    command TEXT,
+    failed BOOLEAN
+);
\ No newline at end of file
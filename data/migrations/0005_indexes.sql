@@ -0,0 +1,9 @@
+-- migrate: no-transaction
+-- Indexes for the hot lookup paths. Built concurrently so ingest
+-- keeps running. Partitioned tables get one build per partition.
+CREATE INDEX CONCURRENTLY IF NOT EXISTS messages_server_author_idx ON messages (server_id, author_id);
+CREATE INDEX CONCURRENTLY IF NOT EXISTS messages_channel_message_idx ON messages (channel_id, message_id);
+CREATE INDEX CONCURRENTLY IF NOT EXISTS commands_server_timestamp_idx ON commands (server_id, timestamp);
+CREATE INDEX CONCURRENTLY IF NOT EXISTS tasks_expires_idx ON tasks (expires);
+CREATE INDEX CONCURRENTLY IF NOT EXISTS invites_server_idx ON invites (server_id);
+CREATE INDEX CONCURRENTLY IF NOT EXISTS warns_server_user_idx ON warns (server_id, user_id);
@@ -0,0 +1,11 @@
+-- migrate: no-transaction
+-- Time windows are queried as snowflake ranges on message_id.
+ALTER TABLE commands ADD COLUMN IF NOT EXISTS message_id BIGINT;
+-- Older commands get the first snowflake of the millisecond they ran in,
+-- a chunk at a time by the command_snowflakes backfill.
+INSERT INTO backfills (name, target)
+SELECT 'command_snowflakes', COALESCE(MAX(index), 0) FROM commands
+ON CONFLICT (name) DO NOTHING;
+CREATE INDEX CONCURRENTLY IF NOT EXISTS messages_server_message_idx ON messages (server_id, message_id);
+CREATE INDEX CONCURRENTLY IF NOT EXISTS commands_message_idx ON commands (message_id);
+CREATE INDEX CONCURRENTLY IF NOT EXISTS commands_server_message_idx ON commands (server_id, message_id);
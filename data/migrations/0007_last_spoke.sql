@@ -0,0 +1,12 @@
+-- Newest message per user and server, moved forward when messages are flushed.
+CREATE TABLE IF NOT EXISTS last_spoke (
+    user_id BIGINT,
+    server_id BIGINT,
+    unix DOUBLE PRECISION NOT NULL,
+    message_id BIGINT NOT NULL,
+    PRIMARY KEY (user_id, server_id)
+);
+
+INSERT INTO backfills (name, target)
+SELECT 'last_spoke', COALESCE(MAX(index), 0) FROM messages
+ON CONFLICT (name) DO NOTHING;
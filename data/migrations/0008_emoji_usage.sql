@@ -0,0 +1,16 @@
+-- Daily emoji uses per member. Days older than the retention
+-- window are folded into a row dated the first of their month.
+CREATE TABLE IF NOT EXISTS emoji_usage (
+    server_id BIGINT,
+    emoji_id BIGINT,
+    author_id BIGINT,
+    day DATE,
+    uses BIGINT DEFAULT 0 NOT NULL,
+    PRIMARY KEY (server_id, emoji_id, author_id, day)
+);
+CREATE INDEX IF NOT EXISTS emoji_usage_server_day_idx ON emoji_usage(server_id, day);
+CREATE INDEX IF NOT EXISTS emoji_usage_server_author_idx ON emoji_usage(server_id, author_id, day);
+
+INSERT INTO backfills (name, target)
+SELECT 'emoji_usage', COALESCE(MAX(index), 0) FROM messages
+ON CONFLICT (name) DO NOTHING;
@@ -0,0 +1,18 @@
+-- Append-only status intervals. Status codes are 1 online, 2 idle, 3 dnd.
+CREATE TABLE IF NOT EXISTS status_log (
+    user_id BIGINT NOT NULL,
+    status SMALLINT NOT NULL,
+    started TIMESTAMP NOT NULL,
+    seconds REAL NOT NULL
+);
+CREATE INDEX IF NOT EXISTS status_log_user_started_idx ON status_log(user_id, started);
+
+-- Seconds spent in each status per user and hour, built from status_log.
+CREATE TABLE IF NOT EXISTS status_rollups (
+    user_id BIGINT,
+    hour TIMESTAMP,
+    online DOUBLE PRECISION DEFAULT 0 NOT NULL,
+    idle DOUBLE PRECISION DEFAULT 0 NOT NULL,
+    dnd DOUBLE PRECISION DEFAULT 0 NOT NULL,
+    PRIMARY KEY (user_id, hour)
+);
@@ -0,0 +1,16 @@
+-- migrate: no-transaction
+-- Rows older than days are deleted, or compacted down to the newest row
+-- per user. server_id 0 is the default for every server without its own.
+CREATE TABLE IF NOT EXISTS retention_policies (
+    server_id BIGINT DEFAULT 0 NOT NULL,
+    table_name TEXT NOT NULL,
+    days INT NOT NULL CHECK (days > 0),
+    action TEXT DEFAULT 'delete' NOT NULL CHECK (action IN ('delete', 'compact')),
+    PRIMARY KEY (server_id, table_name)
+);
+-- Retention deletes walk these from the oldest row up.
+CREATE INDEX CONCURRENTLY IF NOT EXISTS messages_message_idx ON messages (message_id);
+CREATE INDEX CONCURRENTLY IF NOT EXISTS usernames_insertion_idx ON usernames (insertion);
+CREATE INDEX CONCURRENTLY IF NOT EXISTS usernicks_insertion_idx ON usernicks (insertion);
+CREATE INDEX CONCURRENTLY IF NOT EXISTS useravatars_first_seen_idx ON useravatars (first_seen);
+CREATE INDEX CONCURRENTLY IF NOT EXISTS tracker_unix_idx ON tracker (unix);
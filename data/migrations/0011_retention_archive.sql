@@ -0,0 +1,4 @@
+-- The default messages policy may also archive whole expired partitions.
+ALTER TABLE retention_policies DROP CONSTRAINT IF EXISTS retention_policies_action_check;
+ALTER TABLE retention_policies ADD CONSTRAINT retention_policies_action_check
+CHECK (action IN ('delete', 'compact', 'archive'));
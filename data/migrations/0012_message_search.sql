@@ -0,0 +1,15 @@
+-- Full text search over message content, filled at flush time.
+-- The 'simple' configuration doesn't stem, so any language matches.
+CREATE TABLE IF NOT EXISTS message_search (
+    message_id BIGINT PRIMARY KEY,
+    server_id BIGINT NOT NULL,
+    channel_id BIGINT NOT NULL,
+    author_id BIGINT NOT NULL,
+    document TSVECTOR NOT NULL
+);
+CREATE INDEX IF NOT EXISTS message_search_document_idx ON message_search USING GIN (document);
+CREATE INDEX IF NOT EXISTS message_search_server_message_idx ON message_search(server_id, message_id);
+
+INSERT INTO backfills (name, target)
+SELECT 'message_search', COALESCE(MAX(index), 0) FROM messages
+ON CONFLICT (name) DO NOTHING;
@@ -0,0 +1,3 @@
+-- migrate: no-transaction
+-- Finds the newest avatar row of a user, to skip inserting unchanged avatars.
+CREATE INDEX CONCURRENTLY IF NOT EXISTS useravatars_user_seen_idx ON useravatars (user_id, first_seen);
@@ -0,0 +1,191 @@
+# Module for the columnar cold storage of old message partitions
+# Every archived partition is a directory of .npy columns sorted by
+# (server_id, message_id), memory mapped when queried, so a server's
+# rows are found by binary search without reading the rest. Content
+# is rarely needed and compresses well, so it is kept gzipped.
+# Word counts, message counts and leaderboards never read it, they come
+# from word_counts and message_rollups, which outlive dropped partitions.
+import os
+import gzip
+import json
+import shutil
+import asyncio
+import logging
+import functools
+
+import numpy as np
+
+from . import database
+from utilities import utils
+
+log = logging.getLogger("INFO_LOGGER")
+
+conn = database.postgres
+
+PATH = "./data/archive"
+FETCH = 50000  # Rows read from the partition per round trip.
+COLUMNS = {
+    "server_id": np.int64,
+    "message_id": np.int64,
+    "author_id": np.int64,
+    "channel_id": np.int64,
+    "length": np.int32,
+}
+
+_loaded = {}  # Partition name -> {column: memory mapped array}
+
+
+def get_archives(path=PATH):
+    """Metadata of every archived partition, oldest first."""
+    if not os.path.isdir(path):
+        return []
+    archives = []
+    for name in sorted(os.listdir(path)):
+        if name.endswith(".tmp"):  # Interrupted export.
+            continue
+        meta = os.path.join(path, name, "meta.json")
+        if os.path.isfile(meta):
+            with open(meta, "r", encoding="utf-8") as fp:
+                archives.append(json.load(fp))
+    return archives
+
+
+def _create(tmp, rows):
+    os.makedirs(tmp, exist_ok=True)
+    columns = {
+        column: np.lib.format.open_memmap(
+            os.path.join(tmp, f"{column}.npy"), mode="w+", dtype=dtype, shape=(rows,)
+        )
+        for column, dtype in COLUMNS.items()
+    }
+    return columns, gzip.open(os.path.join(tmp, "content.jsonl.gz"), "wt")
+
+
+def _write(columns, fp, start, batch):
+    end = start + len(batch)
+    server_ids, message_ids, author_ids, channel_ids, contents = zip(*batch)
+    columns["server_id"][start:end] = server_ids
+    columns["message_id"][start:end] = message_ids
+    columns["author_id"][start:end] = author_ids
+    columns["channel_id"][start:end] = channel_ids
+    columns["length"][start:end] = [len(x) for x in contents]
+    fp.writelines(json.dumps(x) + "\n" for x in contents)
+    return end
+
+
+def _finish(name, columns, fp, written, tmp, final):
+    fp.close()
+    for array in columns.values():
+        array.flush()
+    first = columns["message_id"].min() if written else None
+    columns.clear()  # Unmaps the files before they are moved.
+    meta = {
+        "name": name,
+        "rows": written,
+        "first": str(utils.snowflake_time(int(first))) if written else None,
+        "bytes": sum(os.path.getsize(os.path.join(tmp, x)) for x in os.listdir(tmp)),
+    }
+    with open(os.path.join(tmp, "meta.json"), "w", encoding="utf-8") as fp:
+        json.dump(meta, fp)
+    if os.path.isdir(final):  # Exported before, but never dropped.
+        shutil.rmtree(final)
+    os.replace(tmp, final)
+
+
+async def export(name, path=PATH):
+    """
+    Write a message partition to path/name. Rows are streamed
+    straight into memory mapped columns, and the directory is only
+    renamed into place once complete, so a partial export is never
+    read. Encoding and disk writes run in the executor, so only
+    fetching rows happens on the event loop.
+    Returns the number of rows written.
+    """
+    loop = asyncio.get_running_loop()
+    final = os.path.join(path, name)
+    tmp = final + ".tmp"
+    query = f"""
+             SELECT COALESCE(server_id, 0), COALESCE(message_id, 0),
+             COALESCE(author_id, 0), COALESCE(channel_id, 0),
+             COALESCE(content, '')
+             FROM {name}
+             ORDER BY 1, 2;
+             """
+    async with conn.acquire() as con:
+        async with con.transaction(isolation="repeatable_read", readonly=True):
+            rows = await con.fetchval(f"SELECT COUNT(*) FROM {name};")
+            columns, fp = await loop.run_in_executor(None, _create, tmp, rows)
+            try:
+                cursor = await con.cursor(query)
+                written = 0
+                while written < rows:
+                    batch = await cursor.fetch(FETCH)
+                    if not batch:
+                        break
+                    written = await loop.run_in_executor(
+                        None, _write, columns, fp, written, batch
+                    )
+            except BaseException:
+                fp.close()
+                raise
+    await loop.run_in_executor(
+        None, _finish, name, columns, fp, written, tmp, final
+    )
+    _loaded.pop(name, None)
+    log.info(f"Archived {written} messages from {name} to {final}")
+    return written
+
+
+def load(name, path=PATH):
+    if name not in _loaded:
+        _loaded[name] = {
+            column: np.load(os.path.join(path, name, f"{column}.npy"), mmap_mode="r")
+            for column in COLUMNS
+        }
+    return _loaded[name]
+
+
+def server_slice(columns, server_id, since=None):
+    """Index range of a server's rows, from the snowflake since if given."""
+    server_ids = columns["server_id"]
+    start = np.searchsorted(server_ids, server_id, "left")
+    end = np.searchsorted(server_ids, server_id, "right")
+    if since:
+        start += np.searchsorted(columns["message_id"][start:end], since, "left")
+    return slice(start, end)
+
+
+def month_days(message_ids):
+    """Day of the month each snowflake was created on, in UTC."""
+    ms = (message_ids >> 22) + utils.DISCORD_EPOCH
+    dates = ms.astype("datetime64[ms]").astype("datetime64[D]")
+    return (dates - dates.astype("datetime64[M]")).astype(np.int64) + 1
+
+
+def _active_days(server_id, since, author_id, path):
+    found = set()
+    for meta in get_archives(path):
+        columns = load(meta["name"], path)
+        rows = server_slice(columns, server_id, since)
+        authors = columns["author_id"][rows]
+        days = month_days(columns["message_id"][rows])
+        if author_id is not None:
+            days = days[authors == author_id]
+            found.update((author_id, int(x)) for x in np.unique(days))
+        else:
+            pairs = np.unique(np.stack([authors, days], axis=1), axis=0)
+            found.update((int(a), int(d)) for a, d in pairs)
+    return found
+
+
+async def active_days(server_id, since=None, *, author_id=None, path=PATH):
+    """
+    Distinct (author_id, day of the month) pairs with archived messages
+    in a server since a snowflake, like the live EXTRACT(DAY FROM timestamp).
+    """
+    if not get_archives(path):
+        return set()
+    loop = asyncio.get_running_loop()
+    return await loop.run_in_executor(
+        None, functools.partial(_active_days, server_id, since, author_id, path)
+    )
@@ -0,0 +1,92 @@
+# Module for resumable backfills over the existing message history
+import asyncio
+import logging
+
+from . import database
+
+log = logging.getLogger("INFO_LOGGER")
+
+conn = database.postgres
+
+
+async def get_backfill(name):
+    query = """
+            SELECT cursor, target
+            FROM backfills
+            WHERE name = $1;
+            """
+    return await conn.fetchrow(query, name)
+
+
+async def get_pending():
+    """Names of the backfills that haven't reached their watermark."""
+    query = """
+            SELECT name
+            FROM backfills
+            WHERE cursor < target;
+            """
+    return [row["name"] for row in await conn.fetch(query)]
+
+
+async def backfill_chunk(name, query, size):
+    """
+    Run query over the next size message indexes below the watermark.
+    query receives the exclusive start and inclusive end index as $1, $2.
+    The results and the new cursor commit together, so an interrupted
+    backfill resumes without double counting.
+    Returns the new cursor, or None once the backfill is done.
+    """
+    async with conn.acquire() as con:
+        async with con.transaction():
+            select = """
+                     SELECT cursor, target
+                     FROM backfills
+                     WHERE name = $1
+                     FOR UPDATE;
+                     """
+            cursor, target = await con.fetchrow(select, name)
+            if cursor >= target:
+                return None
+            end = min(cursor + size, target)
+            await con.execute(query, cursor, end)
+            update = """
+                     UPDATE backfills
+                     SET cursor = $2
+                     WHERE name = $1;
+                     """
+            await con.execute(update, name, end)
+    return end
+
+
+async def run(name, query, chunk=10000, pause=0.1, progress=None):
+    """
+    Run a registered backfill to completion. Rows above its
+    watermark are handled at flush time instead.
+    progress is called with the cursor and target after every chunk.
+    """
+    _, target = await get_backfill(name)
+    while True:
+        cursor = await backfill_chunk(name, query, chunk)
+        if cursor is None:
+            break
+        if progress:
+            progress(cursor, target)
+        await asyncio.sleep(pause)  # Give ingest room to breathe.
+    log.info(f"Backfill {name} complete")
+    return target
+
+
+COMMAND_SNOWFLAKES = """
+                     UPDATE commands
+                     SET message_id = (
+                        (EXTRACT(EPOCH FROM timestamp) * 1000)::BIGINT - 1420070400000
+                     ) << 22
+                     WHERE index > $1 AND index <= $2
+                     AND message_id IS NULL
+                     AND timestamp IS NOT NULL;
+                     """
+
+
+async def command_snowflakes(chunk=10000, progress=None):
+    """Give commands stored before they had a message_id their snowflake."""
+    return await run("command_snowflakes", COMMAND_SNOWFLAKES, chunk, progress=progress)
@@ -86,6 +86,21 @@ async def destroy_server(guild_id):
     query = "DELETE FROM messages WHERE server_id = $1"
     await conn.execute(query, guild_id)
 
+    query = "DELETE FROM word_counts WHERE server_id = $1"
+    await conn.execute(query, guild_id)
+
+    query = "DELETE FROM message_rollups WHERE server_id = $1"
+    await conn.execute(query, guild_id)
+
+    query = "DELETE FROM last_spoke WHERE server_id = $1"
+    await conn.execute(query, guild_id)
+
+    query = "DELETE FROM emoji_usage WHERE server_id = $1"
+    await conn.execute(query, guild_id)
+
+    query = "DELETE FROM message_search WHERE server_id = $1"
+    await conn.execute(query, guild_id)
+
     query = "DELETE FROM usernicks WHERE server_id = $1"
     await conn.execute(query, guild_id)
 
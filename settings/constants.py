@@ -20,6 +20,15 @@ except KeyError as e:
           Add this key or the bot might not function properly.
           """
     )
+# Optional keys.
+ingest = config.get("ingest", "copy")  # Batch insert backend: "copy" or "jsonb"
+spool = config.get("spool", {})  # Spool kwargs: path, fsync, interval, segment_bytes, spill_bytes
+flush = config.get("flush", {})  # Per buffer flush policy: {"message_batch": {"rows": 2000, "age": 200, "chunk": 5000}}
+snipes = config.get("snipes", {})  # Recent message cache kwargs: per_channel, budget
+blobs = config.get("blobs", {})  # Avatar blob cache kwargs: path, budget
+downloads = config.get("downloads", {})  # Download kwargs: per_host, budget, retries
+render = config.get("render", {})  # Image process pool kwargs: workers, queue, timeout
+retention = config.get("retention", {})  # Retention kwargs: interval, chunk, max_lag, duty, policies
 avatars = {
     "red": "https://cdn.discordapp.com/attachments/846597178918436885/847339918216658984/red.png",
     "orange": "https://cdn.discordapp.com/attachments/846597178918436885/847342151238811648/orange.png",
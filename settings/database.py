@@ -1,4 +1,3 @@
-import os
 import time
 import asyncio
 import asyncpg
@@ -7,9 +6,9 @@ import logging
 from colr import color
 
 from settings import constants
+from settings import migrations
 
 info_logger = logging.getLogger("INFO_LOGGER")
-scripts = [x[:-4] for x in sorted(os.listdir("./data/scripts")) if x.endswith(".sql")]
 postgres = asyncio.get_event_loop().run_until_complete(
     asyncpg.create_pool(constants.postgres)
 )
@@ -18,10 +17,11 @@ prefixes = dict()
 settings = dict()
 bot_settings = dict()
 config = dict()
+finishing = None  # Background index builds and backfills.
 
 
 async def initialize(bot, members):
-    await scriptexec()
+    await migrate()
     await set_config_id(bot)
     await load_prefixes()
     await update_db(bot.guilds, members)
@@ -43,20 +43,30 @@ async def set_config_id(bot):
     await postgres.execute(query, bot.user.id)
 
 
-async def scriptexec():
-    # We execute the SQL script to make sure we have all our tables.
+async def migrate():
+    # Only pending migrations run, so this is one query when up to date.
+    global finishing
     st = time.time()
-    for script in scripts:
-        with open(f"./data/scripts/{script}.sql", "r", encoding="utf-8") as script:
-            try:
-                await postgres.execute(script.read())
-            except Exception as e:
-                print(e)
+    await migrations.migrate(postgres)
     print(
         color(
-            fore="#46648F", text=f"Script   execution : {str(time.time() - st)[:10]} s"
+            fore="#46648F", text=f"Schema   migration : {str(time.time() - st)[:10]} s"
         )
     )
+    # Index builds and backfills can take hours on a large history,
+    # so the bot starts without them and they finish in the background.
+    if finishing is None or finishing.done():
+        finishing = asyncio.create_task(finish_migrations())
+
+
+async def finish_migrations():
+    from settings import backfills  # It imports this module.
+
+    try:
+        await migrations.build_indexes(postgres)
+        await backfills.command_snowflakes()
+    except Exception as e:
+        info_logger.warning(f"Background migration failed: {e}")
 
 
 async def update_server(server, member_list):
@@ -0,0 +1,156 @@
+# Module for daily emoji usage with monthly compaction
+import re
+
+from collections import Counter
+from datetime import datetime, timedelta
+
+from . import database
+from . import backfills
+from . import partitions
+
+conn = database.postgres
+
+DAILY = 90  # Days kept at daily precision before folding into months.
+EMOJI_REGEX = re.compile(r"<a?:.+?:([0-9]{15,21})>")  # The backfill's pattern.
+
+
+def count_uses(batch):
+    """Flatten an emoji buffer into UNNEST arrays for emoji_usage."""
+    rows = []
+    for server_id, counter in batch.items():
+        for key, uses in counter.items():
+            if not isinstance(key, tuple):  # Buffered before usage was per user.
+                key = (0, key, datetime.utcnow().date())
+            author_id, emoji_id, day = key
+            rows.append((server_id, author_id, emoji_id, day, uses))
+    return rows
+
+
+def count_messages(rows):
+    """Rows like count_uses for the custom emojis in message batch rows."""
+    uses = Counter()
+    for _, timestamp, content, _, author_id, _, server_id in rows:
+        for emoji_id in EMOJI_REGEX.findall(content):
+            uses[server_id, author_id, int(emoji_id), timestamp.date()] += 1
+    return [(*key, count) for key, count in uses.items()]
+
+
+async def add_uses(rows, *, connection=None):
+    """Add rows from count_uses to the daily table and the lifetime totals."""
+    if not rows:
+        return
+    server_ids, author_ids, emoji_ids, days, uses = zip(*rows)
+    query = """
+            INSERT INTO emoji_usage (server_id, emoji_id, author_id, day, uses)
+            SELECT * FROM UNNEST(
+                $1::BIGINT[], $2::BIGINT[], $3::BIGINT[], $4::DATE[], $5::BIGINT[]
+            )
+            ON CONFLICT (server_id, emoji_id, author_id, day)
+            DO UPDATE SET uses = emoji_usage.uses + EXCLUDED.uses;
+            """
+    con = connection or conn
+    await con.execute(query, server_ids, emoji_ids, author_ids, days, uses)
+    query = """
+            INSERT INTO emojistats (server_id, emoji_id, total)
+            SELECT x.server_id, x.emoji_id, SUM(x.uses)
+            FROM UNNEST($1::BIGINT[], $2::BIGINT[], $3::BIGINT[])
+            AS x(server_id, emoji_id, uses)
+            GROUP BY 1, 2
+            ON CONFLICT (server_id, emoji_id) DO UPDATE
+            SET total = emojistats.total + EXCLUDED.total;
+            """
+    await con.execute(query, server_ids, emoji_ids, uses)
+
+
+def window(since, start):
+    """Day predicate for an optional since datetime, numbered from $start."""
+    if since is None:
+        return "TRUE", []
+    return f"day >= ${start}", [since.date()]
+
+
+async def top_emojis(server_id, since=None, *, author_id=None):
+    """Most used emojis of a server, or of one member, since a datetime."""
+    if author_id is None:
+        predicate, args = window(since, 2)
+        query = f"""
+                SELECT emoji_id, SUM(uses)::BIGINT AS uses
+                FROM emoji_usage
+                WHERE server_id = $1
+                AND {predicate}
+                GROUP BY emoji_id
+                ORDER BY uses DESC;
+                """
+        return await conn.fetch(query, server_id, *args)
+    predicate, args = window(since, 3)
+    query = f"""
+            SELECT emoji_id, SUM(uses)::BIGINT AS uses
+            FROM emoji_usage
+            WHERE server_id = $1
+            AND author_id = $2
+            AND {predicate}
+            GROUP BY emoji_id
+            ORDER BY uses DESC;
+            """
+    return await conn.fetch(query, server_id, author_id, *args)
+
+
+async def top_users(server_id, emoji_id, since=None):
+    """Members of a server ordered by how often they used an emoji."""
+    predicate, args = window(since, 3)
+    query = f"""
+            SELECT author_id, SUM(uses)::BIGINT AS uses
+            FROM emoji_usage
+            WHERE server_id = $1
+            AND emoji_id = $2
+            AND {predicate}
+            GROUP BY author_id
+            ORDER BY uses DESC;
+            """
+    return await conn.fetch(query, server_id, emoji_id, *args)
+
+
+async def compact(daily=DAILY):
+    """
+    Fold the daily rows of every month that ended more than daily
+    days ago into one row dated the first of the month.
+    Returns the number of daily rows folded.
+    """
+    cutoff = partitions.month_start(datetime.utcnow() - timedelta(days=daily)).date()
+    query = """
+            WITH folded AS (
+                DELETE FROM emoji_usage
+                WHERE day < $1
+                AND day <> DATE_TRUNC('month', day)::DATE
+                RETURNING *
+            ), merged AS (
+                INSERT INTO emoji_usage (server_id, emoji_id, author_id, day, uses)
+                SELECT server_id, emoji_id, author_id,
+                DATE_TRUNC('month', day)::DATE, SUM(uses)
+                FROM folded
+                GROUP BY 1, 2, 3, 4
+                ON CONFLICT (server_id, emoji_id, author_id, day)
+                DO UPDATE SET uses = emoji_usage.uses + EXCLUDED.uses
+            )
+            SELECT COUNT(*) FROM folded;
+            """
+    return await conn.fetchval(query, cutoff)
+
+
+BACKFILL = """
+           INSERT INTO emoji_usage (server_id, emoji_id, author_id, day, uses)
+           SELECT server_id, m[1]::BIGINT, author_id, timestamp::DATE, COUNT(*)
+           FROM messages, REGEXP_MATCHES(content, '<a?:.+?:([0-9]{15,21})>', 'g') m
+           WHERE index > $1
+           AND index <= $2
+           AND server_id IS NOT NULL
+           AND author_id IS NOT NULL
+           GROUP BY 1, 2, 3, 4
+           ON CONFLICT (server_id, emoji_id, author_id, day)
+           DO UPDATE SET uses = emoji_usage.uses + EXCLUDED.uses;
+           """
+
+
+async def backfill(chunk=10000, progress=None):
+    """Count emoji usage of every message stored before the table went live."""
+    return await backfills.run("emoji_usage", BACKFILL, chunk, progress=progress)
@@ -0,0 +1,59 @@
+# Module for the last_spoke table, the newest message per user and server
+from . import database
+from . import backfills
+
+conn = database.postgres
+
+
+def latest(rows):
+    """Newest (unix, message_id) per (user_id, server_id) for message batch rows."""
+    newest = {}
+    for unix, _, _, message_id, author_id, _, server_id in rows:
+        key = (author_id, server_id)
+        current = newest.get(key)
+        if current is None or current[1] < message_id:
+            newest[key] = (unix, message_id)
+    return newest
+
+
+async def add_latest(newest, *, connection=None):
+    """Upsert the output of latest, only ever moving a row forward."""
+    if not newest:
+        return
+    query = """
+            INSERT INTO last_spoke (user_id, server_id, unix, message_id)
+            SELECT * FROM UNNEST(
+                $1::BIGINT[], $2::BIGINT[], $3::DOUBLE PRECISION[], $4::BIGINT[]
+            )
+            ON CONFLICT (user_id, server_id)
+            DO UPDATE SET unix = EXCLUDED.unix, message_id = EXCLUDED.message_id
+            WHERE last_spoke.message_id < EXCLUDED.message_id;
+            """
+    user_ids, server_ids = zip(*newest)
+    unixes, message_ids = zip(*newest.values())
+    await (connection or conn).execute(
+        query, user_ids, server_ids, unixes, message_ids
+    )
+
+
+# Taking the max is idempotent, so the watermark only bounds the work.
+BACKFILL = """
+           INSERT INTO last_spoke (user_id, server_id, unix, message_id)
+           SELECT DISTINCT ON (author_id, server_id)
+           author_id, server_id, unix, message_id
+           FROM messages
+           WHERE index > $1
+           AND index <= $2
+           AND author_id IS NOT NULL
+           AND server_id IS NOT NULL
+           AND message_id IS NOT NULL
+           ORDER BY author_id, server_id, message_id DESC
+           ON CONFLICT (user_id, server_id)
+           DO UPDATE SET unix = EXCLUDED.unix, message_id = EXCLUDED.message_id
+           WHERE last_spoke.message_id < EXCLUDED.message_id;
+           """
+
+
+async def backfill(chunk=10000, progress=None):
+    """Find the last message of every user stored before the table went live."""
+    return await backfills.run("last_spoke", BACKFILL, chunk, progress=progress)
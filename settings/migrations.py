@@ -0,0 +1,254 @@
+# Versioned schema migrations.
+# Every file in data/migrations is named NNNN_description.sql and is
+# applied once, in order, then recorded in schema_version with its
+# checksum. Files starting with "-- migrate: no-transaction" run one
+# statement at a time so they can use CREATE INDEX CONCURRENTLY. Those
+# index builds are queued in schema_indexes instead of run in place, so
+# startup doesn't wait on them, and build_indexes works through the
+# queue in the background. Nothing may depend on a queued index existing.
+import os
+import re
+import hashlib
+import logging
+
+log = logging.getLogger("INFO_LOGGER")
+
+PATH = "./data/migrations"
+NO_TRANSACTION = "-- migrate: no-transaction"
+LOCK = 0x5E4E  # Advisory lock key so only one process migrates at a time.
+INDEX_LOCK = 0x5E4F  # Same for building queued indexes.
+
+FILE_REGEX = re.compile(r"^(\d+)_(\w+)\.sql$")
+INDEX_REGEX = re.compile(
+    r"CREATE (UNIQUE )?INDEX CONCURRENTLY IF NOT EXISTS (\w+) ON (\w+) \((.+)\)",
+    re.IGNORECASE,
+)
+
+
+class Migration:
+    __slots__ = ("version", "name", "sql", "checksum")
+
+    def __init__(self, version, name, sql):
+        self.version = version
+        self.name = name
+        self.sql = sql
+        self.checksum = hashlib.sha256(sql.encode("utf-8")).hexdigest()
+
+    @property
+    def transactional(self):
+        return not self.sql.startswith(NO_TRANSACTION)
+
+    def statements(self):
+        """Split on statement ending semicolons. Only for no-transaction files."""
+        lines = [x for x in self.sql.splitlines() if not x.strip().startswith("--")]
+        return [x.strip() for x in "\n".join(lines).split(";") if x.strip()]
+
+
+def load(path=PATH):
+    migrations = []
+    for filename in sorted(os.listdir(path)):
+        match = FILE_REGEX.match(filename)
+        if not match:
+            continue
+        with open(os.path.join(path, filename), "r", encoding="utf-8") as fp:
+            sql = fp.read()
+        migrations.append(Migration(int(match.group(1)), match.group(2), sql))
+    versions = [m.version for m in migrations]
+    if len(versions) != len(set(versions)):
+        raise RuntimeError("Duplicate migration versions in " + path)
+    return migrations
+
+
+async def get_applied(con):
+    query = """
+            CREATE TABLE IF NOT EXISTS schema_version (
+                version INT PRIMARY KEY,
+                name TEXT NOT NULL,
+                checksum TEXT NOT NULL,
+                applied TIMESTAMP DEFAULT (NOW() AT TIME ZONE 'UTC')
+            );
+            """
+    await con.execute(query)
+    query = """
+            CREATE TABLE IF NOT EXISTS schema_indexes (
+                name TEXT PRIMARY KEY,
+                version INT NOT NULL,
+                is_unique BOOLEAN NOT NULL,
+                table_name TEXT NOT NULL,
+                columns TEXT NOT NULL
+            );
+            """
+    await con.execute(query)
+    query = """
+            SELECT version, checksum
+            FROM schema_version;
+            """
+    return {row["version"]: row["checksum"] for row in await con.fetch(query)}
+
+
+async def create_index(con, unique, name, table, columns):
+    """
+    CREATE INDEX CONCURRENTLY, including on partitioned tables where
+    postgres doesn't support it directly. The parent index is created
+    ON ONLY the parent, each partition is indexed concurrently and
+    attached, after which postgres marks the parent index valid.
+    """
+    unique = "UNIQUE " if unique else ""
+    query = """
+            SELECT relkind
+            FROM pg_class
+            WHERE oid = TO_REGCLASS($1);
+            """
+    if await con.fetchval(query, table) != "p":
+        query = """
+                SELECT indisvalid
+                FROM pg_index
+                WHERE indexrelid = TO_REGCLASS($1);
+                """
+        if await con.fetchval(query, name) is False:  # Left by an interrupted build.
+            await con.execute(f"DROP INDEX CONCURRENTLY {name};")
+        await con.execute(
+            f"CREATE {unique}INDEX CONCURRENTLY IF NOT EXISTS {name} "
+            f"ON {table} ({columns});"
+        )
+        return
+
+    await con.execute(
+        f"CREATE {unique}INDEX IF NOT EXISTS {name} ON ONLY {table} ({columns});"
+    )
+    query = """
+            SELECT child.relname
+            FROM pg_inherits
+            JOIN pg_class child ON pg_inherits.inhrelid = child.oid
+            WHERE pg_inherits.inhparent = TO_REGCLASS($1);
+            """
+    suffix = name[len(table) + 1 :] if name.startswith(table + "_") else name
+    for record in await con.fetch(query, table):
+        partition = record["relname"]
+        await create_index(con, unique, f"{partition}_{suffix}", partition, columns)
+        await con.execute(f"ALTER INDEX {name} ATTACH PARTITION {partition}_{suffix};")
+
+
+async def apply(con, migration):
+    query = """
+            INSERT INTO schema_version (version, name, checksum)
+            VALUES ($1, $2, $3);
+            """
+    if migration.transactional:
+        async with con.transaction():
+            await con.execute(migration.sql)
+            await con.execute(
+                query, migration.version, migration.name, migration.checksum
+            )
+        return
+    defer = """
+            INSERT INTO schema_indexes (name, version, is_unique, table_name, columns)
+            VALUES ($1, $2, $3, $4, $5)
+            ON CONFLICT (name) DO NOTHING;
+            """
+    # Every statement must be safe to rerun if this is interrupted.
+    for statement in migration.statements():
+        match = INDEX_REGEX.fullmatch(statement)
+        if match:
+            unique, name, table, columns = match.groups()
+            await con.execute(
+                defer, name, migration.version, bool(unique), table, columns
+            )
+        else:
+            await con.execute(statement)
+    await con.execute(query, migration.version, migration.name, migration.checksum)
+
+
+async def build_indexes(pool):
+    """
+    Build every index migrations queued, oldest migration first.
+    They're built concurrently, so ingest carries on meanwhile, and
+    a process that finds another one building leaves it to them.
+    Returns the names of the indexes built.
+    """
+    built = []
+    async with pool.acquire() as con:
+        if not await con.fetchval("SELECT PG_TRY_ADVISORY_LOCK($1);", INDEX_LOCK):
+            return built
+        try:
+            query = """
+                    SELECT is_unique, name, table_name, columns
+                    FROM schema_indexes
+                    ORDER BY version, name;
+                    """
+            for row in await con.fetch(query):
+                log.info(f"Building index {row['name']}")
+                await create_index(con, *row)
+                await con.execute(
+                    "DELETE FROM schema_indexes WHERE name = $1;", row["name"]
+                )
+                built.append(row["name"])
+        finally:
+            await con.execute("SELECT PG_ADVISORY_UNLOCK($1);", INDEX_LOCK)
+    return built
+
+
+async def migrate(pool, path=PATH):
+    """
+    Apply every pending migration. When the schema is current this
+    is a single query. Returns the list of migrations applied.
+    """
+    migrations = load(path)
+    async with pool.acquire() as con:
+        applied = await get_applied(con)
+        for migration in migrations:
+            checksum = applied.get(migration.version)
+            if checksum and checksum != migration.checksum:
+                log.warning(
+                    f"Migration {migration.version:04d}_{migration.name} "
+                    "was edited after it was applied"
+                )
+        pending = [m for m in migrations if m.version not in applied]
+        if not pending:
+            return []
+
+        await con.execute("SELECT PG_ADVISORY_LOCK($1);", LOCK)
+        try:
+            applied = await get_applied(con)  # Another process may have won.
+            done = []
+            for migration in pending:
+                if migration.version in applied:
+                    continue
+                log.info(
+                    f"Applying migration {migration.version:04d}_{migration.name}"
+                )
+                await apply(con, migration)
+                done.append(migration)
+            return done
+        finally:
+            await con.execute("SELECT PG_ADVISORY_UNLOCK($1);", LOCK)
+
+
+async def get_status(pool, path=PATH):
+    """
+    Every known migration with its applied time, if applied, whether
+    it was edited since and how many of its indexes are still queued.
+    """
+    query = """
+            SELECT version, checksum, applied
+            FROM schema_version;
+            """
+    rows = {row["version"]: row for row in await pool.fetch(query)}
+    query = """
+            SELECT version, COUNT(*)
+            FROM schema_indexes
+            GROUP BY version;
+            """
+    queued = dict(await pool.fetch(query))
+    status = []
+    for migration in load(path):
+        row = rows.get(migration.version)
+        status.append(
+            (
+                migration,
+                row["applied"] if row else None,
+                bool(row) and row["checksum"] != migration.checksum,
+                queued.get(migration.version, 0),
+            )
+        )
+    return status
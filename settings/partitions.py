@@ -0,0 +1,209 @@
+# Module for managing the monthly partitions of the messages table
+import asyncio
+import logging
+
+from datetime import datetime
+
+from . import database
+
+log = logging.getLogger("INFO_LOGGER")
+
+conn = database.postgres
+
+AHEAD = 2  # Months of partitions kept ready past the current one.
+
+
+def month_start(dt, offset=0):
+    month = dt.month - 1 + offset
+    return datetime(dt.year + month // 12, month % 12 + 1, 1)
+
+
+def partition_name(start):
+    return f"messages_{start:%Y_%m}"
+
+
+async def is_partitioned():
+    query = """
+            SELECT relkind
+            FROM pg_class
+            WHERE oid = TO_REGCLASS('messages');
+            """
+    return await conn.fetchval(query) == "p"
+
+
+async def is_migrating():
+    return bool(await conn.fetchval("SELECT TO_REGCLASS('messages_legacy');"))
+
+
+async def get_partitions():
+    query = """
+            SELECT child.relname AS name,
+            PG_GET_EXPR(child.relpartbound, child.oid) AS bounds,
+            child.reltuples::BIGINT AS rows
+            FROM pg_inherits
+            JOIN pg_class parent ON pg_inherits.inhparent = parent.oid
+            JOIN pg_class child ON pg_inherits.inhrelid = child.oid
+            WHERE parent.relname = 'messages'
+            ORDER BY child.relname;
+            """
+    return await conn.fetch(query)
+
+
+async def create_partition(start):
+    """
+    Create and attach the partition for the month starting at start.
+    Rows that already landed in the default partition are moved over.
+    ATTACH only takes a SHARE UPDATE EXCLUSIVE lock so inserts continue.
+    """
+    name = partition_name(start)
+    end = month_start(start, 1)
+    async with conn.acquire() as con:
+        async with con.transaction():
+            if await con.fetchval("SELECT TO_REGCLASS($1);", name):
+                return False
+            await con.execute(
+                f"""
+                CREATE TABLE {name}
+                (LIKE messages INCLUDING DEFAULTS INCLUDING CONSTRAINTS);
+                WITH moved AS (
+                    DELETE FROM messages_default
+                    WHERE timestamp >= '{start:%Y-%m-%d}'
+                    AND timestamp < '{end:%Y-%m-%d}'
+                    RETURNING *
+                )
+                INSERT INTO {name} SELECT * FROM moved;
+                ALTER TABLE messages ATTACH PARTITION {name}
+                FOR VALUES FROM ('{start:%Y-%m-%d}') TO ('{end:%Y-%m-%d}');
+                """
+            )
+    log.info(f"Created message partition {name}")
+    return True
+
+
+async def ensure_partitions(ahead=AHEAD, since=None):
+    """Make sure every month from since (default now) through ahead exists."""
+    now = datetime.utcnow()
+    month = month_start(since or now)
+    last = month_start(now, ahead)
+    created = []
+    while month <= last:
+        if await create_partition(month):
+            created.append(partition_name(month))
+        month = month_start(month, 1)
+    return created
+
+
+async def convert():
+    """
+    Swap the plain messages table for a partitioned one.
+    Only renames and creates tables, so ingest is blocked for
+    an instant. Old rows stay in messages_legacy until moved.
+    """
+    async with conn.acquire() as con:
+        async with con.transaction():
+            query = """
+                    SELECT relkind
+                    FROM pg_class
+                    WHERE oid = TO_REGCLASS('messages');
+                    """
+            if await con.fetchval(query) != "r":
+                return None
+            await con.execute(
+                """
+                ALTER TABLE messages RENAME TO messages_legacy;
+                ALTER TABLE messages_legacy
+                RENAME CONSTRAINT messages_pkey TO messages_legacy_pkey;
+                ALTER INDEX IF EXISTS messages_server_author_idx
+                RENAME TO messages_legacy_server_author_idx;
+                ALTER INDEX IF EXISTS messages_channel_message_idx
+                RENAME TO messages_legacy_channel_message_idx;
+                ALTER INDEX IF EXISTS messages_server_message_idx
+                RENAME TO messages_legacy_server_message_idx;
+                ALTER INDEX IF EXISTS messages_message_idx
+                RENAME TO messages_legacy_message_idx;
+                CREATE TABLE messages (
+                    index BIGINT NOT NULL DEFAULT NEXTVAL('messages_index_seq'),
+                    unix REAL,
+                    timestamp TIMESTAMP NOT NULL,
+                    content TEXT,
+                    message_id BIGINT,
+                    author_id BIGINT,
+                    channel_id BIGINT,
+                    server_id BIGINT,
+                    deleted BOOLEAN DEFAULT False,
+                    edited BOOLEAN DEFAULT False,
+                    PRIMARY KEY (index, timestamp)
+                ) PARTITION BY RANGE (timestamp);
+                ALTER SEQUENCE messages_index_seq OWNED BY messages.index;
+                CREATE TABLE messages_default PARTITION OF messages DEFAULT;
+                CREATE INDEX messages_server_timestamp_idx
+                ON messages (server_id, timestamp);
+                CREATE INDEX messages_server_author_idx
+                ON messages (server_id, author_id);
+                CREATE INDEX messages_channel_message_idx
+                ON messages (channel_id, message_id);
+                CREATE INDEX messages_server_message_idx
+                ON messages (server_id, message_id);
+                CREATE INDEX messages_message_idx
+                ON messages (message_id);
+                """
+            )
+            # The PK is ordered by insertion, so this is the oldest row.
+            query = """
+                    SELECT COALESCE(timestamp, NOW() AT TIME ZONE 'UTC')
+                    FROM messages_legacy
+                    ORDER BY index
+                    LIMIT 1;
+                    """
+            oldest = await con.fetchval(query)
+    await ensure_partitions(since=oldest)
+    return oldest
+
+
+async def move_chunk(size):
+    """Move the newest size legacy rows. Each chunk is its own transaction."""
+    query = """
+            WITH moved AS (
+                DELETE FROM messages_legacy
+                WHERE index IN (
+                    SELECT index
+                    FROM messages_legacy
+                    ORDER BY index DESC
+                    LIMIT $1
+                )
+                RETURNING *
+            )
+            INSERT INTO messages (
+                index, unix, timestamp, content, message_id,
+                author_id, channel_id, server_id, deleted, edited
+            )
+            SELECT index, unix,
+            COALESCE(timestamp, TO_TIMESTAMP(unix) AT TIME ZONE 'UTC'),
+            content, message_id, author_id, channel_id, server_id, deleted, edited
+            FROM moved;
+            """
+    status = await conn.execute(query, size)
+    return int(status.split()[-1])
+
+
+async def migrate(chunk=10000, pause=0.1, progress=None):
+    """
+    Convert the messages table and move every legacy row over,
+    newest first so recent stats are complete soonest.
+    progress is called with the running total after every chunk.
+    """
+    await convert()
+    if not await is_migrating():
+        return 0
+    total = 0
+    while True:
+        moved = await move_chunk(chunk)
+        if not moved:
+            break
+        total += moved
+        if progress:
+            progress(total)
+        await asyncio.sleep(pause)  # Give ingest room to breathe.
+    await conn.execute("DROP TABLE messages_legacy;")
+    log.info(f"Moved {total} legacy messages into partitions")
+    return total
@@ -0,0 +1,358 @@
+# Module for pruning the history tables that otherwise grow forever
+import time
+import asyncio
+import logging
+
+from collections import Counter
+from datetime import datetime, timedelta, timezone
+
+from . import archive
+from . import database
+from . import backfills
+from . import partitions
+from utilities import utils
+
+log = logging.getLogger("INFO_LOGGER")
+
+conn = database.postgres
+
+CHUNK = 5000  # Rows deleted per statement.
+MAX_LAG = 10.0  # Seconds of replica lag before pruning waits.
+DUTY = 0.5  # Fraction of wall time spent deleting, the rest is left to ingest.
+
+
+class Table:
+    """
+    How a history table is pruned.
+    key: Column rows are deleted by, one chunk at a time.
+    column: Indexed column compared against the cutoff.
+    cutoff: Converts a cutoff datetime to a value for column.
+    server: Server column, None if policies can't be per server.
+    entity: Columns identifying whose history a row is. Compacting
+            keeps the newest row of each, None if it can't compact.
+    actions: What policies on the table may do with old rows.
+    """
+
+    __slots__ = ("name", "key", "column", "cutoff", "server", "entity", "actions")
+
+    def __init__(
+        self, name, key, column, cutoff, server=None, entity=None, actions=None
+    ):
+        self.name = name
+        self.key = key
+        self.column = column
+        self.cutoff = cutoff
+        self.server = server
+        self.entity = entity
+        self.actions = actions or (("delete", "compact") if entity else ("delete",))
+
+
+def unix(dt):
+    return int(dt.replace(tzinfo=timezone.utc).timestamp())
+
+
+TABLES = {
+    table.name: table
+    for table in (
+        # Archiving only moves whole partitions to the columnar archive.
+        Table(
+            "messages",
+            "index",
+            "message_id",
+            utils.time_snowflake,
+            "server_id",
+            actions=("delete", "archive"),
+        ),
+        Table("commands", "index", "message_id", utils.time_snowflake, "server_id"),
+        Table(
+            "message_search",
+            "message_id",
+            "message_id",
+            utils.time_snowflake,
+            "server_id",
+        ),
+        Table(
+            "usernicks",
+            "id",
+            "insertion",
+            lambda dt: dt,
+            "server_id",
+            ("user_id", "server_id"),
+        ),
+        Table("usernames", "id", "insertion", lambda dt: dt, entity=("user_id",)),
+        # No primary key, rows are addressed by their physical location.
+        Table("useravatars", "ctid", "first_seen", lambda dt: dt, entity=("user_id",)),
+        Table("tracker", "user_id", "unix", unix),
+    )
+}
+# Tables built from another, pruned along with it by the same policy.
+DERIVED = {"messages": ("message_search",)}
+
+
+class Policy:
+    __slots__ = ("server_id", "table", "days", "action")
+
+    def __init__(self, server_id, table, days, action):
+        self.server_id = server_id
+        self.table = table
+        self.days = days
+        self.action = action
+
+    @property
+    def cutoff(self):
+        return datetime.utcnow() - timedelta(days=self.days)
+
+
+class Job:
+    """Progress of one retention pass."""
+
+    def __init__(self):
+        self.started = datetime.utcnow()
+        self.finished = None
+        self.current = None  # (table, server_id) being pruned.
+        self.deleted = Counter()  # Table name -> rows deleted.
+        self.archived = []  # Partitions archived and dropped.
+        self.chunks = 0
+        self.lag = 0.0  # Last measured replica lag.
+        self.throttled = 0.0  # Seconds spent sleeping between chunks.
+
+    @property
+    def elapsed(self):
+        return ((self.finished or datetime.utcnow()) - self.started).total_seconds()
+
+
+class Throttle:
+    """
+    Paces chunked deletes. After every chunk it sleeps in proportion
+    to how long the chunk took, so a chunk slowed by IO pressure backs
+    off more, then waits while any replica is more than max_lag behind.
+    """
+
+    def __init__(self, max_lag=MAX_LAG, duty=DUTY):
+        self.max_lag = max_lag
+        self.duty = duty
+
+    async def get_lag(self):
+        query = """
+                SELECT COALESCE(MAX(EXTRACT(EPOCH FROM replay_lag)), 0)::FLOAT8
+                FROM pg_stat_replication;
+                """
+        return await conn.fetchval(query)
+
+    async def wait(self, elapsed, job):
+        pause = elapsed * (1 - self.duty) / self.duty
+        await asyncio.sleep(pause)
+        job.throttled += pause
+        job.lag = await self.get_lag()
+        while job.lag > self.max_lag:
+            pause = min(job.lag, 30)
+            await asyncio.sleep(pause)
+            job.throttled += pause
+            job.lag = await self.get_lag()
+
+
+async def get_policies(defaults=None):
+    """
+    Every policy, the server 0 defaults from the config overridden
+    by the ones stored in retention_policies.
+    defaults maps table names to {"days": int, "action": str}.
+    """
+    policies = {}
+    for table, policy in (defaults or {}).items():
+        if table in TABLES:
+            action = policy.get("action", "delete")
+            policies[0, table] = Policy(0, table, policy["days"], action)
+    query = """
+            SELECT server_id, table_name, days, action
+            FROM retention_policies;
+            """
+    for row in await conn.fetch(query):
+        if row["table_name"] in TABLES:
+            policies[row["server_id"], row["table_name"]] = Policy(*row)
+    return list(policies.values())
+
+
+async def set_policy(server_id, table, days, action="delete"):
+    query = """
+            INSERT INTO retention_policies (server_id, table_name, days, action)
+            VALUES ($1, $2, $3, $4)
+            ON CONFLICT (server_id, table_name)
+            DO UPDATE SET days = EXCLUDED.days, action = EXCLUDED.action;
+            """
+    await conn.execute(query, server_id, table, days, action)
+
+
+async def remove_policy(server_id, table):
+    query = """
+            DELETE FROM retention_policies
+            WHERE server_id = $1
+            AND table_name = $2;
+            """
+    status = await conn.execute(query, server_id, table)
+    return status != "DELETE 0"
+
+
+def chunk_query(table, action, per_server, excluded):
+    """
+    Delete up to $2 rows with column older than $1. $3 is the server
+    for server policies, or the servers excluded from the default.
+    """
+    where = [f"t.{table.column} < $1"]
+    if per_server:
+        where.append(f"t.{table.server} = $3")
+    elif excluded:
+        where.append(f"COALESCE(t.{table.server}, 0) <> ALL($3::BIGINT[])")
+    if action == "compact":
+        same = " AND ".join(f"newer.{x} = t.{x}" for x in table.entity)
+        where.append(
+            f"""EXISTS (
+                SELECT 1 FROM {table.name} newer
+                WHERE {same}
+                AND newer.{table.column} > t.{table.column}
+            )"""
+        )
+    where = "\nAND ".join(where)
+    return f"""
+            DELETE FROM {table.name}
+            WHERE {table.key} = ANY(ARRAY(
+                SELECT t.{table.key}
+                FROM {table.name} t
+                WHERE {where}
+                LIMIT $2
+            ));
+            """
+
+
+async def prune(
+    policy, job, *, excluded=(), chunk=CHUNK, throttle=None, cutoff=None
+):
+    """
+    Delete every row a policy expires, chunk rows per transaction.
+    cutoff: Delete rows older than this instead of the policy's cutoff.
+    """
+    table = TABLES[policy.table]
+    per_server = bool(policy.server_id)
+    query = chunk_query(table, policy.action, per_server, excluded)
+    args = [table.cutoff(cutoff or policy.cutoff), chunk]
+    if per_server:
+        args.append(policy.server_id)
+    elif excluded:
+        args.append(list(excluded))
+    job.current = (policy.table, policy.server_id)
+    total = 0
+    while True:
+        start = time.monotonic()
+        status = await conn.execute(query, *args)
+        deleted = int(status.split()[-1])
+        total += deleted
+        job.deleted[policy.table] += deleted
+        job.chunks += 1
+        if deleted < chunk:
+            break
+        if throttle:
+            await throttle.wait(time.monotonic() - start, job)
+    return total
+
+
+async def archive_partition(name):
+    """
+    Export a message partition to the columnar archive, then detach
+    and drop it. Dropping a whole month is far cheaper than deleting
+    its rows, and leaves nothing behind for vacuum.
+    """
+    rows = await archive.export(name)
+    async with conn.acquire() as con:
+        async with con.transaction():
+            await con.execute(f"ALTER TABLE messages DETACH PARTITION {name};")
+            await con.execute(f"DROP TABLE {name};")
+    return rows
+
+
+async def expired_partitions(cutoff):
+    """Monthly message partitions that end before cutoff, with their ends."""
+    expired = []
+    for row in await partitions.get_partitions():
+        try:
+            start = datetime.strptime(row["name"], "messages_%Y_%m")
+        except ValueError:  # messages_default
+            continue
+        end = partitions.month_start(start, 1)
+        if end <= cutoff:
+            expired.append((row["name"], end))
+    return expired
+
+
+async def archive_blocker(policy, longest):
+    """Why expired message partitions can't be archived, None if they can."""
+    if policy.server_id:
+        return "only whole partitions are archived, not single servers"
+    if longest["messages"] > policy.days:
+        return "a server keeps messages for longer than the default"
+    if not await partitions.is_partitioned():
+        return "messages aren't partitioned yet"
+    if await partitions.is_migrating():
+        return "messages are still being moved into partitions"
+    pending = await backfills.get_pending()
+    if pending:
+        return f"backfills haven't read them yet ({', '.join(pending)})"
+    return None
+
+
+async def run(job, *, defaults=None, chunk=CHUNK, throttle=None):
+    """
+    Apply every retention policy. Expired message partitions are
+    archived and dropped when no server keeps messages for longer
+    than the default, everything else is deleted in chunks.
+    Partitions are kept until every backfill has read them. Tables
+    derived from another are only pruned as far as it actually was.
+    """
+    policies = await get_policies(defaults)
+    overrides = Counter()
+    longest = Counter()
+    for policy in policies:
+        if policy.server_id:
+            overrides[policy.table] += 1
+            longest[policy.table] = max(longest[policy.table], policy.days)
+    for policy in sorted(policies, key=lambda p: (p.table, p.server_id)):
+        table = TABLES[policy.table]
+        if policy.server_id and not table.server:
+            continue  # Not stored per server.
+        if policy.action not in table.actions:
+            log.warning(f"Retention cannot {policy.action} {policy.table}")
+            continue
+        excluded = ()
+        if not policy.server_id and overrides[policy.table]:
+            excluded = [
+                p.server_id for p in policies if p.table == policy.table and p.server_id
+            ]
+        archived = None  # End of the newest partition archived.
+        if policy.table == "messages":
+            reason = await archive_blocker(policy, longest)
+            if reason is None:
+                for name, end in await expired_partitions(policy.cutoff):
+                    job.current = ("messages", name)
+                    job.deleted["messages"] += await archive_partition(name)
+                    job.archived.append(name)
+                    archived = max(archived or end, end)
+            elif policy.action == "archive":
+                log.info(f"Retention skipped archiving messages: {reason}")
+        if policy.action == "archive":
+            cutoff = archived  # Derived rows only go with the partitions.
+        else:
+            await prune(policy, job, excluded=excluded, chunk=chunk, throttle=throttle)
+            cutoff = policy.cutoff
+        if cutoff is None:
+            continue
+        for name in DERIVED.get(policy.table, ()):
+            derived = Policy(policy.server_id, name, policy.days, "delete")
+            await prune(
+                derived,
+                job,
+                excluded=excluded,
+                chunk=chunk,
+                throttle=throttle,
+                cutoff=cutoff,
+            )
+    job.current = None
+    job.finished = datetime.utcnow()
+    return job
@@ -0,0 +1,166 @@
+# Module for the hourly message activity rollups
+from collections import defaultdict
+from datetime import timedelta, timezone
+
+from . import database
+from . import backfills
+
+conn = database.postgres
+
+ORDERS = ("messages", "characters")
+
+
+def hour(dt):
+    """Naive UTC start of the hour containing dt."""
+    if dt.tzinfo:
+        dt = dt.astimezone(timezone.utc).replace(tzinfo=None)
+    return dt.replace(minute=0, second=0, microsecond=0)
+
+
+def count_messages(rows):
+    """Sum messages and characters per (server_id, author_id, hour) for batch rows."""
+    counts = defaultdict(lambda: [0, 0])
+    for _, timestamp, content, _, author_id, _, server_id in rows:
+        entry = counts[server_id, author_id, hour(timestamp)]
+        entry[0] += 1
+        entry[1] += len(content)
+    return counts
+
+
+async def add_counts(counts, *, connection=None):
+    """Add the output of count_messages to the rollups in one statement."""
+    if not counts:
+        return
+    query = """
+            INSERT INTO message_rollups (server_id, author_id, hour, messages, characters)
+            SELECT * FROM UNNEST(
+                $1::BIGINT[], $2::BIGINT[], $3::TIMESTAMP[], $4::BIGINT[], $5::BIGINT[]
+            )
+            ON CONFLICT (server_id, author_id, hour)
+            DO UPDATE SET messages = message_rollups.messages + EXCLUDED.messages,
+            characters = message_rollups.characters + EXCLUDED.characters;
+            """
+    server_ids, author_ids, hours = zip(*counts)
+    messages, characters = zip(*counts.values())
+    await (connection or conn).execute(
+        query, server_ids, author_ids, hours, messages, characters
+    )
+
+
+async def leaderboard(server_id, since=None, *, order="messages", limit=25):
+    """
+    Top authors of a server since a datetime (all time if None).
+    Whole hours come from the rollups. Only the part of the
+    first hour after since is counted from the messages table.
+    """
+    if order not in ORDERS:
+        raise ValueError(f"order must be one of {ORDERS}")
+    if since is None:
+        query = f"""
+                SELECT author_id,
+                SUM(messages)::BIGINT AS messages,
+                SUM(characters)::BIGINT AS characters
+                FROM message_rollups
+                WHERE server_id = $1
+                GROUP BY author_id
+                ORDER BY {order} DESC
+                LIMIT $2;
+                """
+        return await conn.fetch(query, server_id, limit)
+
+    start = hour(since)
+    if since.tzinfo:
+        since = since.astimezone(timezone.utc).replace(tzinfo=None)
+    if since > start:
+        start += timedelta(hours=1)
+    query = f"""
+            WITH counts AS (
+                SELECT author_id, messages, characters
+                FROM message_rollups
+                WHERE server_id = $1
+                AND hour >= $3
+                UNION ALL
+                SELECT author_id, COUNT(*), COALESCE(SUM(LENGTH(content)), 0)
+                FROM messages
+                WHERE server_id = $1
+                AND timestamp > $2
+                AND timestamp < $3
+                GROUP BY author_id
+            )
+            SELECT author_id,
+            SUM(messages)::BIGINT AS messages,
+            SUM(characters)::BIGINT AS characters
+            FROM counts
+            GROUP BY author_id
+            ORDER BY {order} DESC
+            LIMIT $4;
+            """
+    return await conn.fetch(query, server_id, since, start, limit)
+
+
+async def get_user_messages(server_id, author_id):
+    query = """
+            SELECT COALESCE(SUM(messages), 0)::BIGINT
+            FROM message_rollups
+            WHERE server_id = $1
+            AND author_id = $2;
+            """
+    return await conn.fetchval(query, server_id, author_id)
+
+
+async def check(server_id, since):
+    """
+    Compare the rollups of a server with the messages table.
+    Returns every (author_id, hour) since the given hour that differs.
+    """
+    query = """
+            WITH raw AS (
+                SELECT author_id,
+                DATE_TRUNC('hour', timestamp) AS hour,
+                COUNT(*) AS messages,
+                COALESCE(SUM(LENGTH(content)), 0) AS characters
+                FROM messages
+                WHERE server_id = $1
+                AND timestamp >= $2
+                GROUP BY 1, 2
+            ), rolled AS (
+                SELECT author_id, hour, messages, characters
+                FROM message_rollups
+                WHERE server_id = $1
+                AND hour >= $2
+            )
+            SELECT COALESCE(raw.author_id, rolled.author_id) AS author_id,
+            COALESCE(raw.hour, rolled.hour) AS hour,
+            COALESCE(raw.messages, 0) AS raw_messages,
+            COALESCE(rolled.messages, 0) AS rolled_messages,
+            COALESCE(raw.characters, 0) AS raw_characters,
+            COALESCE(rolled.characters, 0) AS rolled_characters
+            FROM raw FULL JOIN rolled
+            ON raw.author_id = rolled.author_id
+            AND raw.hour = rolled.hour
+            WHERE raw.messages IS DISTINCT FROM rolled.messages
+            OR raw.characters IS DISTINCT FROM rolled.characters
+            ORDER BY 2 DESC;
+            """
+    return await conn.fetch(query, server_id, hour(since))
+
+
+BACKFILL = """
+           INSERT INTO message_rollups (server_id, author_id, hour, messages, characters)
+           SELECT server_id, author_id, DATE_TRUNC('hour', timestamp),
+           COUNT(*), COALESCE(SUM(LENGTH(content)), 0)
+           FROM messages
+           WHERE index > $1
+           AND index <= $2
+           AND server_id IS NOT NULL
+           AND author_id IS NOT NULL
+           GROUP BY 1, 2, 3
+           ON CONFLICT (server_id, author_id, hour)
+           DO UPDATE SET messages = message_rollups.messages + EXCLUDED.messages,
+           characters = message_rollups.characters + EXCLUDED.characters;
+           """
+
+
+async def backfill(chunk=10000, progress=None):
+    """Roll up every message stored before the rollups went live."""
+    return await backfills.run("message_rollups", BACKFILL, chunk, progress=progress)
@@ -0,0 +1,111 @@
+# Module for the message_search full text index
+from . import database
+from . import backfills
+from utilities import utils
+
+conn = database.postgres
+
+CONFIG = "simple"  # Text search configuration, see 0012_message_search.sql
+TIMEOUT = 3.0  # Seconds a search may run before postgres cancels it.
+
+
+def documents(rows):
+    """Rows with content for add_documents from message batch rows."""
+    return [
+        (message_id, server_id, channel_id, author_id, content)
+        for _, _, content, message_id, author_id, channel_id, server_id in rows
+        if content and message_id and server_id and author_id and channel_id
+    ]
+
+
+async def add_documents(rows, *, connection=None):
+    """Index the output of documents. Only the text search vector is stored."""
+    if not rows:
+        return
+    query = f"""
+            INSERT INTO message_search
+            (message_id, server_id, channel_id, author_id, document)
+            SELECT message_id, server_id, channel_id, author_id,
+            TO_TSVECTOR('{CONFIG}', content)
+            FROM UNNEST(
+                $1::BIGINT[], $2::BIGINT[], $3::BIGINT[], $4::BIGINT[], $5::TEXT[]
+            ) AS x(message_id, server_id, channel_id, author_id, content)
+            ON CONFLICT (message_id) DO NOTHING;
+            """
+    await (connection or conn).execute(query, *zip(*rows))
+
+
+async def search(
+    server_id,
+    text,
+    *,
+    channel_id=None,
+    author_id=None,
+    after=None,
+    before=None,
+    limit=10,
+    timeout=TIMEOUT,
+):
+    """
+    Newest messages in a server matching text, in websearch syntax
+    ("quoted phrases", or, -negation). after and before are exclusive
+    snowflake bounds, so passing the last message_id of a page as before
+    fetches the next one. Raises asyncpg.QueryCanceledError if the
+    search takes longer than timeout seconds.
+    """
+    args = [server_id, text, limit]
+    where = []
+    for column, op, value in (
+        ("s.channel_id", "=", channel_id),
+        ("s.author_id", "=", author_id),
+        ("s.message_id", ">", after),
+        ("s.message_id", "<", before),
+        # The lower bound on the partition key, so older months are pruned.
+        # Rows are stamped when they're ingested, never before the snowflake
+        # time, so an upper bound here would drop messages from the page.
+        ("m.timestamp", ">=", None if after is None else utils.snowflake_time(after)),
+    ):
+        if value is not None:
+            args.append(value)
+            where.append(f"AND {column} {op} ${len(args)}")
+    where = "\n".join(where)
+    # Replayed spool segments can leave duplicate message rows.
+    query = f"""
+            SELECT DISTINCT ON (s.message_id)
+            s.message_id, s.channel_id, s.author_id, m.content, m.deleted
+            FROM message_search s
+            JOIN messages m ON m.server_id = s.server_id
+            AND m.message_id = s.message_id
+            WHERE s.server_id = $1
+            AND m.server_id = $1
+            AND s.document @@ WEBSEARCH_TO_TSQUERY('{CONFIG}', $2)
+            {where}
+            ORDER BY s.message_id DESC
+            LIMIT $3;
+            """
+    async with conn.acquire() as con:
+        async with con.transaction(readonly=True):
+            await con.execute(f"SET LOCAL statement_timeout = {int(timeout * 1000)};")
+            return await con.fetch(query, *args)
+
+
+BACKFILL = f"""
+           INSERT INTO message_search
+           (message_id, server_id, channel_id, author_id, document)
+           SELECT message_id, server_id, channel_id, author_id,
+           TO_TSVECTOR('{CONFIG}', content)
+           FROM messages
+           WHERE index > $1
+           AND index <= $2
+           AND content <> ''
+           AND message_id IS NOT NULL
+           AND server_id IS NOT NULL
+           AND channel_id IS NOT NULL
+           AND author_id IS NOT NULL
+           ON CONFLICT (message_id) DO NOTHING;
+           """
+
+
+async def backfill(chunk=10000, progress=None):
+    """Index every message stored before the search table went live."""
+    return await backfills.run("message_search", BACKFILL, chunk, progress=progress)
@@ -0,0 +1,121 @@
+# Module for the status interval log and its hourly rollups
+from collections import defaultdict
+from datetime import datetime
+
+from . import database
+
+conn = database.postgres
+
+STATUSES = ("online", "idle", "dnd")  # Stored as codes 1, 2 and 3.
+HOUR = 3600
+
+
+def intervals(batch, previous):
+    """
+    Every closed (user_id, code, start, end) interval in a status buffer.
+    The first interval of each user runs from their stored last change,
+    given in previous, so it is only known at flush time. Anything up
+    to the stored last change was already written and is cut off.
+    """
+    for user_id, entry in batch.items():
+        status, first_changed = entry[0], entry[1]
+        last_changed = previous.get(user_id) or 0
+        if status in STATUSES and last_changed and last_changed < first_changed:
+            yield user_id, STATUSES.index(status) + 1, last_changed, first_changed
+        for code, start, end in entry[6] if len(entry) > 6 else ():
+            if end > last_changed:
+                yield user_id, code, max(start, last_changed), end
+
+
+def totals(rows):
+    """Seconds [online, idle, dnd] per user_id in intervals rows."""
+    seconds = defaultdict(lambda: [0.0, 0.0, 0.0])
+    for user_id, code, start, end in rows:
+        seconds[user_id][code - 1] += end - start
+    return seconds
+
+
+def split_hours(start, end):
+    """Seconds of [start, end) spent in each hour, keyed by unix hour start."""
+    hour = start - start % HOUR
+    while start < end:
+        stop = min(end, hour + HOUR)
+        yield hour, stop - start
+        start = hour = hour + HOUR
+
+
+async def add_intervals(rows, *, connection=None):
+    """Append intervals to status_log and add them to the hourly rollups."""
+    if not rows:
+        return
+    con = connection or conn
+    await con.copy_records_to_table(
+        "status_log",
+        records=[
+            (user_id, code, datetime.utcfromtimestamp(start), end - start)
+            for user_id, code, start, end in rows
+        ],
+        columns=("user_id", "status", "started", "seconds"),
+    )
+    hours = defaultdict(lambda: [0.0, 0.0, 0.0])
+    for user_id, code, start, end in rows:
+        for hour, seconds in split_hours(start, end):
+            hours[user_id, hour][code - 1] += seconds
+    query = """
+            INSERT INTO status_rollups (user_id, hour, online, idle, dnd)
+            SELECT x.user_id, TO_TIMESTAMP(x.hour) AT TIME ZONE 'UTC',
+            x.online, x.idle, x.dnd
+            FROM UNNEST(
+                $1::BIGINT[], $2::FLOAT8[], $3::FLOAT8[], $4::FLOAT8[], $5::FLOAT8[]
+            ) AS x(user_id, hour, online, idle, dnd)
+            ON CONFLICT (user_id, hour)
+            DO UPDATE SET online = status_rollups.online + EXCLUDED.online,
+            idle = status_rollups.idle + EXCLUDED.idle,
+            dnd = status_rollups.dnd + EXCLUDED.dnd;
+            """
+    user_ids, starts = zip(*hours)
+    online, idle, dnd = zip(*hours.values())
+    await con.execute(query, user_ids, starts, online, idle, dnd)
+
+
+async def get_window(user_id, since):
+    """
+    Status seconds of a user from the start of the hour containing
+    since. Returns None if the user was never tracked.
+    The ongoing status since last_changed is not included.
+    """
+    since = since - since % HOUR
+    query = """
+            SELECT u.starttime, u.last_changed,
+            (
+                SELECT EXTRACT(EPOCH FROM hour)::FLOAT8
+                FROM status_rollups
+                WHERE user_id = $1
+                ORDER BY hour
+                LIMIT 1
+            ) AS first_hour,
+            r.online, r.idle, r.dnd
+            FROM userstatus u, LATERAL (
+                SELECT COALESCE(SUM(online), 0) AS online,
+                COALESCE(SUM(idle), 0) AS idle,
+                COALESCE(SUM(dnd), 0) AS dnd
+                FROM status_rollups
+                WHERE user_id = $1
+                AND hour >= TO_TIMESTAMP($2) AT TIME ZONE 'UTC'
+            ) r
+            WHERE u.user_id = $1;
+            """
+    row = await conn.fetchrow(query, user_id, since)
+    if not row:
+        return None
+    # Intervals are only complete from the first one logged for the user.
+    covered = row["last_changed"]
+    if row["first_hour"] is not None:
+        covered = min(covered, row["first_hour"])
+    return {
+        "starttime": max(since, row["starttime"], covered),
+        "online": row["online"],
+        "idle": row["idle"],
+        "dnd": row["dnd"],
+        "last_changed": row["last_changed"],
+    }
@@ -0,0 +1,66 @@
+# Module for the incrementally maintained word_counts index
+from collections import Counter
+
+from . import database
+from . import backfills
+
+conn = database.postgres
+
+# Longer tokens (links, spam) aren't words and wouldn't fit a btree entry.
+MAX_LENGTH = 100
+
+
+def tokenize(content):
+    """Split content the same way the SQL backfill does."""
+    for word in content.replace("\n", " ").split(" "):
+        if 1 < len(word) <= MAX_LENGTH:
+            yield word
+
+
+def count_words(rows):
+    """Count words per (server_id, author_id, word) for message batch rows."""
+    counts = Counter()
+    for _, _, content, _, author_id, _, server_id in rows:
+        for word in tokenize(content):
+            counts[server_id, author_id, word] += 1
+    return counts
+
+
+async def add_counts(counts, *, connection=None):
+    """Add a Counter from count_words to the index in one statement."""
+    if not counts:
+        return
+    query = """
+            INSERT INTO word_counts (server_id, author_id, word, count)
+            SELECT * FROM UNNEST($1::BIGINT[], $2::BIGINT[], $3::TEXT[], $4::BIGINT[])
+            ON CONFLICT (server_id, author_id, word)
+            DO UPDATE SET count = word_counts.count + EXCLUDED.count;
+            """
+    server_ids, author_ids, words = zip(*counts)
+    await (connection or conn).execute(
+        query, server_ids, author_ids, words, list(counts.values())
+    )
+
+
+BACKFILL = f"""
+           INSERT INTO word_counts (server_id, author_id, word, count)
+           SELECT server_id, author_id, word, COUNT(*)
+           FROM messages, unnest(
+           string_to_array(
+           translate(content, '\n', ' '),
+           ' ')) word
+           WHERE index > $1
+           AND index <= $2
+           AND server_id IS NOT NULL
+           AND author_id IS NOT NULL
+           AND LENGTH(word) > 1
+           AND LENGTH(word) <= {MAX_LENGTH}
+           GROUP BY 1, 2, 3
+           ON CONFLICT (server_id, author_id, word)
+           DO UPDATE SET count = word_counts.count + EXCLUDED.count;
+           """
+
+
+async def backfill(chunk=10000, progress=None):
+    """Count the words of every message stored before the index went live."""
+    return await backfills.run("word_counts", BACKFILL, chunk, progress=progress)
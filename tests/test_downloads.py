@@ -0,0 +1,29 @@
+from yarl import URL
+
+from utilities import downloads
+
+AVATAR = "https://cdn.discordapp.com/avatars/1/abc.{}?size={}"
+
+
+def test_shrink_halves_the_size():
+    assert downloads.shrink(AVATAR.format("png", 1024)) == URL(
+        AVATAR.format("png", 512)
+    )
+    assert downloads.shrink(AVATAR.format("png", 512)) == URL(
+        AVATAR.format("png", 256)
+    )
+
+
+def test_shrink_defaults_to_1024():
+    url = "https://cdn.discordapp.com/avatars/1/abc.png"
+    assert downloads.shrink(url) == URL(AVATAR.format("png", 512))
+
+
+def test_shrink_gives_up_on_animation():
+    assert downloads.shrink(AVATAR.format("gif", 256)) == URL(
+        AVATAR.format("png", 1024)
+    )
+
+
+def test_shrink_gives_up():
+    assert downloads.shrink(AVATAR.format("png", 256)) is None
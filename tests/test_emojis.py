@@ -0,0 +1,39 @@
+from datetime import datetime
+
+import pytest
+
+try:
+    from settings import emojis
+except Exception as e:  # settings.database connects to postgres on import.
+    pytest.skip(f"settings can't be imported: {e}", allow_module_level=True)
+
+EMOJI = "<:wave:123456789012345678>"
+ANIMATED = "<a:dance:223456789012345678>"
+
+
+def row(timestamp, content, author_id=1, server_id=100):
+    return (0.0, timestamp, content, 1, author_id, 10, server_id)
+
+
+def test_count_messages_per_author_and_day():
+    day = datetime(2021, 7, 1, 23, 59)
+    rows = emojis.count_messages(
+        [
+            row(day, f"{EMOJI} hi {EMOJI} {ANIMATED}"),
+            row(day, EMOJI, author_id=2),
+            row(datetime(2021, 7, 2), EMOJI),
+            row(day, "no emojis :wave:"),
+        ]
+    )
+    assert sorted(rows) == [
+        (100, 1, 123456789012345678, day.date(), 2),
+        (100, 1, 123456789012345678, datetime(2021, 7, 2).date(), 1),
+        (100, 1, 223456789012345678, day.date(), 1),
+        (100, 2, 123456789012345678, day.date(), 1),
+    ]
+
+
+def test_count_uses_flattens_the_buffer():
+    day = datetime(2021, 7, 1).date()
+    batch = {100: {(1, 123, day): 3}}
+    assert emojis.count_uses(batch) == [(100, 1, 123, day, 3)]
@@ -0,0 +1,49 @@
+import numpy
+import pytest
+
+from PIL import Image
+
+pytest.importorskip("discord")
+
+from utilities import images
+
+
+def putpixel_bar(ratio, length, width):
+    """The progress bar as it was drawn before get_gradient."""
+    a, b, c = 0, -1, width / 2
+    w = (width / 2) + 1
+    shell = Image.new("RGB", (length, width), color=images.GRAY)
+    image = Image.new("RGB", (int(ratio * length), width), color=images.GRAY)
+    inner, outer = images.BLUE, [0, 0, 0]
+    for y in range(image.size[1]):
+        for x in range(image.size[0]):
+            dist = (a * x + b * y + c) / numpy.sqrt(a * a + b * b)
+            coef = abs(dist) / w
+            if abs(dist) < w:
+                color = [o * coef + i * (1 - coef) for i, o in zip(inner, outer)]
+                image.putpixel((x, y), tuple(int(v) for v in color))
+    shell.paste(image)
+    return numpy.asarray(shell)
+
+
+@pytest.mark.parametrize("ratio", [0, 0.01, 0.37, 0.5, 1])
+def test_progress_bar_matches_putpixel(ratio):
+    dfile, _ = images.get_progress_bar(ratio, length=120, width=20)
+    rendered = numpy.asarray(Image.open(dfile.fp).convert("RGB"))
+    assert numpy.array_equal(rendered, putpixel_bar(ratio, 120, 20))
+
+
+def test_progress_bar_clamps_ratio():
+    over, _ = images.get_progress_bar(1.5, length=120, width=20)
+    under, _ = images.get_progress_bar(-0.5, length=120, width=20)
+    assert numpy.array_equal(
+        numpy.asarray(Image.open(over.fp)), putpixel_bar(1, 120, 20)
+    )
+    assert numpy.array_equal(
+        numpy.asarray(Image.open(under.fp)), putpixel_bar(0, 120, 20)
+    )
+
+
+def test_gradient_is_cached():
+    assert images.get_gradient(120, 20) is images.get_gradient(120, 20)
+    assert images.get_gradient(120, 20).shape == (20, 240, 3)
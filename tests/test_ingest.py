@@ -0,0 +1,65 @@
+import json
+import asyncio
+
+from datetime import datetime
+
+import pytest
+
+from utilities import ingest
+
+
+class Connection:
+    """Records what a backend sends instead of talking to postgres."""
+
+    def __init__(self):
+        self.executed = []
+        self.copied = []
+
+    async def execute(self, query, *args):
+        self.executed.append((query, args))
+
+    async def copy_records_to_table(self, table, *, records, columns):
+        self.copied.append((table, list(records), columns))
+
+
+ROWS = [
+    (1.5, datetime(2021, 7, 1), "hello", 10, 20, 30, 40),
+    (2.5, datetime(2021, 7, 2), "wörld", 11, 21, 31, 41),
+]
+
+
+def test_copy_size_counts_prefixes_and_values():
+    # 2 byte field count, 4 byte length per field, then the values.
+    assert ingest.copy_size([("abc", 1, True, None)]) == 2 + 16 + 3 + 8 + 1
+    assert ingest.copy_size([]) == 0
+
+
+def test_copy_backend_streams_tuples():
+    con = Connection()
+    backend = ingest.get_backend("copy", None)
+    size = asyncio.run(backend.insert("messages", ROWS, connection=con))
+    assert con.copied == [("messages", ROWS, ingest.TABLES["messages"])]
+    assert size == ingest.copy_size(ROWS)
+
+
+def test_jsonb_backend_serializes_records():
+    con = Connection()
+    backend = ingest.get_backend("jsonb", None)
+    size = asyncio.run(backend.insert("messages", ROWS, connection=con))
+    ((query, (data,)),) = con.executed
+    assert "JSONB_TO_RECORDSET" in query
+    assert size == len(data)
+    records = json.loads(data)
+    assert records[1]["content"] == "wörld"
+    assert records[0]["timestamp"] == "2021-07-01 00:00:00"
+    assert list(records[0]) == list(ingest.TABLES["messages"])
+
+
+def test_every_column_has_a_type():
+    for columns in ingest.TABLES.values():
+        assert all(column in ingest.TYPES for column in columns)
+
+
+def test_unknown_backend():
+    with pytest.raises(ValueError):
+        ingest.get_backend("csv", None)
@@ -0,0 +1,48 @@
+from utilities import lastseen
+
+
+def test_update_and_get():
+    store = lastseen.LastSeenStore()
+    assert store.get(1) is None
+    store.update(1, 10.0, "typing")
+    store.update(2, 11.0, "sending a message")
+    assert store.get(1) == (10.0, "typing")
+    assert 2 in store and 3 not in store
+    assert len(store) == 2
+
+
+def test_newer_updates_win():
+    store = lastseen.LastSeenStore()
+    store.update(1, 10.0, "typing")
+    store.update(1, 12.0, "sending a message")
+    store.update(1, 11.0, "updating their status")  # Stale, replayed.
+    assert store.get(1) == (12.0, "sending a message")
+    assert len(store) == 1
+
+
+def test_actions_are_interned():
+    store = lastseen.LastSeenStore()
+    for user_id in range(100):
+        store.update(user_id, float(user_id), "typing")
+    assert store.actions == ["typing"]
+
+
+def test_detach_takes_the_dirty_slots():
+    store = lastseen.LastSeenStore()
+    store.update(1, 10.0, "typing")
+    store.update(2, 11.0, "typing")
+    slots = store.detach()
+    assert store.rows(slots) == ([1, 2], [10.0, 11.0], ["typing", "typing"])
+    assert store.detach() == []
+    store.update(2, 13.0, "sending a message")
+    assert store.rows(store.detach()) == ([2], [13.0], ["sending a message"])
+
+
+def test_restore_marks_slots_dirty_again():
+    store = lastseen.LastSeenStore()
+    store.update(1, 10.0, "typing")
+    slots = store.detach()
+    store.update(1, 12.0, "sending a message")  # While the flush was running.
+    store.restore(slots)
+    # Rows are read at flush time, so the newest value is written.
+    assert store.rows(store.detach()) == ([1], [12.0], ["sending a message"])
@@ -0,0 +1,54 @@
+from utilities import recent
+
+
+def add(cache, message_id, channel_id, author_id=1, content="hi"):
+    cache.add(message_id, author_id, channel_id, content, float(message_id))
+
+
+def test_channels_keep_their_newest_messages():
+    cache = recent.RecentMessages(per_channel=3)
+    for message_id in range(1, 6):
+        add(cache, message_id, channel_id=10)
+    assert [m.message_id for m in cache.channels[10]] == [3, 4, 5]
+    assert len(cache) == 3
+    assert cache.size == 3 * (recent.OVERHEAD + 2)
+
+
+def test_budget_drops_the_least_recently_active_channel():
+    cache = recent.RecentMessages(budget=3 * (recent.OVERHEAD + 2))
+    add(cache, 1, channel_id=10)
+    add(cache, 2, channel_id=20)
+    add(cache, 3, channel_id=10)  # 10 is now the most recently active.
+    add(cache, 4, channel_id=30)
+    assert list(cache.channels) == [10, 30]
+    assert 2 not in cache.index
+    assert cache.size <= cache.budget
+
+
+def test_a_single_channel_is_never_dropped():
+    cache = recent.RecentMessages(budget=1)
+    add(cache, 1, channel_id=10)
+    assert len(cache) == 1
+
+
+def test_snipe_finds_the_newest_deleted_message():
+    cache = recent.RecentMessages()
+    add(cache, 1, channel_id=10, author_id=1)
+    add(cache, 2, channel_id=10, author_id=2)
+    add(cache, 3, channel_id=10, author_id=1)
+    assert cache.snipe(10) is None
+    cache.mark_deleted(1)
+    cache.mark_deleted(2)
+    cache.mark_deleted(404)  # Not cached, ignored.
+    assert cache.snipe(10).message_id == 2
+    assert cache.snipe(10, author_id=1).message_id == 1
+    assert cache.snipe(20) is None
+
+
+def test_editsnipe():
+    cache = recent.RecentMessages()
+    add(cache, 1, channel_id=10)
+    add(cache, 2, channel_id=10)
+    cache.mark_edited(1)
+    assert cache.snipe(10, edited=True).message_id == 1
+    assert cache.snipe(10) is None
@@ -0,0 +1,34 @@
+from datetime import datetime, timedelta, timezone
+
+import pytest
+
+try:
+    from settings import rollups
+except Exception as e:  # settings.database connects to postgres on import.
+    pytest.skip(f"settings can't be imported: {e}", allow_module_level=True)
+
+
+def row(timestamp, content, author_id=1, server_id=100):
+    return (0.0, timestamp, content, 1, author_id, 10, server_id)
+
+
+def test_hour_truncates_to_naive_utc():
+    aware = datetime(2021, 7, 1, 12, 30, tzinfo=timezone(timedelta(hours=2)))
+    assert rollups.hour(aware) == datetime(2021, 7, 1, 10)
+    assert rollups.hour(datetime(2021, 7, 1, 10, 59, 59)) == datetime(2021, 7, 1, 10)
+
+
+def test_count_messages_per_hour():
+    counts = rollups.count_messages(
+        [
+            row(datetime(2021, 7, 1, 10, 5), "hey"),
+            row(datetime(2021, 7, 1, 10, 55), "hello"),
+            row(datetime(2021, 7, 1, 11, 0), "yo"),
+            row(datetime(2021, 7, 1, 10, 5), "hi", author_id=2),
+        ]
+    )
+    assert dict(counts) == {
+        (100, 1, datetime(2021, 7, 1, 10)): [2, 8],
+        (100, 1, datetime(2021, 7, 1, 11)): [1, 2],
+        (100, 2, datetime(2021, 7, 1, 10)): [1, 2],
+    }
@@ -0,0 +1,135 @@
+import asyncio
+
+from utilities import scheduler
+
+
+class Unreachable(Exception):
+    pass
+
+
+def test_flush_policy_defaults():
+    policy = scheduler.FlushPolicy()
+    assert (policy.rows, policy.age, policy.chunk) == (1000, 2000, 5000)
+    assert repr(scheduler.FlushPolicy(rows=5)).startswith("<FlushPolicy rows=5 ")
+
+
+def test_histogram_percentiles():
+    histogram = scheduler.Histogram(size=100)
+    assert histogram.percentile(50) == 0
+    for value in range(1, 101):
+        histogram.add(value)
+    assert histogram.percentile(50) == 51
+    assert histogram.percentile(99) == 100
+    assert histogram.percentile(100) == 100
+
+
+def test_histogram_keeps_a_rolling_window():
+    histogram = scheduler.Histogram(size=10)
+    for value in range(100):
+        histogram.add(value)
+    assert histogram.percentile(0) == 90
+
+
+def test_flush_stats():
+    stats = scheduler.FlushStats()
+    assert (stats.last, stats.mean, stats.max) == (0, 0, 0)
+    stats.sizes.extend([2, 4, 9])
+    assert (stats.last, stats.mean, stats.max) == (9, 5, 9)
+
+
+errors = []  # Buffer names passed to on_error.
+
+
+def make(flush, **policies):
+    loop = asyncio.get_running_loop()
+    policies = {
+        name: scheduler.FlushPolicy(**policy) for name, policy in policies.items()
+    }
+    return scheduler.FlushScheduler(
+        loop,
+        policies,
+        flush,
+        retry_on=(Unreachable,),
+        on_error=lambda name, exc: errors.append(name),
+    )
+
+
+def test_due_by_rows_and_age():
+    async def main():
+        sched = make(None, fast=dict(rows=2, age=60000), slow=dict(rows=100, age=0))
+        assert sched.due() == []
+        sched.notify("fast")
+        assert sched.due() == []
+        sched.notify("fast")
+        sched.notify("slow")
+        assert sorted(sched.due()) == ["fast", "slow"]
+
+    asyncio.run(main())
+
+
+def test_runs_flushes_on_size():
+    flushed = []
+
+    async def flush(name):
+        flushed.append((name, sched.pending[name]))
+        return 10
+
+    async def main():
+        nonlocal sched
+        sched = make(flush, buffer=dict(rows=3, age=60000))
+        sched.start()
+        for _ in range(3):
+            sched.notify("buffer")
+        await asyncio.sleep(0.05)
+        sched.stop()
+        await sched.join()
+
+    sched = None
+    asyncio.run(main())
+    assert [name for name, _ in flushed] == ["buffer"]
+    stats = sched.stats["buffer"]
+    assert (stats.flushes, stats.by_rows, stats.rows, stats.bytes) == (1, 1, 3, 10)
+    assert sched.metrics()["buffer"]["depth"] == 0
+
+
+def test_retry_backs_off_only_that_buffer():
+    async def flush(name):
+        if name == "down":
+            sched.notify(name)  # The rows were merged back.
+            raise Unreachable()
+
+    async def main():
+        nonlocal sched
+        sched = make(flush, down=dict(rows=1, age=0), up=dict(rows=1, age=0))
+        sched.notify("down")
+        await sched.flush_one("down")
+        assert sched.backoff["down"] == 0.5
+        assert "down" in sched.oldest
+        sched.notify("up")
+        assert sched.due() == ["up"]  # down waits for its retry.
+        await sched.flush_one("up")
+        assert "up" not in sched.backoff
+        await sched.flush_one("down")
+        assert sched.backoff["down"] == 1.0
+
+    sched = None
+    asyncio.run(main())
+    assert sched.stats["down"].errors == 2
+
+
+def test_other_errors_are_reported_not_retried():
+    async def flush(name):
+        raise ValueError("bad row")
+
+    async def main():
+        nonlocal sched
+        sched = make(flush, buffer=dict(rows=1, age=0))
+        sched.notify("buffer")
+        await sched.flush_one("buffer")
+
+    sched = None
+    errors.clear()
+    asyncio.run(main())
+    assert errors == ["buffer"]
+    assert "buffer" not in sched.backoff
+    assert "buffer" not in sched.oldest
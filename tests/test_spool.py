@@ -0,0 +1,136 @@
+import os
+
+import pytest
+
+from utilities import spool
+
+
+def records(count, start=0):
+    return [("message", (i,)) for i in range(start, start + count)]
+
+
+def reopen(path, **kwargs):
+    return spool.Spool(path, fsync="never", **kwargs)
+
+
+def test_unacked_records_are_replayed(tmp_path):
+    wal = reopen(tmp_path)
+    for record in records(5):
+        assert wal.append(record) is False
+    wal.close()
+    assert list(reopen(tmp_path).replay()) == records(5)
+
+
+def test_flushed_segments_are_not_replayed(tmp_path):
+    # Steady traffic: the buffer is flushed while newer records keep
+    # arriving, and the syncer seals a segment every interval.
+    wal = reopen(tmp_path)
+    for record in records(3):
+        wal.append(record)
+    wal.rotate()
+    unflushed = wal.mark()  # The buffer was flushed, newer records follow.
+    for record in records(2, start=3):
+        wal.append(record)
+    wal.rotate()
+    wal.ack(unflushed)
+    wal.close()
+    assert list(reopen(tmp_path).replay()) == records(2, start=3)
+
+
+def test_ack_never_deletes_the_active_segment(tmp_path):
+    wal = reopen(tmp_path)
+    for record in records(3):
+        wal.append(record)
+    wal.ack(wal.mark() + 1)
+    wal.close()
+    assert list(reopen(tmp_path).replay()) == records(3)
+
+
+def test_segments_rotate_on_size(tmp_path):
+    wal = reopen(tmp_path, segment_bytes=64)
+    for record in records(20):
+        wal.append(record)
+    assert len(wal.wal.sealed) > 1
+    wal.close()
+    assert list(reopen(tmp_path).replay()) == records(20)
+
+
+def test_torn_frame_is_dropped(tmp_path, caplog):
+    wal = reopen(tmp_path)
+    for record in records(3):
+        wal.append(record)
+    wal.close()
+    (name,) = os.listdir(tmp_path / "wal")
+    filename = tmp_path / "wal" / name
+    filename.write_bytes(filename.read_bytes()[:-3])
+    assert list(reopen(tmp_path).replay()) == records(2)
+    assert "torn frame" in caplog.text
+
+
+def test_spills_past_the_threshold(tmp_path):
+    wal = reopen(tmp_path, segment_bytes=256, spill_bytes=512)
+    buffered = [record for record in records(60) if not wal.append(record)]
+    assert wal.spilling and wal.backlogged
+    assert 0 < len(buffered) < 60
+    # Nothing comes back while the wal is still over the threshold.
+    assert wal.drain_overflow() == []
+
+
+def test_overflow_drains_in_order_once_flushed(tmp_path):
+    wal = reopen(tmp_path, segment_bytes=256, spill_bytes=512)
+    buffered = [record for record in records(60) if not wal.append(record)]
+    # Everything buffered is flushed and acked, then traffic stops.
+    wal.rotate()
+    wal.ack(wal.mark())
+    assert not wal.spilling
+    # Records from while the backlog drains queue up behind it.
+    assert wal.append(("message", (60,))) is True
+    drained = []
+    while True:
+        segment = wal.drain_overflow()
+        if not segment:
+            break
+        drained.extend(segment)
+        wal.rotate()
+        wal.ack(wal.mark())
+    assert buffered + drained == records(61)
+    assert not wal.backlogged
+    assert wal.append(("message", (61,))) is False
+
+
+def test_drained_records_are_moved_to_the_wal(tmp_path):
+    wal = reopen(tmp_path, segment_bytes=256, spill_bytes=512)
+    buffered = [record for record in records(60) if not wal.append(record)]
+    wal.rotate()
+    wal.ack(wal.mark())
+    drained = wal.drain_overflow()
+    wal.close()
+    # A crash before they are flushed replays them, the overflow doesn't.
+    assert list(reopen(tmp_path).replay()) == drained
+    assert buffered + drained == records(len(buffered) + len(drained))
+
+
+def test_spilling_has_hysteresis(tmp_path):
+    wal = reopen(tmp_path, segment_bytes=64, spill_bytes=512)
+    while not wal.spilling:
+        wal.append(("message", ("x" * 32,)))
+    # Acking down to between half and all of the threshold keeps spilling.
+    for seq in wal.wal.sealed:
+        if wal.pending_bytes - wal.wal.sizes[seq] <= 256:
+            break
+        wal.ack(seq + 1)
+    assert 256 < wal.pending_bytes <= 512 + 64
+    assert wal.spilling
+
+
+def test_dead_letters_are_never_replayed(tmp_path):
+    wal = reopen(tmp_path)
+    wal.dead_letter(("message_batch", [(1,)], "ValueError()", 0.0))
+    wal.close()
+    assert list(reopen(tmp_path).replay()) == []
+    assert os.listdir(tmp_path / "dead")
+
+
+def test_fsync_policy_is_checked(tmp_path):
+    with pytest.raises(ValueError):
+        spool.Spool(tmp_path, fsync="sometimes")
@@ -0,0 +1,39 @@
+import pytest
+
+try:
+    from settings import statuses
+except Exception as e:  # settings.database connects to postgres on import.
+    pytest.skip(f"settings can't be imported: {e}", allow_module_level=True)
+
+
+def entry(status, first, last, intervals):
+    return [status, first, last, 0.0, 0.0, 0.0, intervals]
+
+
+def test_first_interval_runs_from_the_stored_change():
+    batch = {1: entry("online", 100.0, 150.0, [(2, 100.0, 150.0)])}
+    rows = list(statuses.intervals(batch, {1: 40.0}))
+    assert rows == [(1, 1, 40.0, 100.0), (1, 2, 100.0, 150.0)]
+
+
+def test_replayed_intervals_are_skipped():
+    # The first two intervals were written before a crash and replayed.
+    batch = {
+        1: entry("online", 100.0, 200.0, [(2, 100.0, 150.0), (3, 150.0, 200.0)])
+    }
+    rows = list(statuses.intervals(batch, {1: 150.0}))
+    assert rows == [(1, 3, 150.0, 200.0)]
+    assert list(statuses.intervals(batch, {1: 200.0})) == []
+
+
+def test_totals_sum_per_status():
+    rows = [(1, 1, 0.0, 10.0), (1, 3, 10.0, 15.0), (1, 1, 15.0, 20.0), (2, 2, 0.0, 4.0)]
+    totals = statuses.totals(rows)
+    assert totals[1] == [15.0, 0.0, 5.0]
+    assert totals[2] == [0.0, 4.0, 0.0]
+    assert totals[3] == [0.0, 0.0, 0.0]
+
+
+def test_split_hours():
+    hours = list(statuses.split_hours(3500, 7300))
+    assert hours == [(0, 100), (3600, 3600), (7200, 100)]
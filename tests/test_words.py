@@ -0,0 +1,36 @@
+from datetime import datetime
+
+import pytest
+
+try:
+    from settings import words
+except Exception as e:  # settings.database connects to postgres on import.
+    pytest.skip(f"settings can't be imported: {e}", allow_module_level=True)
+
+
+def row(content, author_id=1, server_id=100):
+    return (0.0, datetime(2021, 7, 1), content, 1, author_id, 10, server_id)
+
+
+def test_tokenize_matches_the_backfill():
+    content = "a hi  there\nhi " + "x" * (words.MAX_LENGTH + 1)
+    assert list(words.tokenize(content)) == ["hi", "there", "hi"]
+
+
+def test_count_words_per_server_and_author():
+    counts = words.count_words(
+        [row("hello world"), row("hello again", author_id=2), row("hello")]
+    )
+    assert counts == {
+        (100, 1, "hello"): 2,
+        (100, 1, "world"): 1,
+        (100, 2, "hello"): 1,
+        (100, 2, "again"): 1,
+    }
+
+
+def test_words_are_case_sensitive_like_the_backfill():
+    assert words.count_words([row("Hello hello")]) == {
+        (100, 1, "Hello"): 1,
+        (100, 1, "hello"): 1,
+    }
@@ -9,23 +9,85 @@ import discord
 import logging
 
 from collections import defaultdict
-from yarl import URL
 
 from utilities import images
+from utilities import render
+from utilities import downloads as dl
 
 log = logging.getLogger("INFO_LOGGER")
 
 
+class KnownHashes:
+    """
+    Membership index of the hashes already in the avatars table.
+    Hex hashes are kept as ints, under half the memory of the strings.
+    A Bloom filter would be smaller still, but a false positive there
+    would be an avatar that never gets saved.
+    """
+
+    def __init__(self):
+        self.hashes = set()
+        self.seeded = False
+
+    @staticmethod
+    def encode(avatar):
+        animated = avatar.startswith("a_")
+        try:
+            return int(avatar[2:] if animated else avatar, 16) << 1 | animated
+        except ValueError:  # Not a hex hash, keep it as is.
+            return avatar
+
+    def __contains__(self, avatar):
+        return self.encode(avatar) in self.hashes
+
+    def __len__(self):
+        return len(self.hashes)
+
+    def add(self, avatar):
+        self.hashes.add(self.encode(avatar))
+
+    def update(self, avatars):
+        self.hashes.update(self.encode(avatar) for avatar in avatars)
+
+    async def seed(self, pool, chunk=50000):
+        """Load every stored hash. Hashes added meanwhile are kept."""
+        async with pool.acquire() as con:
+            async with con.transaction():
+                cursor = await con.cursor("SELECT hash FROM avatars;")
+                while True:
+                    records = await cursor.fetch(chunk)
+                    if not records:
+                        break
+                    self.update(record["hash"] for record in records)
+        self.seeded = True
+        log.info(f"Loaded {len(self.hashes)} known avatar hashes")
+
+
 class AvatarSaver:
-    def __init__(self, webhook, pool, aiosession=None, loop=None):
+    def __init__(
+        self,
+        webhook,
+        pool,
+        aiosession=None,
+        loop=None,
+        blobs=None,
+        downloads=None,
+        renderer=None,
+    ):
 
         self.wh = webhook
         self.pool = pool
+        self.blobs = blobs  # Downloaded avatars are kept here for later reads.
         self.aiosession = aiosession if aiosession else aiohttp.ClientSession()
+        self.downloads = downloads if downloads else dl.DownloadManager(self.aiosession)
         self.loop = loop if loop else asyncio.get_event_loop()
+        self.renderer = renderer  # Process pool for resizing oversized avatars.
 
         self.avatars = defaultdict(list)
         self.pending = []
+        self.known = KnownHashes()  # Hashes already uploaded.
+        self.checked = set()  # Pending hashes the database didn't know.
+        self.latest = {}  # User id -> avatar last saved by this process.
         self.queue = asyncio.Queue(loop=loop)
 
         self.is_saving = False
@@ -42,89 +104,106 @@ class AvatarSaver:
 
     def save(self, user):
         if self.is_saving:
-            avatar_name = user.avatar.key if user.avatar else user.default_avatar.key
+            asset = user.avatar or user.default_avatar
+            avatar_name = asset.key
+            if self.latest.get(user.id) == avatar_name:
+                return  # Unchanged since the last row.
             self.pending.append(
                 {
                     "user_id": user.id,
                     "avatar": avatar_name,
                     "first_seen": str(discord.utils.utcnow()),
+                    # Otherwise the database has to compare with the last row.
+                    "changed": user.id in self.latest,
                 }
             )
-            self.avatars[avatar_name] = user.avatar.url
+            self.latest[user.id] = avatar_name
+            if avatar_name not in self.known:
+                self.avatars[avatar_name] = asset.url
 
     async def inserter(self):
         while True:
             if not self.pending:
                 await asyncio.sleep(2)
                 continue
-            query = """
-                    INSERT INTO useravatars (user_id, avatar, first_seen)
-                    SELECT x.user_id, x.avatar, x.first_seen
-                    FROM JSONB_TO_RECORDSET($1::JSONB) as x(user_id BIGINT, avatar TEXT, first_seen TIMESTAMP)
-                    """
-            data = json.dumps(self.pending)
-            await self.pool.execute(query, data)
-            self.pending.clear()
+            await self.insert_pending()
+
+    async def insert_pending(self):
+        # Swap first so rows saved during the insert aren't cleared.
+        pending, self.pending = self.pending, []
+        query = """
+                INSERT INTO useravatars (user_id, avatar, first_seen)
+                SELECT x.user_id, x.avatar, x.first_seen
+                FROM JSONB_TO_RECORDSET($1::JSONB) as x(user_id BIGINT, avatar TEXT, first_seen TIMESTAMP, changed BOOLEAN)
+                WHERE x.changed
+                OR x.avatar IS DISTINCT FROM (
+                    SELECT avatar
+                    FROM useravatars
+                    WHERE useravatars.user_id = x.user_id
+                    ORDER BY first_seen DESC
+                    LIMIT 1
+                );
+                """
+        try:
+            await self.pool.execute(query, json.dumps(pending))
+        except BaseException:
+            self.pending[:0] = pending
+            raise
+
+    async def drain(self, timeout=10.0):
+        """Stop saving and insert whatever is pending before shutdown."""
+        self.is_saving = False
+        if not self.pending:
+            return
+        try:
+            await asyncio.wait_for(self.insert_pending(), timeout)
+        except asyncio.TimeoutError:
+            log.warning(f"Avatar drain timed out, {len(self.pending)} rows lost.")
 
     async def downloader(self):
         async def url_to_bytes(hash, url):
-            if isinstance(url, tuple):
-                retries = url[1] - 1
-                url = url[0]
-            else:
-                retries = 5
-
-            try:
-                async with self.aiosession.get(str(url)) as r:
-                    if r.status == 200:
-                        await self.queue.put((hash, io.BytesIO(await r.read())))
-                        return
-                    if r.status in {403, 404}:
-                        # Invalid url.
-                        pass
-                    elif r.status == 415:
-                        # Avatar is too large. Retry with lower size.
-                        url = URL(str(url))
-                        new_size = int(url.query.get("size", 1024)) // 2
-                        if new_size > 128:
-                            # give up resizing it. Its too small to be worthwhile.
-                            new_url = url.with_query(size=str(new_size))
-                        else:
-                            # could not find a gif size that did not throw 415, changing format to png.
-                            new_url = url.with_path(
-                                url.path.replace("gif", "png")
-                            ).with_query(size=1024)
-                        self.avatars[hash] = new_url
-                    else:
-                        # Put it back in for next round if there are retries left.
-                        if retries:
-                            self.avatars[hash] = (url, retries)
-                    log.warning(f"downloading {url} failed with {r.status}")
-            except (asyncio.TimeoutError, aiohttp.ClientError):
-                log.warning(f"downloading {url} failed.")
-                self.avatars[hash] = url
+            # Cached by an earlier upload attempt or a quilt.
+            data = await self.blobs.load(hash) if self.blobs else None
+            if data is None:
+                # Retries, backoff and the 415 resize fallback happen in the manager.
+                data = await self.downloads.fetch(url)
+                if data is None:
+                    return
+                if self.blobs:
+                    await self.blobs.store(hash, data)
+            await self.queue.put((hash, io.BytesIO(data)))
 
+        try:
+            await self.known.seed(self.pool)
+        except Exception as e:  # The database check below still works without it.
+            log.warning(f"Could not load known avatar hashes: {e}")
         try:
             while True:
                 while len(self.avatars) == 0:
                     await asyncio.sleep(2)
+                for avy in [avy for avy in self.avatars if avy in self.known]:
+                    self.avatars.pop(avy)
+                # Only hashes missing from the index reach the database, once.
                 query = """
                     SELECT hash
                     FROM avatars
                     WHERE hash = ANY($1::TEXT[])
                     """
-                to_check = list(self.avatars.keys())
+                to_check = [avy for avy in self.avatars if avy not in self.checked]
                 batch_size = 50000
-                for i in range(0, len(to_check)):
+                for i in range(0, len(to_check), batch_size):
                     results = await self.pool.fetch(query, to_check[i : i + batch_size])
                     for r in results:
                         # remove items in the avatar url dict that are already in the db
                         self.avatars.pop(r["hash"], None)
+                        self.known.add(r["hash"])
+                self.checked.update(avy for avy in to_check if avy in self.avatars)
 
                 chunk = dict()
                 while len(self.avatars) > 0 and len(chunk) < (50 - self.queue.qsize()):
                     # grabs enough avatars to fill the posting queue with 50 avatars if possible
                     avy, url = self.avatars.popitem()
+                    self.checked.discard(avy)
                     chunk[avy] = url
                 if chunk:
                     await asyncio.gather(
@@ -134,6 +213,18 @@ class AvatarSaver:
         except asyncio.CancelledError:
             log.warning("avatar downloading task cancelled")
 
+    async def shrink(self, func, *args):
+        """Run an images function on an oversized avatar, None if it timed out."""
+        if not self.renderer:
+            return await self.loop.run_in_executor(None, func, *args)
+        while True:
+            try:
+                return await self.renderer.render(func, *args, timeout=120)
+            except render.RenderBusy:  # Commands go first, try again later.
+                await asyncio.sleep(2)
+            except asyncio.TimeoutError:
+                return None
+
     async def batch_post_avatars(self):
         log.info("started avatar posting task")
         try:
@@ -153,15 +244,17 @@ class AvatarSaver:
                             filename=f'{avy}.{"png" if not avy.startswith("a_") else "gif"}',
                         )
                     elif s > 8000000:
-                        new_bytes = None
                         if avy.startswith("a_"):
-                            new_bytes = await self.loop.run_in_executor(
-                                None, images.extract_first_frame, file
+                            new_bytes = await self.shrink(
+                                images.extract_first_frame, file
                             )
                         else:
-                            new_bytes = await self.loop.run_in_executor(
-                                None, images.resize_to_limit, file, 8000000
+                            new_bytes = await self.shrink(
+                                images.resize_to_limit, file, 8000000
                             )
+                        if new_bytes is None:
+                            log.warning(f"Could not shrink avatar {avy}, skipping.")
+                            continue
                         await self.queue.put((avy, new_bytes))
                         continue
                     else:
@@ -211,6 +304,7 @@ class AvatarSaver:
                             on conflict (hash) do nothing
                         """
                         await self.pool.execute(query, json.dumps(transformed))
+                        self.known.update(x["hash"] for x in transformed)
                         if len(backup) == 0:
                             break
                         log.warning(f"{len(backup)} failed to upload. retrying")
@@ -0,0 +1,172 @@
+# Content addressed on disk cache for avatar images.
+# Blobs are stored under a sharded directory tree keyed by avatar hash,
+# with a small sqlite index of sizes and last use so the least recently
+# used blobs are evicted once the cache grows past its budget.
+# Disk reads and index commits block, so coroutines use the async
+# methods, which run them in the default executor.
+
+import os
+import re
+import mmap
+import time
+import asyncio
+import sqlite3
+import hashlib
+import logging
+import threading
+
+log = logging.getLogger("INFO_LOGGER")
+
+KEY_REGEX = re.compile(r"^\w{1,64}$")  # Avatar hashes, a_ prefixed if animated.
+
+
+class BlobStore:
+    def __init__(self, path="./data/blobs", budget=512 * 1024 ** 2):
+        self.path = path
+        self.budget = budget
+
+        os.makedirs(self.path, exist_ok=True)
+        # Shared by the executor threads, one at a time.
+        self.lock = threading.RLock()
+        self.index = sqlite3.connect(
+            os.path.join(self.path, "index.sqlite3"), check_same_thread=False
+        )
+        self.index.execute("PRAGMA journal_mode=WAL;")
+        self.index.execute("PRAGMA synchronous=NORMAL;")
+        self.index.execute(
+            """
+            CREATE TABLE IF NOT EXISTS blobs (
+                key TEXT PRIMARY KEY,
+                size INTEGER NOT NULL,
+                used REAL NOT NULL
+            );
+            """
+        )
+        self.index.execute("CREATE INDEX IF NOT EXISTS blobs_used ON blobs(used);")
+        self.index.commit()
+        (self.total,) = self.index.execute(
+            "SELECT COALESCE(SUM(size), 0) FROM blobs;"
+        ).fetchone()
+        self.hits = 0
+        self.misses = 0
+
+    def filename(self, key):
+        if not KEY_REGEX.match(key):
+            raise ValueError(f"Invalid blob key {key!r}")
+        shard = hashlib.sha1(key.encode("utf-8")).hexdigest()
+        return os.path.join(self.path, shard[:2], shard[2:4], key)
+
+    def __contains__(self, key):
+        return os.path.isfile(self.filename(key))
+
+    def get(self, key):
+        return self.get_many([key]).get(key)
+
+    def get_many(self, keys):
+        """
+        Memory mapped, read only blobs for every cached key, which
+        work anywhere a file object does. Close them when done.
+        Marks them used in a single index transaction.
+        """
+        found = {}
+        missing = []
+        for key in set(keys):
+            try:
+                with open(self.filename(key), "rb") as fp:
+                    found[key] = mmap.mmap(fp.fileno(), 0, access=mmap.ACCESS_READ)
+            except (OSError, ValueError):  # Evicted, never cached or empty.
+                missing.append(key)
+        now = time.time()
+        with self.lock, self.index:
+            self.hits += len(found)
+            self.misses += len(missing)
+            self.index.executemany(
+                "UPDATE blobs SET used = ? WHERE key = ?;",
+                [(now, key) for key in found],
+            )
+        return found
+
+    def read_many(self, keys):
+        """The bytes of every cached key, read from disk now."""
+        found = self.get_many(keys)
+        for key, blob in found.items():
+            with blob:
+                found[key] = blob[:]
+        return found
+
+    async def load(self, key):
+        return (await self.load_many([key])).get(key)
+
+    async def load_many(self, keys):
+        """Like read_many, without blocking the event loop."""
+        loop = asyncio.get_running_loop()
+        return await loop.run_in_executor(None, self.read_many, list(keys))
+
+    async def store(self, key, data):
+        """Like put, without blocking the event loop."""
+        loop = asyncio.get_running_loop()
+        return await loop.run_in_executor(None, self.put, key, data)
+
+    def put(self, key, data):
+        """Store the bytes of a blob. Returns False if it was already cached."""
+        if not data or key in self:
+            return False
+        filename = self.filename(key)
+        os.makedirs(os.path.dirname(filename), exist_ok=True)
+        # Readers never see a partial blob.
+        with open(filename + ".tmp", "wb") as fp:
+            fp.write(data)
+        os.replace(filename + ".tmp", filename)
+        with self.lock:
+            with self.index:
+                # A row left behind by a deleted file is replaced.
+                old = self.index.execute(
+                    "SELECT size FROM blobs WHERE key = ?;", (key,)
+                )
+                self.total -= (old.fetchone() or (0,))[0]
+                self.index.execute(
+                    "INSERT OR REPLACE INTO blobs (key, size, used) VALUES (?, ?, ?);",
+                    (key, len(data), time.time()),
+                )
+            self.total += len(data)
+            if self.total > self.budget:
+                self.evict()
+        return True
+
+    def evict(self, target=None):
+        """Delete least recently used blobs until the cache fits in target."""
+        if target is None:
+            target = int(self.budget * 0.9)  # Headroom so every put doesn't evict.
+        evicted = []
+        with self.lock:
+            for key, size in self.index.execute(
+                "SELECT key, size FROM blobs ORDER BY used;"
+            ):
+                if self.total <= target:
+                    break
+                try:
+                    os.remove(self.filename(key))
+                except FileNotFoundError:
+                    pass
+                evicted.append((key,))
+                self.total -= size
+            with self.index:
+                self.index.executemany("DELETE FROM blobs WHERE key = ?;", evicted)
+        if evicted:
+            log.info(f"Evicted {len(evicted)} cached blobs")
+        return len(evicted)
+
+    def stats(self):
+        with self.lock:
+            (count,) = self.index.execute("SELECT COUNT(*) FROM blobs;").fetchone()
+        return {
+            "blobs": count,
+            "bytes": self.total,
+            "budget": self.budget,
+            "hits": self.hits,
+            "misses": self.misses,
+        }
+
+    def close(self):
+        with self.lock:
+            self.index.close()
@@ -0,0 +1,143 @@
+# Shared download manager for avatar and image fetches.
+# Limits concurrent requests per host and the bytes in flight overall,
+# so bulk downloads can't starve webhook and API traffic of connections,
+# and coalesces concurrent requests for the same url into one fetch.
+
+import random
+import asyncio
+import aiohttp
+import logging
+
+from collections import defaultdict
+from yarl import URL
+
+log = logging.getLogger("INFO_LOGGER")
+
+ESTIMATE = 1024 ** 2  # Bytes reserved for responses without a content length.
+RETRY_STATUSES = {408, 429, 500, 502, 503, 504}
+
+
+def shrink(url):
+    """
+    The url to retry with after a 415, which discord returns for
+    images that are too large. Halves the size, then gives up on
+    animation. Returns None once there's nothing left to try.
+    """
+    url = URL(str(url))
+    new_size = int(url.query.get("size", 1024)) // 2
+    if new_size > 128:
+        return url.with_query(size=str(new_size))
+    if "gif" in url.path:
+        # could not find a gif size that did not throw 415, changing format to png.
+        return url.with_path(url.path.replace("gif", "png")).with_query(size=1024)
+    return None
+
+
+class DownloadManager:
+    def __init__(
+        self,
+        session,
+        *,
+        per_host=4,
+        budget=32 * 1024 ** 2,
+        retries=3,
+        backoff=1.0,
+        timeout=30.0,
+    ):
+        self.session = session
+        self.per_host = per_host
+        self.budget = budget  # Bytes allowed in flight across all downloads.
+        self.retries = retries
+        self.backoff = backoff
+        self.timeout = aiohttp.ClientTimeout(total=timeout)
+
+        self.hosts = defaultdict(lambda: asyncio.Semaphore(self.per_host))
+        self.inflight = {}  # Url -> task, shared by concurrent callers.
+        self.reserved = 0
+        self.reservations = asyncio.Condition()
+        self.fetched = 0
+        self.coalesced = 0
+        self.failed = 0
+
+    async def fetch(self, url):
+        """
+        The bytes at url, or None if it can't be downloaded.
+        Callers asking for a url already being fetched share its result.
+        """
+        url = str(url)
+        task = self.inflight.get(url)
+        if task:
+            self.coalesced += 1
+        else:
+            task = asyncio.ensure_future(self.download(url))
+            self.inflight[url] = task
+            task.add_done_callback(lambda _: self.inflight.pop(url, None))
+        # One caller giving up mustn't cancel the others.
+        return await asyncio.shield(task)
+
+    async def fetch_many(self, urls):
+        return await asyncio.gather(*[self.fetch(url) for url in urls])
+
+    async def reserve(self, size):
+        # A response larger than the budget still runs, just alone.
+        size = min(size, self.budget)
+        async with self.reservations:
+            await self.reservations.wait_for(
+                lambda: self.reserved + size <= self.budget
+            )
+            self.reserved += size
+        return size
+
+    async def release(self, size):
+        async with self.reservations:
+            self.reserved -= size
+            self.reservations.notify_all()
+
+    async def wait(self, attempt, retry_after=None):
+        """Exponential backoff with jitter so retries don't arrive together."""
+        delay = self.backoff * 2 ** attempt * random.uniform(0.5, 1.5)
+        try:
+            delay = max(delay, float(retry_after or 0))
+        except ValueError:  # An http date, not worth parsing.
+            pass
+        await asyncio.sleep(delay)
+
+    async def download(self, url):
+        attempt = 0
+        while url and attempt <= self.retries:
+            host = URL(url).host
+            try:
+                async with self.hosts[host]:
+                    async with self.session.get(url, timeout=self.timeout) as r:
+                        if r.status == 200:
+                            size = await self.reserve(r.content_length or ESTIMATE)
+                            try:
+                                data = await r.read()
+                            finally:
+                                await self.release(size)
+                            self.fetched += 1
+                            return data
+                        retry_after = r.headers.get("Retry-After")
+                if r.status == 415:
+                    url = shrink(url)
+                    url = url and str(url)
+                    continue
+                log.warning(f"downloading {url} failed with {r.status}")
+                if r.status not in RETRY_STATUSES:
+                    break
+                await self.wait(attempt, retry_after)
+            except (asyncio.TimeoutError, aiohttp.ClientError):
+                log.warning(f"downloading {url} failed.")
+                await self.wait(attempt)
+            attempt += 1
+        self.failed += 1
+        return None
+
+    def stats(self):
+        return {
+            "fetched": self.fetched,
+            "coalesced": self.coalesced,
+            "failed": self.failed,
+            "inflight": len(self.inflight),
+            "reserved": self.reserved,
+        }
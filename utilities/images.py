@@ -13,10 +13,48 @@ RED = (237, 41, 57)
 GRAY = (97, 109, 126)
 BLUE = (10, 24, 34)
 WHITE = (255, 255, 255)
+BLACK = (0, 0, 0)
 PINK = (255, 196, 235)
 
 statusmap = {"online": GREEN, "idle": YELLOW, "dnd": RED, "offline": GRAY}
 
+ASSETS = "./data/assets"
+FONTS = [
+    ("Helvetica.ttf", 15),
+    ("Helvetica.ttf", 68),
+    ("Helvetica.ttf", 100),
+    ("Helvetica-Bold.ttf", 85),
+    ("FreeSansBold.ttf", 30),
+]
+IMAGES = ["bargraph.png", "banner.png", "blue.png", "avatar_mask.png"]
+
+_fonts = {}
+_images = {}
+_gradients = {}  # (length, width, inner, outer) -> pixels
+
+
+def font(name, size):
+    """A font from the assets, loaded once per process."""
+    if (name, size) not in _fonts:
+        _fonts[name, size] = ImageFont.truetype(f"{ASSETS}/{name}", size)
+    return _fonts[name, size]
+
+
+def asset(name):
+    """A static image from the assets, loaded once per process. Copy before drawing."""
+    if name not in _images:
+        with Image.open(f"{ASSETS}/{name}") as im:
+            _images[name] = im.copy()
+    return _images[name]
+
+
+def preload():
+    """Load every font and static image. Runs once in each render worker."""
+    for name, size in FONTS:
+        font(name, size)
+    for name in IMAGES:
+        asset(name)
+
 
 def get_barstatus(title, statuses):
     highest = max(statuses.values())
@@ -32,52 +70,134 @@ def get_barstatus(title, statuses):
     rect_y_end = 275
     labels = {"online": "Online", "idle": "Idle", "dnd": "DND", "offline": "Offline"}
     base = Image.new(mode="RGBA", size=box_size, color=(0, 0, 0, 0))
-    with Image.open("./data/assets/bargraph.png") as grid:
-        font = ImageFont.truetype("./data/assets/Helvetica.ttf", 15)
-        draw = ImageDraw.Draw(base)
-        draw.text((0, 0), highest_unit[1], fill=WHITE, font=font)
-        draw.text((52, 2), title, fill=WHITE, font=font)
-        divs = 11
-        for i in range(divs):
-            draw.line(
-                (
-                    (50, 25 + ((box_size[1] - 50) / (divs - 1)) * i),
-                    (box_size[0], 25 + ((box_size[1] - 50) / (divs - 1)) * i),
-                ),
-                fill=(*WHITE, 128),
-                width=1,
-            )
-            draw.text(
-                (5, 25 + ((box_size[1] - 50) / (divs - 1)) * i - 6),
-                f"{highest_unit[0]-i*highest_unit[0]/(divs-1):.2f}",
-                fill=WHITE,
-                font=font,
-            )
-        for k, v in statuses.items():
-            draw.rectangle(
-                (
-                    (rect_x_start[k], rect_y_end - heights[k]),
-                    (rect_x_start[k] + rect_width, rect_y_end),
-                ),
-                fill=statusmap[k],
-            )
-            draw.text(
-                (rect_x_start[k], rect_y_end - heights[k] - 13),
-                f"{units[k][0]} {units[k][1]}",
-                fill=WHITE,
-                font=font,
-            )
-            draw.text(
-                (rect_x_start[k], box_size[1] - 25), labels[k], fill=WHITE, font=font
-            )
-        del draw
-        base.paste(grid, None, grid)
+    grid = asset("bargraph.png")
+    small = font("Helvetica.ttf", 15)
+    draw = ImageDraw.Draw(base)
+    draw.text((0, 0), highest_unit[1], fill=WHITE, font=small)
+    draw.text((52, 2), title, fill=WHITE, font=small)
+    divs = 11
+    for i in range(divs):
+        draw.line(
+            (
+                (50, 25 + ((box_size[1] - 50) / (divs - 1)) * i),
+                (box_size[0], 25 + ((box_size[1] - 50) / (divs - 1)) * i),
+            ),
+            fill=(*WHITE, 128),
+            width=1,
+        )
+        draw.text(
+            (5, 25 + ((box_size[1] - 50) / (divs - 1)) * i - 6),
+            f"{highest_unit[0]-i*highest_unit[0]/(divs-1):.2f}",
+            fill=WHITE,
+            font=small,
+        )
+    for k, v in statuses.items():
+        draw.rectangle(
+            (
+                (rect_x_start[k], rect_y_end - heights[k]),
+                (rect_x_start[k] + rect_width, rect_y_end),
+            ),
+            fill=statusmap[k],
+        )
+        draw.text(
+            (rect_x_start[k], rect_y_end - heights[k] - 13),
+            f"{units[k][0]} {units[k][1]}",
+            fill=WHITE,
+            font=small,
+        )
+        draw.text(
+            (rect_x_start[k], box_size[1] - 25), labels[k], fill=WHITE, font=small
+        )
+    del draw
+    base.paste(grid, None, grid)
     buffer = io.BytesIO()
     base.save(buffer, "png")
     buffer.seek(0)
     return buffer
 
 
+def center_text(img, strip_width, strip_height, font, text, color=WHITE):
+    draw = ImageDraw.Draw(img)
+    text_width, text_height = draw.textsize(text, font)
+    position = ((strip_width - text_width) / 2, (strip_height - text_height) / 2)
+    draw.text(position, text, color, font=font)
+    return img
+
+
+def get_piestatus(statuses, startdate):
+    """
+    Pie chart of the seconds spent in each status, with a legend.
+    startdate is the text shown under the tracking startdate heading.
+    """
+    total = sum(statuses.values())
+    uptime = total - statuses["offline"]
+    percent = f"{min(uptime / total, 1):.2%}"
+    img = Image.new("RGBA", (2500, 1024), (0, 0, 0, 0))
+    draw = ImageDraw.Draw(img)
+    bold = font("Helvetica-Bold.ttf", 85)
+    regular = font("Helvetica.ttf", 68)
+    shape = [(50, 0), (1050, 1000)]
+    start = 0
+    # Largest first so the arcs of empty statuses are drawn over nothing.
+    for status, value in sorted(statuses.items(), key=lambda x: -x[1]):
+        end = start + 360 * (value / total)
+        draw.arc(shape, start=start, end=end, fill=statusmap[status], width=200)
+        start = end
+    center_text(img, 1100, 1000, font("Helvetica.ttf", 100), percent)
+    draw.text((1200, 0), "Status Tracking Startdate:", fill=WHITE, font=bold)
+    draw.text((1200, 100), startdate, fill=WHITE, font=regular)
+    draw.text((1200, 300), "Total Online Time:", fill=WHITE, font=bold)
+    draw.text(
+        (1200, 400),
+        f"{uptime/3600:.2f} {'Hour' if int(uptime/3600) == 1 else 'Hours'}",
+        fill=WHITE,
+        font=regular,
+    )
+    draw.text((1200, 600), "Status Information:", fill=WHITE, font=bold)
+    legend = {
+        "online": ("Online", 1200, 800),
+        "idle": ("Idle", 1850, 800),
+        "dnd": ("DND", 1200, 900),
+        "offline": ("Offline", 1850, 900),
+    }
+    for status, (label, x, y) in legend.items():
+        draw.rectangle((x, y, x + 75, y + 75), fill=statusmap[status], outline=BLACK)
+        draw.text(
+            (x + 100, y + 10),
+            f"{label}: {statuses[status]/total:.2%}",
+            fill=WHITE,
+            font=regular,
+        )
+    del draw
+    buffer = io.BytesIO()
+    img.save(buffer, "png")
+    buffer.seek(0)
+    return buffer
+
+
+def get_welcome(bytes_avatar, text):
+    banner = asset("banner.png").copy()
+    blue = asset("blue.png").copy()
+    mask = asset("avatar_mask.png")
+
+    avatar = Image.open(io.BytesIO(bytes_avatar))
+    try:
+        composite = Image.composite(avatar, mask, mask)
+    except ValueError:  # Sometimes the avatar isn't resized properly
+        avatar = avatar.resize((128, 128))
+        composite = Image.composite(avatar, mask, mask)
+    blue.paste(im=composite, box=(0, 0), mask=composite)
+    banner.paste(im=blue, box=(30, 30), mask=blue.split()[3])
+
+    draw = ImageDraw.Draw(banner)
+    draw.text((170, 56), text, (211, 211, 211), font=font("FreeSansBold.ttf", 30))
+    del draw
+    buffer = io.BytesIO()
+    banner.save(buffer, "png")
+    buffer.seek(0)
+    return buffer
+
+
 def get_time_unit(stat):
     word = ""
     if stat >= 604800:
@@ -100,36 +220,29 @@ def get_time_unit(stat):
     return stat, word
 
 
-def get_progress_bar(ratio, *, fname="progress", length=800, width=80):
-    bar_length = ratio * length
-    a = 0
-    b = -1
-    c = width / 2
-    w = (width / 2) + 1
-
-    shell = Image.new("RGB", (length, width), color=GRAY)
-    imgsize = (int(bar_length), width)  # The size of the image
-    image = Image.new("RGB", imgsize, color=GRAY)  # Create the image
-
-    innerColor = BLUE  # Color at the center
-    outerColor = [0, 0, 0]  # Color at the edge
-
-    for y in range(imgsize[1]):
-        for x in range(imgsize[0]):
-
-            dist = (a * x + b * y + c) / numpy.sqrt(a * a + b * b)
-            color_coef = abs(dist) / w
-
-            if abs(dist) < w:
-                red = outerColor[0] * color_coef + innerColor[0] * (1 - color_coef)
-                green = outerColor[1] * color_coef + innerColor[1] * (1 - color_coef)
-                blue = outerColor[2] * color_coef + innerColor[2] * (1 - color_coef)
+def get_gradient(length, width, inner=BLUE, outer=(0, 0, 0)):
+    """
+    Pixels of a progress bar track, cached per size. The left half is
+    the bar, fading from inner along the middle row to outer at the
+    edges, and the right half is the empty track, so the bar at any
+    ratio is a slice of it without copying.
+    """
+    key = (length, width, inner, outer)
+    if key not in _gradients:
+        dist = numpy.abs(width / 2 - numpy.arange(width))  # From the middle row.
+        coef = (dist / (width / 2 + 1))[:, None]
+        rows = numpy.array(outer) * coef + numpy.array(inner) * (1 - coef)
+        bar = numpy.broadcast_to(rows.astype(numpy.uint8)[:, None], (width, length, 3))
+        track = numpy.broadcast_to(numpy.array(GRAY, numpy.uint8), (width, length, 3))
+        _gradients[key] = numpy.concatenate([bar, track], axis=1)
+    return _gradients[key]
 
-                image.putpixel((x, y), (int(red), int(green), int(blue)))
 
-    shell.paste(image)
+def get_progress_bar(ratio, *, fname="progress", length=800, width=80):
+    filled = min(max(int(ratio * length), 0), length)
+    pixels = get_gradient(length, width)[:, length - filled : 2 * length - filled]
     buffer = io.BytesIO()
-    shell.save(buffer, "png")  # 'save' function for PIL
+    Image.fromarray(numpy.ascontiguousarray(pixels), "RGB").save(buffer, "png")
     buffer.seek(0)
     dfile = discord.File(fp=buffer, filename=f"{fname}.png")
     return (dfile, f"{fname}.png")
@@ -191,7 +304,10 @@ def quilt(images):
         x, y = 0, 0
         for avy in images:
             if avy:
-                im = Image.open(io.BytesIO(avy)).resize(
+                if isinstance(avy, bytes):
+                    avy = io.BytesIO(avy)
+                avy.seek(0)  # Repeated avatars share one file object.
+                im = Image.open(avy).resize(
                     (size, size), resample=Image.BICUBIC
                 )
                 base.paste(im, box=(x * size, y * size))
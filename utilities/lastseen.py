@@ -0,0 +1,76 @@
+# Compact in memory copy of the tracker table.
+# Holds the last action of every user observed since startup
+# so last seen lookups rarely need to hit postgres.
+
+from array import array
+
+
+class LastSeenStore:
+    """
+    Array backed user_id -> (unix, action) map.
+
+    Each user gets a fixed slot in parallel arrays. Actions are
+    interned to small ints since there are only a handful of them.
+    Slots changed since the last flush are kept in a dirty set.
+    """
+
+    def __init__(self):
+        self.slots = {}  # user_id -> slot
+        self.users = array("q")
+        self.unix = array("d")
+        self.codes = array("H")
+        self.actions = []  # code -> action
+        self.action_codes = {}  # action -> code
+        self.dirty = set()
+
+    def __len__(self):
+        return len(self.users)
+
+    def __contains__(self, user_id):
+        return user_id in self.slots
+
+    def intern(self, action):
+        code = self.action_codes.get(action)
+        if code is None:
+            code = self.action_codes[action] = len(self.actions)
+            self.actions.append(action)
+        return code
+
+    def update(self, user_id, unix, action):
+        code = self.intern(action)
+        slot = self.slots.get(user_id)
+        if slot is None:
+            slot = self.slots[user_id] = len(self.users)
+            self.users.append(user_id)
+            self.unix.append(unix)
+            self.codes.append(code)
+        elif unix >= self.unix[slot]:
+            self.unix[slot] = unix
+            self.codes[slot] = code
+        else:  # Replayed from the spool, already stale.
+            return
+        self.dirty.add(slot)
+
+    def get(self, user_id):
+        """Returns (unix, action) or None if the user wasn't seen."""
+        slot = self.slots.get(user_id)
+        if slot is None:
+            return None
+        return self.unix[slot], self.actions[self.codes[slot]]
+
+    def detach(self):
+        """Take the dirty slots, a flush writes their current values."""
+        slots = sorted(self.dirty)
+        self.dirty = set()
+        return slots
+
+    def restore(self, slots):
+        self.dirty.update(slots)
+
+    def rows(self, slots):
+        """Parallel user_id, unix, and action lists for an UNNEST."""
+        return (
+            [self.users[slot] for slot in slots],
+            [self.unix[slot] for slot in slots],
+            [self.actions[self.codes[slot]] for slot in slots],
+        )
@@ -277,6 +277,80 @@ class TextPages(MainMenu):
         )
 
 
+class KeysetPageSource(menus.PageSource):
+    """
+    Pages fetched on demand with keyset pagination, for results too
+    large to fetch up front. fetch(key, limit) returns up to limit
+    entries after key, which is None for the first page, key(entry)
+    is what the following page continues from, and format_entry(entry)
+    is the line shown for it.
+    """
+
+    def __init__(self, fetch, key, **kwargs):
+        self.fetch = fetch
+        self.key = key
+        self.per_page = kwargs.get("per_page", 10)
+        self.format_entry = kwargs.get("format_entry", str)
+        self.desc_head = kwargs.get("desc_head", None)
+        self.desc_foot = kwargs.get("desc_foot", None)
+        self.pages = []
+        self.exhausted = False
+
+    async def load(self, page_number):
+        while len(self.pages) <= page_number and not self.exhausted:
+            key = self.key(self.pages[-1][-1]) if self.pages else None
+            # One extra row tells whether another page follows.
+            entries = await self.fetch(key, self.per_page + 1)
+            if len(entries) <= self.per_page:
+                self.exhausted = True
+            if entries:
+                self.pages.append(entries[: self.per_page])
+
+    async def prepare(self):
+        await self.load(0)
+
+    def is_paginating(self):
+        return len(self.pages) > 1 or not self.exhausted
+
+    def get_max_pages(self):
+        return len(self.pages) if self.exhausted else None
+
+    async def get_page(self, page_number):
+        await self.load(page_number)
+        if page_number >= len(self.pages):
+            raise IndexError(page_number)
+        return self.pages[page_number]
+
+    async def format_page(self, menu, entries):
+        maximum = self.get_max_pages()
+        footer = f"Page {menu.current_page + 1}"
+        if maximum:
+            footer += f"/{maximum}"
+        menu.embed.set_footer(text=footer)
+        content = "\n".join(self.format_entry(entry) for entry in entries)
+        if self.desc_head and self.desc_foot:
+            content = self.desc_head + content + self.desc_foot
+        menu.embed.description = content
+        return menu.embed
+
+
+class KeysetPages(MainMenu):
+    def __init__(self, fetch, key, **kwargs):
+        super().__init__(
+            KeysetPageSource(
+                fetch,
+                key,
+                per_page=kwargs.get("per_page", 10),
+                format_entry=kwargs.get("format_entry", str),
+                desc_head=kwargs.get("desc_head", None),
+                desc_foot=kwargs.get("desc_foot", None),
+            )
+        )
+        self.embed = discord.Embed(color=kwargs.get("color", constants.embed))
+        # The last page is unknown until every page before it was read.
+        self.remove_button("<:forward2:816457685905440850>")
+
+
 class Confirmation(menus.Menu):
     def __init__(self, msg):
         super().__init__(timeout=30.0, delete_message_after=True)
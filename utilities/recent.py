@@ -0,0 +1,96 @@
+# Recent message cache for snipe and editsnipe.
+# Keeps the newest messages of every active channel in memory
+# under a global byte budget so snipes rarely touch postgres.
+
+from collections import OrderedDict, deque
+
+OVERHEAD = 200  # Rough bytes per cached message on top of its content.
+
+
+class RecentMessage:
+    __slots__ = (
+        "message_id",
+        "author_id",
+        "channel_id",
+        "content",
+        "timestamp",
+        "deleted",
+        "edited",
+    )
+
+    def __init__(self, message_id, author_id, channel_id, content, timestamp):
+        self.message_id = message_id
+        self.author_id = author_id
+        self.channel_id = channel_id
+        self.content = content
+        self.timestamp = timestamp
+        self.deleted = False
+        self.edited = False
+
+    @property
+    def size(self):
+        return OVERHEAD + len(self.content)
+
+
+class RecentMessages:
+    """
+    Per channel ring buffers of the newest messages.
+
+    Each channel keeps at most per_channel messages. When the total
+    size passes budget bytes, the least recently active channels
+    are dropped. Anything older falls back to the messages table.
+    """
+
+    def __init__(self, per_channel=100, budget=32 * 1024 * 1024):
+        self.per_channel = per_channel
+        self.budget = budget
+        self.channels = OrderedDict()  # channel_id -> deque, oldest activity first.
+        self.index = {}  # message_id -> RecentMessage
+        self.size = 0
+
+    def __len__(self):
+        return len(self.index)
+
+    def add(self, message_id, author_id, channel_id, content, timestamp):
+        ring = self.channels.get(channel_id)
+        if ring is None:
+            ring = self.channels[channel_id] = deque()
+        else:
+            self.channels.move_to_end(channel_id)
+        if len(ring) >= self.per_channel:
+            self.forget(ring.popleft())
+
+        message = RecentMessage(message_id, author_id, channel_id, content, timestamp)
+        ring.append(message)
+        self.index[message_id] = message
+        self.size += message.size
+
+        while self.size > self.budget and len(self.channels) > 1:
+            _, idle = self.channels.popitem(last=False)
+            for message in idle:
+                self.forget(message)
+
+    def forget(self, message):
+        self.index.pop(message.message_id, None)
+        self.size -= message.size
+
+    def mark_deleted(self, message_id):
+        message = self.index.get(message_id)
+        if message:
+            message.deleted = True
+
+    def mark_edited(self, message_id):
+        message = self.index.get(message_id)
+        if message:
+            message.edited = True
+
+    def snipe(self, channel_id, *, author_id=None, edited=False):
+        """Newest deleted (or edited) message in the channel, if cached."""
+        ring = self.channels.get(channel_id)
+        if not ring:
+            return None
+        for message in reversed(ring):
+            if author_id is not None and message.author_id != author_id:
+                continue
+            if message.edited if edited else message.deleted:
+                return message
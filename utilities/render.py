@@ -0,0 +1,125 @@
+# Dedicated process pool for PIL image generation.
+# Rendering holds the GIL for hundreds of milliseconds at a time, so in
+# the default thread executor it stalls the gateway and every other
+# coroutine. Workers load fonts and static assets once at startup, and
+# the number of queued renders is bounded so a burst of image commands
+# waits its turn instead of piling up work nobody will see.
+
+import io
+import os
+import asyncio
+import logging
+import functools
+import multiprocessing
+
+from concurrent.futures import ProcessPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+
+from utilities import images
+
+log = logging.getLogger("INFO_LOGGER")
+
+
+def _run(func, *args):
+    # Buffers are returned as bytes, they're cheaper to pickle.
+    return func(*args).getvalue()
+
+
+class RenderBusy(Exception):
+    """The render queue is full."""
+
+
+class Renderer:
+    def __init__(self, *, workers=None, queue=8, timeout=30.0):
+        self.workers = workers or min(4, os.cpu_count() or 1)
+        self.queue = queue  # Renders allowed to wait for a free worker.
+        self.timeout = timeout
+        self.slots = asyncio.Semaphore(self.workers + self.queue)
+        self.pool = self.start()
+
+        self.rendered = 0
+        self.timeouts = 0
+        self.rejected = 0
+        self.restarts = 0
+
+    def start(self):
+        # Forked workers would inherit the event loop, the asyncpg pool
+        # and the gateway socket, so they start from a clean forkserver.
+        return ProcessPoolExecutor(
+            max_workers=self.workers,
+            mp_context=multiprocessing.get_context("forkserver"),
+            initializer=images.preload,
+        )
+
+    @property
+    def waiting(self):
+        return self.workers + self.queue - self.slots._value
+
+    async def render(self, func, *args, timeout=None):
+        """
+        Run an images function in a worker and return its buffer.
+        func and args must be picklable, so module level functions
+        with bytes or BytesIO arguments. Raises RenderBusy when the
+        queue is full and asyncio.TimeoutError if it takes too long.
+        """
+        if self.slots.locked():
+            self.rejected += 1
+            raise RenderBusy("Too many images are being rendered, try again soon.")
+        loop = asyncio.get_running_loop()
+        job = functools.partial(_run, func, *args)
+        await self.slots.acquire()  # Never waits, the slots aren't locked.
+        try:
+            try:
+                future = loop.run_in_executor(self.pool, job)
+            except BrokenProcessPool:  # Broke while nobody was waiting on it.
+                self.restart(self.pool)
+                future = loop.run_in_executor(self.pool, job)
+        except BaseException:
+            self.slots.release()
+            raise
+        pool = self.pool
+        # The slot is held until the worker is done, even if the caller
+        # stops waiting, so the queue bound always caps work in flight.
+        future.add_done_callback(self.release)
+        try:
+            data = await asyncio.wait_for(
+                asyncio.shield(future), timeout or self.timeout
+            )
+        except asyncio.TimeoutError:
+            self.timeouts += 1
+            raise
+        except BrokenProcessPool:
+            self.restart(pool)
+            raise
+        self.rendered += 1
+        return io.BytesIO(data)
+
+    def restart(self, pool):
+        """
+        Replace a pool whose worker died, most likely killed for memory.
+        Callers that see the same broken pool only restart it once.
+        """
+        if self.pool is not pool:
+            return
+        log.warning("Render pool broke, restarting it.")
+        self.restarts += 1
+        pool.shutdown(wait=False)
+        self.pool = self.start()
+
+    def release(self, future):
+        if not future.cancelled():
+            future.exception()  # Retrieved, whether or not a caller still waits.
+        self.slots.release()
+
+    def stats(self):
+        return {
+            "workers": self.workers,
+            "waiting": self.waiting,
+            "rendered": self.rendered,
+            "timeouts": self.timeouts,
+            "rejected": self.rejected,
+            "restarts": self.restarts,
+        }
+
+    def close(self):
+        self.pool.shutdown(wait=False)
@@ -0,0 +1,247 @@
+# Size and age triggered flushing for the batch inserter.
+# A buffer is flushed once it holds `rows` records or its oldest record
+# is `age` ms old, whichever comes first. Nothing runs while idle.
+
+import time
+import asyncio
+import logging
+
+from collections import deque
+
+log = logging.getLogger("INFO_LOGGER")
+
+
+class FlushPolicy:
+    """
+    Tunables for a single buffer.
+    rows: Flush once this many records are pending.
+    age: Flush once the oldest pending record is this many ms old.
+    chunk: Max rows per statement, bigger flushes are split.
+    """
+
+    __slots__ = ("rows", "age", "chunk")
+
+    def __init__(self, rows=1000, age=2000, chunk=5000):
+        self.rows = rows
+        self.age = age
+        self.chunk = chunk
+
+    def __repr__(self):
+        return f"<FlushPolicy rows={self.rows} age={self.age} chunk={self.chunk}>"
+
+
+class Histogram:
+    """Rolling window of samples, percentiles are computed on read."""
+
+    __slots__ = ("samples",)
+
+    def __init__(self, size=1024):
+        self.samples = deque(maxlen=size)
+
+    def add(self, value):
+        self.samples.append(value)
+
+    def percentile(self, pct):
+        if not self.samples:
+            return 0
+        ordered = sorted(self.samples)
+        return ordered[min(len(ordered) - 1, int(len(ordered) * pct / 100))]
+
+
+class FlushStats:
+    """
+    Batch sizes the scheduler actually chose for one buffer,
+    plus totals and flush latency in seconds.
+    """
+
+    __slots__ = (
+        "flushes",
+        "errors",
+        "by_rows",
+        "by_age",
+        "rows",
+        "bytes",
+        "sizes",
+        "latency",
+    )
+
+    def __init__(self):
+        self.flushes = 0
+        self.errors = 0
+        self.by_rows = 0
+        self.by_age = 0
+        self.rows = 0
+        self.bytes = 0
+        self.sizes = deque(maxlen=256)
+        self.latency = Histogram()
+
+    @property
+    def last(self):
+        return self.sizes[-1] if self.sizes else 0
+
+    @property
+    def mean(self):
+        return sum(self.sizes) / len(self.sizes) if self.sizes else 0
+
+    @property
+    def max(self):
+        return max(self.sizes, default=0)
+
+
+class FlushScheduler:
+    """
+    Single task that flushes every buffer on its own policy.
+
+    flush: Coroutine function taking a buffer name.
+           It must detach the buffer before its first await
+           and returns the number of bytes it serialized.
+           On failure it must notify() the rows it put back.
+    retry_on: Exceptions that mean the database is unreachable.
+              The buffer keeps its rows and backs off on its own,
+              the other buffers carry on flushing.
+    on_error: Called with the buffer name and any other exception.
+              Those rows are never retried, the flush must have
+              set them aside, so one bad row can't stall a buffer.
+    """
+
+    def __init__(self, loop, policies, flush, *, retry_on=(), on_error=None):
+        self.loop = loop
+        self.policies = policies
+        self.flush = flush
+        self.retry_on = retry_on
+        self.on_error = on_error
+
+        self.pending = dict.fromkeys(policies, 0)
+        self.oldest = {}  # Buffer name -> monotonic time of its oldest record.
+        self.stats = {name: FlushStats() for name in policies}
+
+        self.wakeup = asyncio.Event()
+        self.closing = asyncio.Event()
+        self.backoff = {}  # Buffer name -> seconds between its retries.
+        self.retry_at = {}  # Buffer name -> monotonic time it may retry.
+        self.task = None
+
+    def start(self):
+        if self.task is None or self.task.done():
+            self.closing.clear()
+            self.task = self.loop.create_task(self.run())
+
+    def stop(self):
+        """Stop once the flush in progress, if any, has finished."""
+        self.closing.set()
+        self.wakeup.set()
+
+    async def join(self):
+        if self.task is not None:
+            await self.task
+
+    def notify(self, name, count=1):
+        """A record was buffered. Wakes the scheduler only if needed."""
+        if name not in self.oldest:
+            self.oldest[name] = time.monotonic()
+            self.wakeup.set()  # A new, possibly earlier deadline.
+        self.pending[name] += count
+        if self.pending[name] == self.policies[name].rows:
+            self.wakeup.set()
+
+    def deadline(self, name):
+        """When a buffer is next due by age, or its retry if that's later."""
+        deadline = self.oldest[name] + self.policies[name].age / 1000
+        return max(deadline, self.retry_at.get(name, 0))
+
+    def due(self):
+        now = time.monotonic()
+        return [
+            name
+            for name in self.oldest
+            if self.retry_at.get(name, 0) <= now
+            and (
+                self.pending[name] >= self.policies[name].rows
+                or self.deadline(name) <= now
+            )
+        ]
+
+    async def run(self):
+        while not self.closing.is_set():
+            due = self.due()
+            if not due:
+                timeout = None
+                if self.oldest:
+                    timeout = min(map(self.deadline, self.oldest)) - time.monotonic()
+                self.wakeup.clear()
+                try:
+                    await asyncio.wait_for(self.wakeup.wait(), timeout)
+                except asyncio.TimeoutError:
+                    pass
+                continue
+
+            for name in due:
+                if self.closing.is_set():
+                    return
+                await self.flush_one(name)
+
+    async def flush_one(self, name):
+        """Flush a buffer now, regardless of its policy."""
+        rows = self.pending[name]
+        oldest = self.oldest.pop(name, None)
+        self.pending[name] = 0
+        stats = self.stats[name]
+        if rows >= self.policies[name].rows:
+            stats.by_rows += 1
+        else:
+            stats.by_age += 1
+
+        start = time.perf_counter()
+        try:
+            serialized = await self.flush(name)
+        except Exception as exc:
+            stats.errors += 1
+            if not isinstance(exc, self.retry_on):
+                if self.on_error:
+                    self.on_error(name, exc)
+                return
+            # Unwritten rows were merged back and notified. Keep their original age.
+            if oldest is not None and name in self.oldest:
+                self.oldest[name] = min(self.oldest.get(name, oldest), oldest)
+            backoff = min(max(self.backoff.get(name, 0) * 2, 0.5), 30)
+            self.backoff[name] = backoff
+            self.retry_at[name] = time.monotonic() + backoff
+            log.warning(f"Flushing {name} failed, retrying in {backoff}s: {exc}")
+            return
+
+        self.backoff.pop(name, None)
+        self.retry_at.pop(name, None)
+        stats.latency.add(time.perf_counter() - start)
+        stats.flushes += 1
+        stats.rows += rows
+        stats.bytes += serialized or 0
+        stats.sizes.append(rows)
+
+    def age(self, name):
+        """Milliseconds since the oldest pending record of a buffer."""
+        if name not in self.oldest:
+            return 0
+        return (time.monotonic() - self.oldest[name]) * 1000
+
+    def metrics(self):
+        """JSON friendly snapshot of every buffer."""
+        return {
+            name: {
+                "depth": self.pending[name],
+                "age_ms": round(self.age(name), 3),
+                "backoff_s": self.backoff.get(name, 0),
+                "flushes": stats.flushes,
+                "errors": stats.errors,
+                "rows": stats.rows,
+                "bytes": stats.bytes,
+                "mean_batch": round(stats.mean, 3),
+                "p50_ms": round(stats.latency.percentile(50) * 1000, 3),
+                "p95_ms": round(stats.latency.percentile(95) * 1000, 3),
+                "p99_ms": round(stats.latency.percentile(99) * 1000, 3),
+            }
+            for name, stats in self.stats.items()
+        }
+
+    async def flush_all(self):
+        for name in list(self.oldest):
+            await self.flush_one(name)
@@ -0,0 +1,221 @@
+# Append-only on disk spool for the batch inserter.
+# Every record is written here before it is buffered in memory,
+# so a crash or kill only costs us duplicate rows, never lost ones.
+
+import os
+import pickle
+import struct
+import logging
+
+log = logging.getLogger("INFO_LOGGER")
+
+FRAME = struct.Struct("<I")  # Length prefix for every pickled record.
+FSYNC_POLICIES = ("always", "interval", "never")
+
+
+class Segments:
+    """
+    A directory of numbered segment files.
+    Only the highest numbered segment is ever appended to.
+    """
+
+    def __init__(self, path, fsync, segment_bytes):
+        self.path = path
+        self.fsync = fsync
+        self.segment_bytes = segment_bytes
+
+        os.makedirs(self.path, exist_ok=True)
+        self.sizes = {
+            int(fname[:-4]): os.path.getsize(os.path.join(self.path, fname))
+            for fname in os.listdir(self.path)
+            if fname.endswith(".seg")
+        }
+        # Never append to a segment that may end in a torn frame.
+        self.active = max(self.sizes, default=0) + 1
+        self.fp = None
+
+    def filename(self, seq):
+        return os.path.join(self.path, f"{seq:012d}.seg")
+
+    @property
+    def total_bytes(self):
+        return sum(self.sizes.values())
+
+    @property
+    def sealed(self):
+        return sorted(seq for seq in self.sizes if seq != self.active)
+
+    def append(self, record):
+        payload = pickle.dumps(record, protocol=pickle.HIGHEST_PROTOCOL)
+        if self.fp is None:
+            # Unbuffered, so every record reaches the kernel as it is written
+            # and survives the process being killed. fsync covers power loss.
+            self.fp = open(self.filename(self.active), "ab", buffering=0)
+            self.sizes.setdefault(self.active, 0)
+        self.fp.write(FRAME.pack(len(payload)) + payload)
+        self.sizes[self.active] += FRAME.size + len(payload)
+        if self.fsync == "always":
+            self.sync()
+        if self.sizes[self.active] >= self.segment_bytes:
+            self.rotate()
+
+    def sync(self):
+        if self.fp is None or self.fsync == "never":
+            return
+        os.fsync(self.fp.fileno())
+
+    def rotate(self):
+        """Seal the active segment. Returns the new active sequence."""
+        if self.fp is not None:
+            self.sync()
+            self.fp.close()
+            self.fp = None
+        if self.active in self.sizes:
+            self.active += 1
+        return self.active
+
+    def read(self, seq):
+        with open(self.filename(seq), "rb") as fp:
+            while True:
+                header = fp.read(FRAME.size)
+                if len(header) < FRAME.size:
+                    break
+                (length,) = FRAME.unpack(header)
+                payload = fp.read(length)
+                if len(payload) < length:
+                    log.warning(f"Spool segment {self.filename(seq)} ends in a torn frame")
+                    break
+                yield pickle.loads(payload)
+
+    def remove(self, seq):
+        try:
+            os.remove(self.filename(seq))
+        except FileNotFoundError:
+            pass
+        self.sizes.pop(seq, None)
+
+    def close(self):
+        if self.fp is not None:
+            self.sync()
+            self.fp.close()
+            self.fp = None
+
+
+class Spool:
+    """
+    Write-ahead spool for the batch buffers.
+
+    Records go to the ./wal segments while they are also held in memory.
+    Once every buffer has been flushed past a segment, it is acked and deleted.
+    If un-acked data passes spill_bytes (usually because postgres is down),
+    new records are only written to the ./overflow segments and are fed
+    back in, one segment at a time, once the backlog has drained. Until
+    the overflow is empty, new records queue up behind it, so records are
+    always buffered in the order they were recorded.
+    """
+
+    def __init__(
+        self,
+        path="./data/spool",
+        *,
+        fsync="interval",
+        interval=1.0,  # Seconds between fsyncs for the interval policy.
+        segment_bytes=4 * 1024 * 1024,  # 4 MiB
+        spill_bytes=256 * 1024 * 1024,  # 256 MiB
+    ):
+        if fsync not in FSYNC_POLICIES:
+            raise ValueError(f"fsync must be one of {', '.join(FSYNC_POLICIES)}")
+        self.fsync = fsync
+        self.interval = interval
+        self.spill_bytes = spill_bytes
+        self.wal = Segments(os.path.join(path, "wal"), fsync, segment_bytes)
+        self.overflow = Segments(os.path.join(path, "overflow"), fsync, segment_bytes)
+        # Rows postgres refused, kept for inspection and never replayed.
+        self.dead = Segments(os.path.join(path, "dead"), "always", segment_bytes)
+        self.spilling = False
+
+    @property
+    def pending_bytes(self):
+        return self.wal.total_bytes
+
+    @property
+    def backlogged(self):
+        """Spilled records are still waiting to be fed back in."""
+        return bool(self.overflow.sizes)
+
+    def refresh(self):
+        """Re-evaluate spilling. Called whenever the pending bytes change."""
+        if self.spilling:
+            # Hysteresis so we don't flap around the threshold.
+            self.spilling = self.pending_bytes > self.spill_bytes // 2
+        else:
+            self.spilling = self.pending_bytes > self.spill_bytes
+            if self.spilling:
+                log.warning(
+                    f"Spool passed {self.spill_bytes} bytes. Spilling new records to disk."
+                )
+
+    def append(self, record):
+        """
+        Persist a record. Returns True if it was spilled
+        and must not be buffered in memory by the caller.
+        """
+        self.refresh()
+        if self.spilling or self.backlogged:
+            self.overflow.append(record)
+            return True
+        self.wal.append(record)
+        return False
+
+    def mark(self):
+        """Every record in a segment below the mark was written before now."""
+        return self.wal.active
+
+    def rotate(self):
+        """
+        Seal the active segment so it can be acked, fsyncing both
+        unless the policy is never. Called every interval.
+        """
+        self.overflow.sync()
+        return self.wal.rotate()
+
+    def ack(self, mark):
+        """Delete the sealed segments whose records are all safely in postgres."""
+        for seq in self.wal.sealed:
+            if seq >= mark:
+                break
+            self.wal.remove(seq)
+        self.refresh()
+
+    def replay(self):
+        """Records from a previous run that were never acked."""
+        for seq in self.wal.sealed:
+            yield from self.wal.read(seq)
+
+    def drain_overflow(self):
+        """
+        Move the oldest spilled segment back into the wal and return
+        its records to be buffered. Nothing moves while still spilling.
+        """
+        self.refresh()
+        if self.spilling or not self.backlogged:
+            return []
+        sealed = self.overflow.sealed
+        if not sealed:
+            sealed = [self.overflow.active]
+            self.overflow.rotate()
+        seq = sealed[0]
+        records = list(self.overflow.read(seq))
+        for record in records:
+            self.wal.append(record)
+        self.overflow.remove(seq)
+        return records
+
+    def dead_letter(self, record):
+        """Set a record aside in the ./dead segments."""
+        self.dead.append(record)
+
+    def close(self):
+        self.wal.close()
+        self.overflow.close()
+        self.dead.close()
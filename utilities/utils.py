@@ -438,6 +438,52 @@ UNKNOWN_CUTOFF = datetime.utcfromtimestamp(1420070400.000).replace(tzinfo=timezo
 UNKNOWN_CUTOFF_TZ = UNKNOWN_CUTOFF.replace(tzinfo=timezone.utc)
 
 
+DISCORD_EPOCH = 1420070400000  # Milliseconds, the start of 2015.
+
+
+def time_snowflake(when, high=False):
+    """
+    Smallest snowflake created at when, or the largest if high.
+    when is a unix timestamp or a datetime. Naive datetimes are UTC.
+    """
+    if isinstance(when, datetime):
+        if when.tzinfo is None:
+            when = when.replace(tzinfo=timezone.utc)
+        when = when.timestamp()
+    ms = max(int(when * 1000) - DISCORD_EPOCH, 0)
+    return (ms << 22) + (2 ** 22 - 1 if high else 0)
+
+
+def snowflake_time(snowflake):
+    """Naive UTC datetime a snowflake was created at."""
+    return datetime.utcfromtimestamp(((snowflake >> 22) + DISCORD_EPOCH) / 1000)
+
+
+def snowflake_window(column, since=None, until=None, *, start=1, partition=None):
+    """
+    Turn a time window into a range predicate on a snowflake column
+    so it can use an index on it. Returns the SQL fragment and its
+    arguments, numbered from $start.
+    partition: Timestamp column a table is range partitioned on.
+               The lower bound is repeated on it so the planner
+               can prune partitions before the window.
+    """
+    clauses = []
+    args = []
+    for op, when, high in ((">=", since, False), ("<=", until, True)):
+        if when is None:
+            continue
+        snowflake = time_snowflake(when, high=high)
+        clauses.append(f"{column} {op} ${start + len(args)}")
+        args.append(snowflake)
+        if partition and not high:
+            # Rows are stamped at ingest, never before their snowflake time,
+            # so only the lower bound is safe to repeat on the partition key.
+            clauses.append(f"{partition} {op} ${start + len(args)}")
+            args.append(snowflake_time(snowflake))
+    return " AND ".join(clauses) or "TRUE", args
+
+
 def format_time(time):
     if time is None:
         return "Unknown"